@@ -0,0 +1,37 @@
+"""unique profile type and project name
+
+Revision ID: 3f9c1d7a2b64
+Revises: 64a0ca0bfe3a
+Create Date: 2026-10-18 10:20:41.518302+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from libs.database.migrations.helpers import check_no_duplicates
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d7a2b64'
+down_revision: Union[str, None] = '64a0ca0bfe3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # индексы становятся целью ON CONFLICT в upsert профиля и проекта.
+    # Дубли не удаляем автоматически: на профили и проекты ссылаются подписки и платежи
+    check_no_duplicates('user_profile', 'user_id', 'user_type')
+    check_no_duplicates('project', 'owner_id', 'name')
+    op.drop_index('ix_user_profile_user_id_user_type', table_name='user_profile')
+    op.create_index('ix_user_profile_user_id_user_type', 'user_profile', ['user_id', 'user_type'], unique=True)
+    op.drop_index('ix_project_owner_id_name', table_name='project')
+    op.create_index('ix_project_owner_id_name', 'project', ['owner_id', 'name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_project_owner_id_name', table_name='project')
+    op.create_index('ix_project_owner_id_name', 'project', ['owner_id', 'name'], unique=False)
+    op.drop_index('ix_user_profile_user_id_user_type', table_name='user_profile')
+    op.create_index('ix_user_profile_user_id_user_type', 'user_profile', ['user_id', 'user_type'], unique=False)
@@ -0,0 +1,42 @@
+"""bulk load conflict targets
+
+Revision ID: 8d2e5b0c41f7
+Revises: 3f9c1d7a2b64
+Create Date: 2026-10-18 14:05:12.730164+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from libs.database.migrations.helpers import check_no_duplicates
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5b0c41f7'
+down_revision: Union[str, None] = '3f9c1d7a2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # цели ON CONFLICT для BulkLoader: платеж по внешнему id, тариф по имени в проекте.
+    # Дубли не удаляем автоматически: это деньги и тарифы подписок, их разбирают руками
+    check_no_duplicates('payment', 'external_id')
+    check_no_duplicates('tariff', 'project_id', 'name')
+
+    # payment большая: уникальный индекс строится рядом со старым без блокировки записи и подменяет его,
+    # остаток неудачной CONCURRENTLY сборки (INVALID индекс) удаляется при повторном запуске
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_payment_external_id_unique')
+        op.create_index('ix_payment_external_id_unique', 'payment', ['external_id'], unique=True,
+                        postgresql_concurrently=True)
+    op.drop_index('ix_payment_external_id', table_name='payment')
+    op.execute('ALTER INDEX ix_payment_external_id_unique RENAME TO ix_payment_external_id')
+    op.create_index('ix_tariff_project_id_name', 'tariff', ['project_id', 'name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tariff_project_id_name', table_name='tariff')
+    op.drop_index(op.f('ix_payment_external_id'), table_name='payment')
+    op.create_index('ix_payment_external_id', 'payment', ['external_id'], unique=False)
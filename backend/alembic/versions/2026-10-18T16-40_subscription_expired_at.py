@@ -0,0 +1,36 @@
+"""subscription expired at
+
+Revision ID: c51a7e9d3b28
+Revises: 8d2e5b0c41f7
+Create Date: 2026-10-18 16:40:27.104518+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c51a7e9d3b28'
+down_revision: Union[str, None] = '8d2e5b0c41f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable колонка без default - без переписывания таблицы
+    op.add_column('subscription', sa.Column('expired_at', sa.DateTime(timezone=True), nullable=True))
+    # подписки, истекшие раньше окна SUBSCRIPTION_EXPIRY.WINDOW, sweeper не трогает.
+    # subscription большая: индекс строится без блокировки записи платежами,
+    # остаток неудачной CONCURRENTLY сборки (INVALID индекс) удаляется при повторном запуске
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_subscription_pending_end_at')
+        op.create_index('ix_subscription_pending_end_at', 'subscription', ['end_at', 'id'],
+                        postgresql_where=sa.text('expired_at IS NULL'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_subscription_pending_end_at', table_name='subscription',
+                  postgresql_where=sa.text('expired_at IS NULL'))
+    op.drop_column('subscription', 'expired_at')
@@ -2,6 +2,14 @@ from app.tooling.routes import router as tooling
 from app.v1.app import app as watcher_v1
 from libs import logging
 from libs.api_client.registry import HttpTransportRegistry
+from libs.cache.client import BaseCommonCache
+from libs.cache.invalidation import invalidation_channel
+from libs.cache.supervisor import common_cache_supervisor
+from libs.config import settings
+from libs.database.config import sqlalchemy_settings
+from libs.database.datasources.dicts import DictDatasource
+from libs.database.subscription_expiry import subscription_expiry_sweeper
+from libs.database.sql_alchemy.session import DBAutocommitSession, DBReadonlySession
 from libs.web_service.exception_handlers import add_validation_error_handler
 from libs.web_service.fast_api import fast_api_fabric
 
@@ -17,10 +25,33 @@ add_validation_error_handler(app)
 
 @app.on_event("startup")
 async def startup():
+    try:
+        await BaseCommonCache.async_init()
+    except Exception:
+        logger.exception('Redis cache initialisation failed, process-local caches will be used')
+    common_cache_supervisor.start()
+    invalidation_channel.start()
+    if sqlalchemy_settings.POOL_WARM_UP:
+        await DBAutocommitSession.connector.warm_up()
+    if DBReadonlySession.router:
+        await DBReadonlySession.router.warm_up(pools=sqlalchemy_settings.POOL_WARM_UP)
+    if settings.CACHE.get('DICTS', {}).get('PRELOAD', False):
+        async with DBAutocommitSession() as session:
+            await DictDatasource.preload(session)
+    if settings.get('SUBSCRIPTION_EXPIRY', {}).get('ENABLED', False):
+        subscription_expiry_sweeper.start()
     logger.info(f'{app.title}: STARTED')
 
 
 @app.on_event("shutdown")
 async def shutdown():
     await HttpTransportRegistry.close_all()
+    await subscription_expiry_sweeper.stop()
+    await invalidation_channel.stop()
+    await common_cache_supervisor.stop()
+    await DBAutocommitSession.connector.engine.dispose()
+    if DBReadonlySession.router:
+        await DBReadonlySession.router.dispose()
+    if BaseCommonCache.client:
+        await BaseCommonCache.close()
     logger.info(f'{app.title}: STOPPED')
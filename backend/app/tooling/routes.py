@@ -1,9 +1,14 @@
 from libs.database.sql_alchemy import db_bound
 from libs.web_service.handlers import add_tooling_handlers
+from libs.web_service.handlers.cache import add_hot_keys_handler
 from libs.web_service.handlers.health import health_handler
+from libs.web_service.handlers.sql import add_sql_top_handler
 
 from .healthcheck import health_registry
 
 router = add_tooling_handlers(health_registry,
                               docs_root_path='/api/v1/',
                               health_handler=lambda registry: db_bound(health_handler(registry)))
+
+add_hot_keys_handler(router)
+add_sql_top_handler(router)
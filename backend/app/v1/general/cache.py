@@ -0,0 +1,22 @@
+from datetime import timedelta
+from typing import Optional, Union
+
+from libs.cache.client import BaseCommonCache
+from libs.cache.serializers import OrjsonModelSerializer
+from libs.config import settings
+from libs.database.models import TariffModel
+from libs.utils.time import timedelta_from_duration
+
+
+class ProjectTariffsCache(BaseCommonCache):
+    """ Активные тарифы проекта для подписчиков, сбрасывается при изменении тарифов владельцем """
+    metrics_prefix = 'project_tariffs_cache'
+    service_name = 'project_tariffs'
+
+    value_serializer = OrjsonModelSerializer(TariffModel, many=True)
+    expire: Optional[Union[int, timedelta]] = timedelta_from_duration(
+        settings.CACHE.get('TARIFFS', {}).get('TTL', '10m'))
+
+    @staticmethod
+    def project_key(project_id: int) -> str:
+        return f'tariffs:project:{project_id}'
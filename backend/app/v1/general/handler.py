@@ -5,9 +5,12 @@ from fastapi import BackgroundTasks
 from libs import logging
 
 from libs.database.sql_alchemy import Session
-from libs.database.datasources.user import UserDatasource
-from libs.database.models import User, ProfileTypes, UserProfile, Subscription
+from libs.database.datasources.bot_context import BotContextDatasource
+from libs.database.models import BotContext, User, ProfileTypes, UserProfile, Subscription
 from libs.dependencies import ParticipantsInfo
+from libs.identity import identity_resolver
+
+from .cache import ProjectTariffsCache
 
 log = logging.getLogger('general_handler')
 
@@ -15,14 +18,33 @@ log = logging.getLogger('general_handler')
 class BaseHandler:
     user: User | None = None
     bot: User | None = None
+    bot_context: BotContext | None = None
 
     def __init__(self, session: Session, participants: ParticipantsInfo):
         self.session = session
         self.participants = participants
 
     async def get_roles(self):
-        self.user = await UserDatasource(self.session).get(user_tg_id=self.participants.user.telegram_id)
-        self.bot = await UserDatasource(self.session).get(user_tg_id=self.participants.bot_id)
+        user_tg_id, bot_tg_id = self.participants.user.telegram_id, self.participants.bot_id
+        identities = await identity_resolver.resolve_many(self.session, [user_tg_id, bot_tg_id])
+        self.user = identities[user_tg_id]
+        self.bot = identities[bot_tg_id]
+
+    async def invalidate_roles(self):
+        """
+        Must be called after any change of the user's or bot's profiles, projects or tariffs.
+        Owners and admin bots of changed projects are invalidated by the project and tariff datasources
+        """
+        await identity_resolver.invalidate(self.participants.user.telegram_id, self.participants.bot_id)
+
+    @staticmethod
+    async def invalidate_project_tariffs(project_id: int):
+        await ProjectTariffsCache().delete(ProjectTariffsCache.project_key(project_id))
+
+    async def get_bot_context(self) -> Optional[BotContext]:
+        """ Проект бота одним ключом в Redis, без загрузки всего графа бота """
+        self.bot_context = await BotContextDatasource(session=self.session).get_context(self.participants.bot_id)
+        return self.bot_context
 
     def user_owner_profile(self) -> Optional[UserProfile]:
         if self.bot and self.user:
@@ -32,9 +54,9 @@ class BaseHandler:
                 return prof
 
     def user_subscription(self) -> Optional[Subscription]:
-        if self.bot and self.user:
+        if self.bot_context and self.user:
             return self.user.get_profile_by_type_name(ProfileTypes.SUBSCRIBER).user_project_subscription(
-                project_id=self.bot.user_profile[0].projects[0].id)
+                project_id=self.bot_context.project_id)
 
     def user_gigachad_profile(self) -> Optional[UserProfile]:
         if self.bot and self.user:
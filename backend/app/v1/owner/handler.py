@@ -1,4 +1,5 @@
 from fastapi import BackgroundTasks, HTTPException
+from sqlalchemy.exc import IntegrityError
 
 from libs import logging
 
@@ -57,7 +58,7 @@ class ProjectHandler(BaseHandler):
         if project:
             raise HTTPException(status_code=409, detail='Project already exists')
 
-        return await ProjectDatasource(session=self.session).create_or_update_project_by_name(
+        project = await ProjectDatasource(session=self.session).create_or_update_project_by_name(
             name=project_data.name,
             owner_id=prof.id,
             tariff_id=project_data.tariff_id,
@@ -65,6 +66,8 @@ class ProjectHandler(BaseHandler):
             admin_bot_id=project_data.admin_bot_id,
             payment_system_id=project_data.payment_system_id,
         )
+        await self.invalidate_roles()
+        return project
 
     async def update_by_external(self, g_tasks: BackgroundTasks, project_id, project_data: ExternalProjectRequest):
         await self.get_roles()
@@ -95,7 +98,7 @@ class ProjectHandler(BaseHandler):
         if not (project := prof.user_get_project_by_id(project_id)):
             raise HTTPException(status_code=401, detail='Not enough permission')
 
-        return await ProjectDatasource(session=self.session).update_by_id(
+        project = await ProjectDatasource(session=self.session).update_by_id(
             project_id=project_id,
             name=project_data.name,
             admin_bot_id=project_data.admin_bot_id,
@@ -103,6 +106,8 @@ class ProjectHandler(BaseHandler):
             payment_destination=project_data.payment_destination,
             payment_system_id=project_data.payment_system_id,
         )
+        await self.invalidate_roles()
+        return project
 
 
 class TariffHandler(BaseHandler):
@@ -121,14 +126,15 @@ class TariffHandler(BaseHandler):
         if not (prof.user_get_project_by_id(project_id)):
             raise HTTPException(status_code=401, detail='Not enough permission')
 
-        tariffs = []
-
-        for tariff in tariffs_list_data.tariffs:
-            tmp_tariff = tariff.dict()
-            tmp_tariff['project_id'] = project_id
-            tariffs.append(tmp_tariff)
-
-        return await TariffDatasource(session=self.session).bulk_insert(tariffs)
+        try:
+            inserted = await TariffDatasource(session=self.session).save_project_tariffs(
+                project_id, [tariff.dict() for tariff in tariffs_list_data.tariffs])
+        except IntegrityError:
+            await self.session.rollback()
+            raise HTTPException(status_code=409, detail='Tariff already exists')
+        await self.invalidate_roles()
+        await self.invalidate_project_tariffs(project_id)
+        return inserted
 
     async def get_tariffs(self, bg_tasks: BackgroundTasks, project_id: int) -> list[TariffModel]:
         await self.get_roles()
@@ -148,10 +154,13 @@ class TariffHandler(BaseHandler):
         if not (project := prof.user_get_project_by_id(project_id)):
             raise HTTPException(status_code=401, detail='Not enough permission')
 
-        return await TariffDatasource(session=self.session).update_tariff(
+        tariff = await TariffDatasource(session=self.session).update_tariff(
             tariff_id=tariff_id,
             name=tariff_data.name,
             description=tariff_data.description,
             payment_amount=tariff_data.payment_amount,
             subscribe_duration=tariff_data.subscribe_duration
         )
+        await self.invalidate_roles()
+        await self.invalidate_project_tariffs(project_id)
+        return tariff
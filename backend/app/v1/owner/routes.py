@@ -5,6 +5,7 @@ from starlette.requests import Request
 from libs import logging
 from libs.database.models import Project
 from libs.database.sql_alchemy import pass_db_session, Session
+from libs.database.sql_alchemy.query_stats import query_budget
 from libs.dependencies import ParticipantsInfo
 from libs.shared import TariffListResponse
 from libs.payment_systems.lava_top.models import LavaTopProductsResponse
@@ -40,6 +41,7 @@ router = APIRouter(
 
 
 @router.get("/projects", response_model=ProjectListResponse)
+@query_budget(10)
 async def owner_projects_list(
         request: Request,
         background_tasks: BackgroundTasks,
@@ -74,6 +76,7 @@ async def owner_project_create(
 
 
 @router.get("/projects/{project_id}", response_model=ProjectResponse)
+@query_budget(10)
 async def owner_projects_get(
         project_id: int,
         request: Request,
@@ -174,6 +177,7 @@ async def owner_project_tariff_update(
 
 
 @router.get("/projects/{project_id}/tariffs", response_model=TariffListResponse)
+@query_budget(10)
 async def owner_projects_tariffs_get(
         project_id: int,
         request: Request,
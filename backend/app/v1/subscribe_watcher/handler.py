@@ -2,8 +2,11 @@ from fastapi import BackgroundTasks
 
 from libs import logging
 from libs.database.models.user import ProfileTypes
+from libs.database.datasources.tariff import TariffDatasource
 from libs.database.datasources.user import UserDatasource, UserProfileDatasource
+from libs.identity import identity_resolver
 
+from app.v1.general.cache import ProjectTariffsCache
 from app.v1.general.handler import BaseHandler
 
 log = logging.getLogger('watcher_handler')
@@ -13,13 +16,17 @@ class SubscriptionHandler(BaseHandler):
     metrics_prefix = 'subscription'
 
     async def _check_user(self):
-        await self.get_roles()
+        # граф бота подписчикам не нужен - только пользователь и снимок бота.
+        # У бота без проекта снимка нет: подписки нет, тарифов нет, как и раньше
+        self.user = await identity_resolver.resolve(self.session, self.participants.user.telegram_id)
+        await self.get_bot_context()
 
         if not self.user:
             self.user = await UserDatasource(session=self.session).save(
                 user_tg_id=self.participants.user.telegram_id,
                 settings={}
             )
+            await self.invalidate_roles()
 
         if not self.user.get_profile_by_type_name(ProfileTypes.SUBSCRIBER):
             prof = await UserProfileDatasource(session=self.session).save(
@@ -27,6 +34,7 @@ class SubscriptionHandler(BaseHandler):
                 profile_type=ProfileTypes.SUBSCRIBER
             )
             self.user.user_profile.append(prof)
+            await self.invalidate_roles()
 
     async def get_subscription_info(self, bg_tasks: BackgroundTasks):
         await self._check_user()
@@ -36,6 +44,14 @@ class SubscriptionHandler(BaseHandler):
     async def get_tariff_list(self, bg_tasks: BackgroundTasks):
         await self._check_user()
 
-        project = self.bot.get_profile_by_type_name(ProfileTypes.BOT).projects[0]
-
-        return project.tariffs
+        if not self.bot_context:
+            return []
+        project_id = self.bot_context.project_id
+
+        # список общий для всех подписчиков бота - при истечении ключа грузим его один раз, а не в каждом запросе
+        return await ProjectTariffsCache().get_or_compute(
+            ProjectTariffsCache.project_key(project_id),
+            # все тарифы проекта, как project.tariffs до кеша
+            lambda: TariffDatasource(session=self.session).get_project_tariffs(project_id, active_only=False),
+            lock=True,
+        )
@@ -4,6 +4,7 @@ from starlette.requests import Request
 
 from libs import logging
 from libs.database.sql_alchemy import pass_db_session, Session
+from libs.database.sql_alchemy.query_stats import query_budget
 from libs.dependencies import ParticipantsInfo
 from libs.shared import TariffListResponse
 from libs.web_service.middleware.headers_parser import get_request_id
@@ -21,6 +22,7 @@ router = APIRouter(
 
 
 @router.get("/tariffs", response_model=TariffListResponse)
+@query_budget(8)
 async def tariffs_list(
         request: Request,
         background_tasks: BackgroundTasks,
@@ -38,6 +40,7 @@ async def tariffs_list(
 
 # Ручка для получения текущих подписок пользователя
 @router.get("/subscription", response_model=SubscriptionInfoResponse)
+@query_budget(10)
 async def subscription_info(
         request: Request,
         background_tasks: BackgroundTasks,
@@ -0,0 +1,152 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+from redis.asyncio.cluster import RedisCluster
+
+from libs import logging
+
+from .breaker import log_call_error
+
+if TYPE_CHECKING:
+    from .client import RedisCache
+
+logger = logging.getLogger('redis')
+
+
+class CacheBatch:
+    """
+    Collects cache calls and sends them in one pipeline on exit, every call returns a future:
+
+        async with cache.batch() as batch:
+            user = batch.get('user')
+            batch.set('bot', bot)
+        user.result()
+
+    Errors are logged and resolve futures with None, as single RedisCache calls do.
+    With `transaction=True` the pipeline is wrapped into MULTI/EXEC.
+    """
+
+    def __init__(self, cache: 'RedisCache', transaction: bool = False):
+        self._cache = cache
+        self._transaction = transaction
+        self._calls: list[tuple[Callable, Callable[[Any], Any], asyncio.Future]] = []
+
+    @property
+    def _serializer(self):
+        return self._cache._serializer
+
+    def _add(self, command: Callable, decode: Callable[[Any], Any] = lambda out: out) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._calls.append((command, decode, future))
+        return future
+
+    def get(self, key: str) -> asyncio.Future:
+        key_ = self._serializer.encode_key(key)
+        return self._add(lambda pipe: pipe.get(key_), self._serializer.decode)
+
+    def mget(self, keys: Iterable[str]) -> asyncio.Future:
+        keys = list(keys)
+        keys_ = [self._serializer.encode_key(key) for key in keys]
+        return self._add(lambda pipe: pipe.mget(keys_),
+                         lambda out: dict(zip(keys, [self._serializer.decode(value) for value in out])))
+
+    def set(self, key: str, data: Any) -> asyncio.Future:
+        key_, value_ = self._serializer.encode(key, data)
+        if not value_:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            return future
+        return self._add(lambda pipe: pipe.set(key_, value_, px=self._cache.expire))
+
+    def hget(self, name: str, key: str) -> asyncio.Future:
+        name_, key_ = self._serializer.encode_key(name), self._serializer.encode_key(key)
+        return self._add(lambda pipe: pipe.hget(name_, key_), self._serializer.decode)
+
+    def hset(self, name: str, key: str, data: Any) -> asyncio.Future:
+        name_ = self._serializer.encode_key(name)
+        key_, value_ = self._serializer.encode(key, data)
+        future = self._add(lambda pipe: pipe.hset(name_, key=key_, value=value_))
+        if self._cache.expire:
+            self._add(lambda pipe: pipe.pexpire(name_, self._cache.expire))
+        return future
+
+    def delete(self, name: str, keys: Iterable[str] | None = None) -> asyncio.Future:
+        keys_ = [self._serializer.encode_key(key) for key in (keys or (name,))]
+        return self._add(lambda pipe: pipe.delete(*keys_))
+
+    async def execute(self):
+        calls, self._calls = self._calls, []
+        if not calls:
+            return
+        try:
+            async with self._cache.measure('batch'):
+                async with self._cache.client.pipeline(transaction=self._transaction) as pipe:
+                    for command, _, _ in calls:
+                        command(pipe)
+                    results = await pipe.execute(raise_on_error=False)
+        except Exception:
+            log_call_error('Error executing redis pipeline', extra={'size': len(calls)})
+            results = [None] * len(calls)
+
+        for (_, decode, future), out in zip(calls, results):
+            if isinstance(out, Exception):
+                logger.error('Error in redis pipeline command', extra={'error': repr(out)})
+                out = None
+            future.set_result(None if out is None else decode(out))
+
+    def cancel(self):
+        calls, self._calls = self._calls, []
+        for _, _, future in calls:
+            future.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            await self.execute()
+        else:
+            self.cancel()
+
+
+class GetCoalescer:
+    """
+    Sends get() calls issued within one event loop tick as a single MGET.
+    In cluster mode keys of different slots can't share MGET, there it is one MGET per slot
+    """
+
+    def __init__(self):
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._client = None
+
+    def get(self, client, key_: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            self._client = client
+            loop.call_soon(self._schedule_flush)
+        self._pending.setdefault(key_, []).append(future)
+        return future
+
+    def _schedule_flush(self):
+        asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        try:
+            if isinstance(self._client, RedisCluster):
+                values: list[Optional[Any]] = await self._client.mget_nonatomic(keys)
+            else:
+                values = await self._client.mget(keys)
+        except Exception as exc:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+            return
+
+        for key, value in zip(keys, values):
+            for future in pending[key]:
+                if not future.done():
+                    future.set_result(value)
@@ -0,0 +1,110 @@
+import asyncio
+import sys
+import time
+from enum import IntEnum
+
+from redis import asyncio as aioredis
+
+from libs import logging, metrics
+from libs.config import settings
+from libs.utils.time import timedelta_from_duration
+
+from .exceptions import CacheCircuitOpenError
+
+logger = logging.getLogger('redis')
+
+breaker_settings = settings.CACHE.get('BREAKER', {})
+
+# errors which mean redis is not reachable, everything else (serialization, wrong type, ...) is the caller's problem
+CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, aioredis.ConnectionError, aioredis.TimeoutError)
+
+
+class BreakerState(IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker(metrics.BasePrometheusMixin):
+    """
+    Counts consecutive connection failures of a redis client. After `failure_threshold` of them cache calls
+    are answered as a miss without touching the network for `reset_timeout` seconds, then one trial call
+    is let through (half-open): success closes the circuit, failure opens it again.
+    """
+    metrics_prefix = 'redis_circuit_breaker'
+    service_name = 'redis_circuit_breaker'
+
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = breaker_settings.get('FAILURE_THRESHOLD', 3),
+                 reset_timeout: float = timedelta_from_duration(
+                     breaker_settings.get('RESET_TIMEOUT', '5s')).total_seconds()):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BreakerState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    @metrics.metric
+    def breaker_state(self):
+        return metrics.Gauge('Circuit breaker state: 0 - closed, 1 - half-open, 2 - open', labelnames=('client',))
+
+    @metrics.metric
+    def transitions(self):
+        return metrics.Counter('Circuit breaker state changes', labelnames=('client', 'state'))
+
+    @metrics.metric
+    def short_circuited(self):
+        return metrics.Counter('Cache calls answered as a miss because the circuit is open', labelnames=('client',))
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != BreakerState.CLOSED
+
+    def allow(self) -> bool:
+        if self.state == BreakerState.CLOSED:
+            return True
+        if self.state == BreakerState.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set(BreakerState.HALF_OPEN)
+        if self.state == BreakerState.HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        self.short_circuited.labels(self.name).inc()
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._trial = False
+        if self.state != BreakerState.CLOSED:
+            self._set(BreakerState.CLOSED)
+
+    def release_trial(self):
+        """ The trial call ended without an answer from redis (cancelled), the next call becomes the trial """
+        self._trial = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial = False
+        if self.state == BreakerState.HALF_OPEN or self._failures >= self.failure_threshold:
+            self.open()
+
+    def open(self):
+        self._opened_at = time.monotonic()
+        if self.state != BreakerState.OPEN:
+            self._set(BreakerState.OPEN)
+
+    def _set(self, state: BreakerState):
+        log = logger.warning if state == BreakerState.OPEN else logger.info
+        log(f'Redis circuit breaker {self.name} is {state.name.lower()}')
+        self.state = state
+        self.breaker_state.labels(self.name).set(int(state))
+        self.transitions.labels(self.name, state.name.lower()).inc()
+
+
+def log_call_error(message: str, **kwargs):
+    """ logger.exception for a failed cache call, short-circuited calls are not logged - the breaker already did """
+    if isinstance(sys.exc_info()[1], CacheCircuitOpenError):
+        return
+    logger.exception(message, **kwargs)
@@ -1,7 +1,12 @@
 import asyncio
 import json
+import math
+import random
+import time
+from contextlib import asynccontextmanager
 from datetime import timedelta
-from typing import Any, Iterable, Optional, Union
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Union
+from uuid import uuid4
 
 from dynaconf.utils.boxing import DynaBox
 from redis import asyncio as aioredis
@@ -12,37 +17,80 @@ from libs import logging
 from libs.config import settings
 from libs.utils.time import timedelta_from_duration
 
+from .batch import CacheBatch, GetCoalescer
+from .breaker import CONNECTION_ERRORS, CircuitBreaker, log_call_error
+from .exceptions import CacheCircuitOpenError
 from .interface import CacheInterface, RedisStorageInterface
 from .prometheus import CachePrometheusMixin
+from .sampler import masked_key
 from .serializers import (DefaultSerializer, EncryptableSerializer,
-                          HashableSerializer, RedisRecordSerializer)
+                          HashableSerializer, NamespacedSerializer, RedisRecordSerializer)
 
 logger = logging.getLogger('redis')
 
+# compare-and-delete, so an expired lock taken over by other worker is not released
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class _LeaderCancelled(Exception):
+    """ get_or_compute loader call was cancelled together with the request which started it """
+
 
 class DictCache(CacheInterface):
+    """ Process-local cache. `expire` has the same meaning as for RedisCache (int - milliseconds) """
 
-    def __init__(self):
+    def __init__(self, expire: Optional[Union[int, timedelta]] = None):
         self.data: dict = {}
+        self.expire = expire
+        self._expires_at: dict[str, float] = {}
 
     @property
     def size(self):
         return len(self.data)
 
+    @property
+    def _ttl_seconds(self) -> Optional[float]:
+        if isinstance(self.expire, timedelta):
+            return self.expire.total_seconds()
+        return self.expire / 1000 if self.expire else None
+
+    def _is_expired(self, key: str) -> bool:
+        expires_at = self._expires_at.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self._expires_at.pop(key, None)
+            return True
+        return False
+
+    def _touch(self, key: str):
+        if ttl := self._ttl_seconds:
+            self._expires_at[key] = time.monotonic() + ttl
+
     async def get(self, key: str, obj_type: Any = None):
+        if self._is_expired(key):
+            return None
         return self.data.get(key)
 
     async def mget(self, keys: Iterable[str], obj_type: Any = None) -> dict[str, Any]:
-        return {key: value for key, value in self.data.items() if key in keys}
+        return {key: self.data[key] for key in keys if key in self.data and not self._is_expired(key)}
 
     async def set(self, key: str, data: Any) -> None:
         self.data[key] = data
+        self._touch(key)
 
     async def mset(self, content: dict[str, Any]) -> None:
         self.data.update(content)
+        for key in content:
+            self._touch(key)
+
+    async def delete(self, name: str, keys: Iterable[str] | None = None):
+        for key in (keys or (name,)):
+            self.data.pop(key, None)
+            self._expires_at.pop(key, None)
 
     async def clear(self):
         self.data.clear()
+        self._expires_at.clear()
 
 
 class RedisCache(RedisStorageInterface, CachePrometheusMixin):
@@ -50,19 +98,26 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
     ping_timeout = 1
     fabric_settings: DynaBox = None
 
-    encrypt_keys: bool = True,
-    encrypt_data: bool = True,
+    encrypt_keys: bool = True
+    encrypt_data: bool = True
     expire: Optional[Union[int, timedelta]] = None
+    key_prefix: Optional[str] = None  # keeps keys of different caches apart, readable even with hashed keys
 
     key_serializer = DefaultSerializer()
     value_serializer = DefaultSerializer()
 
     is_transaction: bool = False
+    auto_batch: bool = False  # concurrent get() calls of one event loop tick are sent as a single MGET
+
+    lock_timeout: int = 5000  # ms, get_or_compute lock lifetime, must exceed loader duration
+    lock_wait: float = 2  # seconds to wait for other worker's loader before computing ourselves
+    lock_poll_interval: float = 0.05
 
     def __init__(self, is_transaction: bool = False):
+        key_serializer = HashableSerializer(self.key_serializer) if self.encrypt_keys else self.key_serializer
         self._serializer = RedisRecordSerializer(
-            key_serializer=(HashableSerializer(self.key_serializer)
-                            if self.encrypt_keys else self.key_serializer),
+            key_serializer=(NamespacedSerializer(key_serializer, self.key_prefix)
+                            if self.key_prefix else key_serializer),
             value_serializer=(EncryptableSerializer(self.value_serializer)
                               if self.encrypt_data else self.value_serializer),
         )
@@ -76,6 +131,183 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
             cls.fabric_settings = settings.CACHE
         return RedisClientFabric(config=cls.fabric_settings)
 
+    def batch(self) -> CacheBatch:
+        return CacheBatch(self)
+
+    def transaction(self) -> CacheBatch:
+        return CacheBatch(self, transaction=True)
+
+    @classmethod
+    def breaker(cls) -> CircuitBreaker:
+        """ One breaker per client: it lives on the class the client was initialised on """
+        owner = next((klass for klass in cls.__mro__ if klass.__dict__.get('client') is not None), cls)
+        if '_circuit_breaker' not in owner.__dict__:
+            owner._circuit_breaker = CircuitBreaker(owner.__name__)
+        return owner._circuit_breaker
+
+    @asynccontextmanager
+    async def measure(self, action, key: Optional[str] = None, keys: Iterable[str] = ()):
+        breaker = self.breaker()
+        if not breaker.allow():
+            raise CacheCircuitOpenError(f'Redis circuit breaker {breaker.name} is open')
+        try:
+            async with super().measure(action, key, keys) as call:
+                yield call
+        except CONNECTION_ERRORS:
+            breaker.record_failure()
+            raise
+        except Exception:
+            breaker.record_success()  # redis answered, the error is ours
+            raise
+        except BaseException:
+            breaker.release_trial()  # cancelled: no verdict, let the next call try
+            raise
+        breaker.record_success()
+
+    @classmethod
+    def _coalescer(cls) -> GetCoalescer:
+        if '_get_coalescer' not in cls.__dict__:
+            cls._get_coalescer = GetCoalescer()
+        return cls._get_coalescer
+
+    @classmethod
+    def _inflight(cls) -> dict[str, asyncio.Future]:
+        if '_inflight_loads' not in cls.__dict__:
+            cls._inflight_loads = {}
+        return cls._inflight_loads
+
+    async def get_or_compute(self,
+                             key: str,
+                             loader: Callable[[], Awaitable[Any]],
+                             ttl: Optional[Union[int, timedelta]] = None,
+                             lock: bool = False,
+                             beta: float = 1.0) -> Any:
+        """
+        Read-through with stampede protection, loader runs once per key per expiry window:
+        - concurrent calls in the process share one loader call (single flight);
+        - with `lock` one worker computes under SET NX PX lock, others wait for its result;
+        - value is recomputed a bit before expiry with probability growing to its end (XFetch),
+          the loader duration is kept in `<key>:xfetch` record. `beta` > 1 favours earlier recompute.
+        None results are not cached.
+        """
+        if not self.client:
+            return await loader()
+
+        inflight = self._inflight()
+        while (future := inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                continue  # leader's request went away, one of the followers loads the value instead
+
+        future = inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._get_or_compute(key, loader, ttl or self.expire, lock, beta)
+        except asyncio.CancelledError:
+            # followers must not share the cancellation of an unrelated request
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # followers get it, do not warn about unretrieved exception
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            inflight.pop(key, None)
+
+    @staticmethod
+    def _should_recompute(pttl: int, delta: Optional[str], beta: float) -> bool:
+        if not delta or pttl is None or pttl < 0:
+            return False
+        return pttl / 1000 <= -float(delta) * beta * math.log(1 - random.random())
+
+    async def _get_or_compute(self, key: str, loader: Callable[[], Awaitable[Any]],
+                              ttl: Optional[Union[int, timedelta]], lock: bool, beta: float) -> Any:
+        key_ = self._serializer.encode_key(key)
+        delta_key_ = self._serializer.encode_key(f'{key}:xfetch')
+        try:
+            async with self.measure('get_or_compute', key) as call:
+                async with self.client.pipeline(transaction=False) as pipe:
+                    pipe.get(key_)
+                    pipe.pttl(key_)
+                    pipe.get(delta_key_)
+                    out, pttl, delta = await pipe.execute()
+                call.lookup((out,))
+            value = None if out is None else self._serializer.decode(out)
+        except Exception:
+            log_call_error('Error trying get value from redis')
+            return await loader()
+
+        if value is not None and not self._should_recompute(pttl, delta, beta):
+            return value
+
+        lock_key = f'{key}:lock'
+        lock_key_ = self._serializer.encode_key(lock_key)
+        token = uuid4().hex
+        if lock and not await self._acquire_lock(lock_key, lock_key_, token):
+            if value is not None:  # other worker is recomputing, stale value is still valid
+                return value
+            if (value := await self._wait_for(key, key_)) is not None:
+                return value
+            lock = False
+
+        try:
+            begin = time.perf_counter()
+            value = await loader()
+            await self._store_computed(key, key_, delta_key_, value, time.perf_counter() - begin, ttl)
+        finally:
+            if lock:
+                await self._release_lock(lock_key, lock_key_, token)
+        return value
+
+    async def _store_computed(self, key: str, key_: str, delta_key_: str, value: Any, delta: float,
+                              ttl: Optional[Union[int, timedelta]]):
+        if value is None:
+            return
+        _, value_ = self._serializer.encode(key, value)
+        try:
+            async with self.measure('set', key) as call:
+                async with self.client.pipeline(transaction=False) as pipe:
+                    pipe.set(key_, value_, px=ttl)
+                    pipe.set(delta_key_, f'{delta:.6f}', px=ttl)
+                    await pipe.execute()
+                call.write((value_,))
+        except Exception:
+            log_call_error('Error setting value to redis')
+
+    async def _acquire_lock(self, lock_key: str, lock_key_: str, token: str) -> bool:
+        try:
+            async with self.measure('lock', lock_key):
+                return bool(await self.client.set(lock_key_, token, nx=True, px=self.lock_timeout))
+        except Exception:
+            log_call_error('Error acquiring redis lock')
+            return True
+
+    async def _release_lock(self, lock_key: str, lock_key_: str, token: str):
+        try:
+            async with self.measure('unlock', lock_key):
+                await self.client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key_, token)
+        except Exception:
+            log_call_error('Error releasing redis lock')
+
+    async def _wait_for(self, key: str, key_: str) -> Any:
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_interval)
+            try:
+                async with self.measure('lock_wait', key) as call:
+                    out = await self.client.get(key_)
+                    call.lookup((out,))
+                if out is not None:
+                    return self._serializer.decode(out)
+            except Exception:
+                log_call_error('Error trying get value from redis')
+                return None
+        return None
+
     async def __aenter__(self):
         return self
 
@@ -95,6 +327,20 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
         await cls.client.initialize()
         return instance
 
+    @classmethod
+    async def reconnect(cls):
+        """ Replaces the client with a new one (new pool or single connection), the old one is closed """
+        client = await cls.__fabric().create_client(
+            client_settings=RedisClientSettings.from_settings(config=cls.client_settings)
+        )
+        await client.initialize()
+        old, cls.client = cls.client, client
+        if old is not None:
+            try:
+                await old.aclose()
+            except Exception:
+                logger.debug('Error closing old redis client', exc_info=True)
+
     @property
     def client_settings(self) -> DynaBox:
         raise NotImplementedError
@@ -107,16 +353,80 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
 
     async def exists(self, key: str) -> bool:
         key_ = self._serializer.encode_key(key)
-        return bool(await self.client.exists(key_))
+        async with self.measure('exists', key):
+            return bool(await self.client.exists(key_))
 
     async def keys(self, pattern: str) -> list[str]:
+        """ Keys are returned without key_prefix; with hashed keys the only pattern is "*" (all keys of the cache) """
         try:
-            async with self.measure('keys'):
-                return await self.client.keys(pattern)
+            return [key async for key in self.iter_keys(pattern)]
         except Exception:
-            logger.exception('Error trying get value from redis')
+            log_call_error('Error trying get value from redis')
             return []
 
+    async def iter_keys(self, pattern: str = '*', count: int = 1000) -> AsyncIterator[str]:
+        """ Non-blocking KEYS: SCAN by `count` keys per call, on every primary of a cluster """
+        async for key_ in self._scan(self._serializer.encode_pattern(pattern), count):
+            yield self._serializer.decode_key(key_)
+
+    async def _scan(self, match: str, count: int) -> AsyncIterator[str]:
+        targets = self.client.get_primaries() if isinstance(self.client, RedisCluster) else (None,)
+        for node in targets:
+            options = {'target_nodes': node} if node else {}
+            cursor = 0
+            while True:
+                async with self.measure('scan'):
+                    cursor, keys_ = await self.client.scan(cursor, match=match, count=count, **options)
+                if isinstance(cursor, dict):  # cluster answers by node name
+                    cursor = cursor[node.name]
+                for key_ in keys_:
+                    yield key_
+                if not cursor:
+                    break
+
+    async def iter_hash(self, name: str, pattern: str = '*', count: int = 1000) -> AsyncIterator[tuple[str, Any]]:
+        """ HSCAN over hash `name`, fields are returned as stored (hashed with encrypt_keys) """
+        async for field, out in self.client.hscan_iter(self._serializer.encode_key(name),
+                                                       match=self._serializer.encode_pattern(pattern), count=count):
+            yield self._serializer.decode_key(field), self._serializer.decode(out)
+
+    async def iter_set(self, name: str, pattern: str = '*', count: int = 1000) -> AsyncIterator[Any]:
+        """ SSCAN over set `name` """
+        async for member in self.client.sscan_iter(self._serializer.encode_key(name), match=pattern, count=count):
+            yield self._serializer.decode(member)
+
+    async def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """
+        Deletes keys matching `pattern` found by SCAN, UNLINK is sent in pipelined batches of `batch_size`,
+        so neither scan nor delete blocks the server. Returns the number of deleted keys.
+        """
+        deleted = 0
+        try:
+            match = self._serializer.encode_pattern(pattern)
+            if match == '*':
+                raise ValueError('Refusing to delete every key of the database, set key_prefix or use flushdb')
+            batch = []
+            async for key_ in self._scan(match, batch_size):
+                batch.append(key_)
+                if len(batch) >= batch_size:
+                    deleted += await self._unlink(batch)
+                    batch = []
+            if batch:
+                deleted += await self._unlink(batch)
+        except Exception:
+            log_call_error('Error deleting keys from redis', extra={'pattern': pattern})
+        return deleted
+
+    async def _unlink(self, keys_: list[str]) -> int:
+        async with self.measure('unlink'):
+            async with self.client.pipeline(transaction=False) as pipe:
+                if isinstance(self.client, RedisCluster):  # keys of one batch live in different slots
+                    for key_ in keys_:
+                        pipe.unlink(key_)
+                else:
+                    pipe.unlink(*keys_)
+                return sum(await pipe.execute())
+
     async def get(self, key: str, obj_type: Any = None) -> Any:
         # TODO: Remove obj_type argument
         if not key:
@@ -124,13 +434,15 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
 
         key_ = self._serializer.encode_key(key)
         try:
-            async with self.measure('get'):
-                out = await self.client.get(key_)
-                self._hit = bool(out)
-                self._miss = not self._hit
+            async with self.measure('get', key) as call:
+                if self.auto_batch and not self.is_transaction:
+                    out = await self._coalescer().get(self.client, key_)
+                else:
+                    out = await self.client.get(key_)
+                call.lookup((out,))
             return self._serializer.decode(out)
         except Exception:
-            logger.exception('Error trying get value from redis')
+            log_call_error('Error trying get value from redis')
             return None
 
     async def mget(self, keys: Iterable[str], obj_type: Any = None) -> dict[str, Any]:
@@ -139,28 +451,26 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
 
         keys_ = [self._serializer.encode_key(key) for key in keys]
         try:
-            async with self.measure('mget'):
+            async with self.measure('mget', keys=keys) as call:
                 results = await self.client.mget(keys_)
-                self._hit = bool(results)
-                self._miss = not self._hit
+                call.lookup(results)
             return dict(zip(keys, [self._serializer.decode(out) for out in results]))
         except Exception:
-            logger.exception('Error trying mget value from redis')
+            log_call_error('Error trying mget value from redis')
             return {}
 
     async def hget(self, name: str, key: str) -> Any:
         if not key:
             return None
 
-        key_ = self._serializer.encode_key(key)
+        name_, key_ = self._serializer.encode_key(name), self._serializer.encode_key(key)
         try:
-            async with self.measure('hget'):
-                out = await self.client.hget(name, key_)
-                self._hit = bool(out)
-                self._miss = not self._hit
+            async with self.measure('hget', f'{name}:{key}') as call:
+                out = await self.client.hget(name_, key_)
+                call.lookup((out,))
             return self._serializer.decode(out)
         except Exception:
-            logger.exception('Error trying get value from redis')
+            log_call_error('Error trying get value from redis')
             return None
 
     async def hgetall(self, name: str) -> dict[str, Any]:
@@ -169,13 +479,13 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
 
         key_ = self._serializer.encode_key(name)
         try:
-            async with self.measure('hgetall'):
+            async with self.measure('hgetall', f'{name}:*') as call:
                 out = await self.client.hgetall(key_)
-                self._hit = bool(out)
-                self._miss = not self._hit
+                call.lookup((out or None,))
+                call.write(out.values())
             return {k: self._serializer.decode(v) for k, v in out.items()}
         except Exception:
-            logger.exception('Error trying get value from redis')
+            log_call_error('Error trying get value from redis')
             return {}
 
     async def hmget(self, name: str, keys: Iterable[str]) -> dict[str, Any]:
@@ -184,75 +494,90 @@ class RedisCache(RedisStorageInterface, CachePrometheusMixin):
 
         keys_ = [self._serializer.encode_key(key) for key in keys]
         try:
-            async with self.measure('hmget'):
-                results = await self.client.hmget(name, keys_)
-                self._hit = bool(results)
-                self._miss = not self._hit
+            async with self.measure('hmget', keys=[f'{name}:{key}' for key in keys]) as call:
+                results = await self.client.hmget(self._serializer.encode_key(name), keys_)
+                call.lookup(results)
             return dict(zip(keys, [self._serializer.decode(out) for out in results]))
         except Exception:
-            logger.exception('Error trying mget value from redis')
+            log_call_error('Error trying mget value from redis')
             return {}
 
-    @staticmethod
-    def masked_key(key: str):
-        return f'{"*" * (len(key) - 3)}{key[-3:]}'
+    masked_key = staticmethod(masked_key)
 
     async def set(self, key: str, data: Any) -> None:
         key_, value_ = self._serializer.encode(key, data)
         if value_:
             try:
-                async with self.measure('set'):
+                async with self.measure('set', key) as call:
                     await self.client.set(key_, value_, px=self.expire)
+                    call.write((value_,))
 
                 logger.info(f'{data.__class__.__name__!r} set to cache with key {self.masked_key(key)}')
             except Exception:
-                logger.exception('Error setting value to redis')
+                log_call_error('Error setting value to redis')
 
     async def mset(self, content: dict[str, Any]) -> None:
         try:
-            async with self.measure('mset'):
-                content_ = dict([self._serializer.encode(key, value) for key, value in content.items()])
-                await self.client.mset(content_)
+            async with self.measure('mset', keys=content.keys()) as call:
+                content_ = self._serializer.encode_many(content)
+                call.write(content_.values())
+                if self.expire:  # MSET can't set TTL
+                    async with self.client.pipeline(transaction=False) as pipe:
+                        for key_, value_ in content_.items():
+                            pipe.set(key_, value_, px=self.expire)
+                        await pipe.execute()
+                else:
+                    await self.client.mset(content_)
         except Exception:
-            logger.exception('Error setting value to redis')
+            log_call_error('Error setting value to redis')
 
     async def hset(self, name: str, key: str, data: Any) -> None:
         key_, value_ = self._serializer.encode(key, data)
         if value_:
             try:
-                async with self.measure('hset'):
-                    await self.client.hset(name, key=key_, value=value_)
+                name_ = self._serializer.encode_key(name)
+                async with self.measure('hset', f'{name}:{key}') as call:
+                    await self.client.hset(name_, key=key_, value=value_)
+                    if self.expire:
+                        await self.client.pexpire(name_, self.expire)
+                    call.write((value_,))
                 logger.info(f'{type(data)} set to cache with key {self.masked_key(key)}')
             except Exception:
-                logger.exception('Error setting value to redis')
+                log_call_error('Error setting value to redis')
 
     async def hmset(self, name: str, content: dict[str, Any]) -> None:
         try:
-            async with self.measure('hmset'):
-                content_ = dict([self._serializer.encode(key, value) for key, value in content.items()])
-                await self.client.hmset(name, content_)
+            async with self.measure('hmset', f'{name}:*') as call:
+                content_ = self._serializer.encode_many(content)
+                call.write(content_.values())
+                name_ = self._serializer.encode_key(name)
+                await self.client.hset(name_, mapping=content_)
+                if self.expire:
+                    await self.client.pexpire(name_, self.expire)
         except Exception:
-            logger.exception('Error setting value to redis')
+            log_call_error('Error setting value to redis')
 
     async def hdel(self, name: str, keys: Iterable[str] | None = None):
+        """ Deletes `keys` fields of hash `name`, the whole hash without keys """
+        name_ = self._serializer.encode_key(name)
         try:
             async with self.measure('hdel'):
                 if keys:
-                    await self.client.hdel(name, *keys)
+                    await self.client.hdel(name_, *[self._serializer.encode_key(key) for key in keys])
                 else:
-                    await self.client.hdel(name)
+                    await self.client.delete(name_)
         except Exception:
-            logger.exception('Error deleting value from redis')
+            log_call_error('Error deleting value from redis')
 
     async def delete(self, name: str, keys: Iterable[str] | None = None):
         try:
-            async with self.measure('delete'):
+            async with self.measure('delete', name if not keys else None, keys=keys or ()):
                 if keys:
-                    await self.client.delete(*keys)
+                    await self.client.delete(*[self._serializer.encode_key(key) for key in keys])
                 else:
-                    await self.client.delete(name)
+                    await self.client.delete(self._serializer.encode_key(name))
         except Exception:
-            logger.exception('Error deleting value from redis')
+            log_call_error('Error deleting value from redis')
 
     @classmethod
     async def is_available(cls) -> bool:
@@ -343,7 +668,7 @@ class RedisClientFabric:
                                     timeout=config.MAX_POOL_CONNECTIONS_TIMEOUT,
                                     socket_connect_timeout=config.SOCKET_CONNECT_TIMEOUT,
                                     encoding="utf-8",
-                                    decode_responses=True)
+                                    decode_responses=config.get('DECODE_RESPONSES', True))
 
     async def create_client(self, client_settings: RedisClientSettings, **options):
         _client_type = ''
@@ -398,6 +723,7 @@ class RedisClientFabric:
 class BaseCommonCache(RedisCache):
     client_settings = settings.CACHE.COMMON
 
-    encrypt_keys: bool = settings.CACHE.COMMON.USE_ENCRYPTION.KEY,
-    encrypt_data: bool = settings.CACHE.COMMON.USE_ENCRYPTION.VALUE,
-    expire: Optional[Union[int, timedelta]] = timedelta_from_duration(settings.CACHE.COMMON.TTL)
\ No newline at end of file
+    encrypt_keys: bool = settings.CACHE.COMMON.USE_ENCRYPTION.KEY
+    encrypt_data: bool = settings.CACHE.COMMON.USE_ENCRYPTION.VALUE
+    expire: Optional[Union[int, timedelta]] = timedelta_from_duration(settings.CACHE.COMMON.TTL)
+    auto_batch: bool = settings.CACHE.COMMON.get('AUTO_BATCH', False)
\ No newline at end of file
@@ -1,2 +1,6 @@
 class RedisStorageConnectionError(Exception):
     pass
+
+
+class CacheCircuitOpenError(RedisStorageConnectionError):
+    """ Redis is considered down, the call was not sent """
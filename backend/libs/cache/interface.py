@@ -18,6 +18,9 @@ class CacheInterface:
     async def mset(self, content: dict[str, Any]) -> None:
         raise NotImplementedError
 
+    async def delete(self, name: str, keys: Iterable[str] | None = None):
+        raise NotImplementedError
+
 
 class RedisStorageInterface(CacheInterface):
 
@@ -0,0 +1,126 @@
+import asyncio
+import inspect
+import json
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable, Optional, Type, Union
+from uuid import uuid4
+
+from libs import logging
+
+from .client import BaseCommonCache, RedisCache
+
+logger = logging.getLogger('redis')
+
+InvalidationHandler = Callable[[int], Union[None, Awaitable[None]]]
+KeysInvalidationHandler = Callable[[list[str]], Union[None, Awaitable[None]]]
+
+
+class InvalidationChannel:
+    """
+    Cross-process invalidation of process-local caches over Redis pub/sub.
+
+    Every namespace has a version stamp (Redis INCR), `publish` bumps it and broadcasts the new value.
+    Subscribers drop their data when a newer version arrives. Loaders compare `version(namespace)` taken before
+    and after a load to avoid storing data which was invalidated while it was being read.
+    `publish_keys` drops single keys without version bump, the publishing process is expected
+    to update its own data itself and skips its own messages.
+    Without Redis client the channel works in the current process only.
+    """
+    channel = 'cache:invalidation'
+    reconnect_delay = 1
+
+    def __init__(self, cache: Type[RedisCache] = BaseCommonCache):
+        self._cache = cache
+        self._handlers: dict[str, list[InvalidationHandler]] = defaultdict(list)
+        self._keys_handlers: dict[str, list[KeysInvalidationHandler]] = defaultdict(list)
+        self._origin = uuid4().hex
+        self._versions: dict[str, int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def client(self):
+        return self._cache.client
+
+    def version_key(self, namespace: str) -> str:
+        return f'{self.channel}:version:{namespace}'
+
+    def version(self, namespace: str) -> int:
+        return self._versions[namespace]
+
+    def subscribe(self, namespace: str, handler: InvalidationHandler):
+        self._handlers[namespace].append(handler)
+
+    def subscribe_keys(self, namespace: str, handler: KeysInvalidationHandler):
+        self._keys_handlers[namespace].append(handler)
+
+    async def publish_keys(self, namespace: str, keys: Iterable[str]):
+        if self.client:
+            await self.client.publish(self.channel, json.dumps({'namespace': namespace,
+                                                                'keys': list(keys),
+                                                                'origin': self._origin}))
+
+    async def publish(self, namespace: str) -> int:
+        if not self.client:
+            version = self._versions[namespace] + 1
+        else:
+            version = await self.client.incr(self.version_key(namespace))
+            await self.client.publish(self.channel, json.dumps({'namespace': namespace, 'version': version}))
+        await self._apply(namespace, version)
+        return version
+
+    @staticmethod
+    async def _call(handlers: list, argument):
+        for handler in handlers:
+            result = handler(argument)
+            if inspect.isawaitable(result):
+                await result
+
+    async def _apply(self, namespace: str, version: int):
+        if version <= self._versions[namespace]:
+            return
+        self._versions[namespace] = version
+        await self._call(self._handlers.get(namespace, []), version)
+        logger.debug('Local cache invalidated', extra={'namespace': namespace, 'version': version})
+
+    async def _on_message(self, data: Union[str, bytes]):
+        try:
+            message = json.loads(data)
+            if 'keys' in message:
+                if message.get('origin') != self._origin:
+                    await self._call(self._keys_handlers.get(message['namespace'], []), message['keys'])
+            else:
+                await self._apply(message['namespace'], int(message['version']))
+        except (ValueError, KeyError, TypeError):
+            logger.warning('Malformed invalidation message', extra={'data': data})
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                await pubsub.subscribe(self.channel)
+                try:
+                    async for message in pubsub.listen():
+                        if message.get('type') == 'message':
+                            await self._on_message(message['data'])
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Invalidation channel listener failed, reconnecting')
+            # messages sent while disconnected are lost, cached data lives until its TTL at most
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self):
+        """ Call it once at startup hook, after cache client initialisation """
+        if self.client and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+invalidation_channel = InvalidationChannel()
@@ -0,0 +1,113 @@
+import sys
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Callable, Iterable, Optional, Union
+
+from pydantic import BaseModel
+
+from .interface import CacheInterface
+
+
+def estimate_size(value: Any) -> int:
+    """ Cheap approximate size in bytes: object itself plus its first level attributes or items """
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, BaseModel):
+        value = value.__dict__
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache(CacheInterface):
+    """
+    Bounded process-local cache. Least recently used items are evicted when `max_items` or `max_bytes`
+    (estimated by `sizeof`) is exceeded. `expire` has the same meaning as for RedisCache (int - milliseconds).
+    None values are not stored.
+    """
+
+    def __init__(self,
+                 max_items: int = 1024,
+                 max_bytes: Optional[int] = None,
+                 expire: Optional[Union[int, timedelta]] = None,
+                 sizeof: Callable[[Any], int] = estimate_size):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.expire = expire
+        self._sizeof = sizeof
+        # key -> (value, expires at, size)
+        self._data: OrderedDict[str, tuple[Any, Optional[float], int]] = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    @property
+    def _ttl_seconds(self) -> Optional[float]:
+        if isinstance(self.expire, timedelta):
+            return self.expire.total_seconds()
+        return self.expire / 1000 if self.expire else None
+
+    def get_item(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at, _ = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.discard(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any):
+        if value is None:
+            return
+        self.discard(key)
+        ttl = self._ttl_seconds
+        size = self._sizeof(value) if self.max_bytes else 0
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None, size)
+        self._bytes += size
+        while self._data and (len(self._data) > self.max_items
+                              or (self.max_bytes and self._bytes > self.max_bytes)):
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self._bytes -= evicted
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def discard(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    async def get(self, key: str, obj_type: Any = None):
+        return self.get_item(key)
+
+    async def mget(self, keys: Iterable[str], obj_type: Any = None) -> dict[str, Any]:
+        return {key: value for key in keys if (value := self.get_item(key)) is not None}
+
+    async def set(self, key: str, data: Any) -> None:
+        self.put(key, data)
+
+    async def mset(self, content: dict[str, Any]) -> None:
+        for key, value in content.items():
+            self.put(key, value)
+
+    async def delete(self, name: str, keys: Iterable[str] | None = None):
+        for key in (keys or (name,)):
+            self.discard(key)
+
+    def reset(self):
+        self._data.clear()
+        self._bytes = 0
+
+    async def clear(self):
+        self.reset()
@@ -1,35 +1,122 @@
+import time
 from contextlib import asynccontextmanager
-from typing import ClassVar, Optional
+from typing import Any, ClassVar, Iterable, Optional
 
 from libs import metrics
 
+from .sampler import hot_keys
+
+PAYLOAD_BUCKETS = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576]
+
+
+def payload_size(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 0
+
+
+class CacheCall:
+    """ Per-call accounting, lives within a single `measure` block and is never shared between coroutines """
+    __slots__ = ('hits', 'misses', 'payload')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.payload = 0
+
+    def lookup(self, values: Iterable[Any]):
+        for value in values:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.payload += payload_size(value)
+
+    def write(self, values: Iterable[Any]):
+        self.payload += sum(payload_size(value) for value in values)
+
 
 class CachePrometheusMixin(metrics.BasePrometheusMixin):
     metrics_prefix: ClassVar[str] = 'UNDEFINED'
     service_name: ClassVar[str] = 'UNDEFINED'
     buckets: ClassVar[Optional[list[float]]] = metrics.DEFAULT_BUCKETS
-    _miss: bool = False
-    _hit: bool = False
+    latency_buckets: ClassVar[list[float]] = [.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0]
 
     @metrics.metric
     def cache_hit_count(self):
         return metrics.Counter(
-            f'Count of hits to cache {self.service_name or self.metrics_prefix}'
+            f'Count of hits to cache {self.service_name or self.metrics_prefix} by key namespace (key prefix)',
+            labelnames=('action', 'namespace')
         )
 
     @metrics.metric
     def cache_miss_count(self):
         return metrics.Counter(
-            f'Count of hits to cache {self.service_name or self.metrics_prefix}'
+            f'Count of misses to cache {self.service_name or self.metrics_prefix} by key namespace (key prefix)',
+            labelnames=('action', 'namespace')
+        )
+
+    @metrics.metric
+    def cache_latency_seconds(self):
+        return metrics.Histogram(
+            f'Duration of cache {self.service_name or self.metrics_prefix} calls by key namespace, in seconds',
+            labelnames=('action', 'namespace'),
+            buckets=self.latency_buckets,
+        )
+
+    @metrics.metric
+    def cache_payload_bytes(self):
+        return metrics.Histogram(
+            f'Size of values read from or written to cache {self.service_name or self.metrics_prefix}, in bytes',
+            labelnames=('action', 'namespace'),
+            buckets=PAYLOAD_BUCKETS,
+        )
+
+    @metrics.metric
+    def cache_tier_hit_count(self):
+        return metrics.Counter(
+            f'Count of hits to cache {self.service_name or self.metrics_prefix} by tier (l1 - process, l2 - redis)',
+            labelnames=('tier',)
         )
 
+    @metrics.metric
+    def cache_tier_miss_count(self):
+        return metrics.Counter(
+            f'Count of misses to cache {self.service_name or self.metrics_prefix} by tier (l1 - process, l2 - redis)',
+            labelnames=('tier',)
+        )
+
+    def count_tier(self, tier: str, hits: int = 0, misses: int = 0):
+        if hits:
+            self.cache_tier_hit_count.labels(tier).inc(hits)
+        if misses:
+            self.cache_tier_miss_count.labels(tier).inc(misses)
+
+    @staticmethod
+    def key_namespace(key: Optional[str]) -> str:
+        """ 'identity:user:42' -> 'identity:user'; numeric parts are masked to keep label cardinality low """
+        if not key or ':' not in key:
+            return '-'
+        return ':'.join('*' if part.isdigit() else part for part in key.split(':')[:-1])
+
     @asynccontextmanager
-    async def measure(self, action):
+    async def measure(self, action, key: Optional[str] = None, keys: Iterable[str] = ()):
+        call = CacheCall()
+        namespace = self.key_namespace(key or next(iter(keys), None))
+        for sampled in (key, *keys):
+            hot_keys.record(namespace, sampled)
+        labels = (action, namespace)
+        begin = time.perf_counter()
         try:
             async with super(CachePrometheusMixin, self).measure(action):
-                yield
+                yield call
         finally:
-            if self._hit:
-                self.cache_hit_count.inc()
-            if self._miss:
-                self.cache_miss_count.inc()
+            # failed and timed out calls are the slow ones, they count too
+            self.cache_latency_seconds.labels(*labels).observe(time.perf_counter() - begin)
+
+        if call.hits:
+            self.cache_hit_count.labels(*labels).inc(call.hits)
+        if call.misses:
+            self.cache_miss_count.labels(*labels).inc(call.misses)
+        if call.payload:
+            self.cache_payload_bytes.labels(*labels).observe(call.payload)
@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+from threading import Lock
+from typing import Optional
+
+from libs.config import settings
+
+hot_keys_settings = settings.CACHE.get('HOT_KEYS', {})
+
+
+def masked_key(key: str) -> str:
+    """ Keys hold telegram ids, only the tail is kept for logs and diagnostics """
+    return f'{"*" * (len(key) - 3)}{key[-3:]}'
+
+
+class HotKeySampler:
+    """
+    Approximate top of requested cache keys (masked). Every lookup is recorded with `rate` probability,
+    when more than `capacity` keys are tracked all counters are halved and zeros dropped,
+    so memory stays bounded and old keys fade out.
+    """
+
+    def __init__(self, rate: float = 0.01, capacity: int = 1000):
+        self.rate = rate
+        self.capacity = capacity
+        self._counts: Counter[tuple[str, str]] = Counter()
+        self._lock = Lock()
+
+    def record(self, namespace: str, key: Optional[str]):
+        if not key or not self.rate or random.random() >= self.rate:
+            return
+        with self._lock:
+            self._counts[(namespace, masked_key(key))] += 1
+            if len(self._counts) > self.capacity:
+                self._decay()
+
+    def _decay(self):
+        self._counts = Counter({item: count // 2 for item, count in self._counts.items() if count > 1})
+
+    def top(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            items = self._counts.most_common(limit)
+        return [{'namespace': namespace, 'key': key, 'samples': count, 'estimated': round(count / self.rate)}
+                for (namespace, key), count in items]
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+hot_keys = HotKeySampler(rate=hot_keys_settings.get('SAMPLE_RATE', 0.01),
+                         capacity=hot_keys_settings.get('CAPACITY', 1000))
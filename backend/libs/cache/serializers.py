@@ -1,4 +1,6 @@
+import base64
 import json
+from functools import lru_cache
 from typing import Any, Optional, Type, Union
 
 import pydantic
@@ -7,14 +9,41 @@ from pydantic import BaseModel, ValidationError, parse_obj_as
 if pydantic.__version__.startswith('2.'):
     from pydantic import TypeAdapter
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
 from libs import logging
+from libs.config import settings
 from libs.utils import crypt
 
-SimpleTypes = Union[str, int, float]
+SimpleTypes = Union[str, int, float, bytes]
 
 logger = logging.getLogger('redis')
 
 
+@lru_cache(maxsize=None)
+def type_adapter(type_: Any) -> 'TypeAdapter':
+    """ TypeAdapter builds a validator on creation, so it is built once per type """
+    return TypeAdapter(type_)
+
+
 class BaseFieldSerializer:
 
     def encode(self, value: Any) -> SimpleTypes:
@@ -23,6 +52,12 @@ class BaseFieldSerializer:
     def decode(self, value: Any) -> Any:
         raise NotImplementedError()
 
+    def encode_many(self, values: list[Any]) -> list[SimpleTypes]:
+        return [self.encode(value) for value in values]
+
+    def encode_pattern(self, pattern: str) -> str:
+        return self.encode(pattern)
+
 
 class DefaultSerializer(BaseFieldSerializer):
 
@@ -72,7 +107,7 @@ class ModelSerializer(BaseFieldSerializer):
             return None
         try:
             if pydantic.__version__.startswith('2.'):
-                return TypeAdapter(self._model).validate_python(json.loads(value))
+                return type_adapter(self._model).validate_python(json.loads(value))
             else:
                 return parse_obj_as(self._model, json.loads(value))
         except ValidationError:
@@ -97,8 +132,7 @@ class ModelsListSerializer(BaseFieldSerializer):
     def decode(self, value: Any) -> Any:
         try:
             if pydantic.__version__.startswith('2.'):
-                _type_adapter = TypeAdapter(self._model)
-                return [_type_adapter.validate_python(item) for item in json.loads(value)]
+                return type_adapter(list[self._model]).validate_python(json.loads(value))
             else:
                 return [parse_obj_as(self._model, item) for item in json.loads(value)]
         except ValidationError:
@@ -106,12 +140,167 @@ class ModelsListSerializer(BaseFieldSerializer):
             return None
 
 
+FORMAT_VERSION = 1
+
+CODEC_ORJSON = 'orjson'
+CODEC_MSGPACK = 'msgpack'
+CODECS = (CODEC_ORJSON, CODEC_MSGPACK)
+
+COMPRESSION_ZSTD = 'zstd'
+COMPRESSION_LZ4 = 'lz4'
+COMPRESSIONS = (None, COMPRESSION_ZSTD, COMPRESSION_LZ4)
+
+# values written by ModelSerializer / ModelsListSerializer, read as legacy JSON
+LEGACY_PREFIXES = ('{', '[', b'{'[0], b'['[0])
+
+
+class BinaryModelSerializer(BaseFieldSerializer):
+    """
+    Pydantic model (or list of models with many=True) packed with orjson or msgpack.
+
+    Every value starts with a header byte: format version in the high 4 bits, codec and compression
+    in the low ones. Decoding follows the header, not the instance settings, so codec or compression
+    may be switched on a running cluster; values without header are read as ModelSerializer JSON.
+    With `text` (redis client with decode_responses) the payload is stored as base64 string.
+    """
+
+    def __init__(self,
+                 model: Type[BaseModel],
+                 many: bool = False,
+                 codec: str = CODEC_ORJSON,
+                 compression: Optional[str] = None,
+                 compress_threshold: int = 1024,
+                 text: Optional[bool] = None):
+        if codec not in CODECS:
+            raise ValueError(f'Unknown codec {codec}, use one of {CODECS}')
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown compression {compression}, use one of {COMPRESSIONS}')
+        self._check_installed(codec, compression)
+        self._model = model
+        self._type = list[model] if many else model
+        self.codec = codec
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.text = settings.CACHE.get('DECODE_RESPONSES', True) if text is None else text
+
+    @staticmethod
+    def _check_installed(codec: str, compression: Optional[str]):
+        modules = {CODEC_ORJSON: orjson, CODEC_MSGPACK: msgpack,
+                   COMPRESSION_ZSTD: zstandard, COMPRESSION_LZ4: lz4_frame}
+        for name in (codec, compression):
+            if name and modules[name] is None:
+                raise ImportError(f'{name} is not installed, it is required by BinaryModelSerializer')
+
+    @staticmethod
+    def header(codec: str, compression: Optional[str]) -> int:
+        return FORMAT_VERSION << 4 | CODECS.index(codec) << 2 | COMPRESSIONS.index(compression)
+
+    @staticmethod
+    def parse_header(header: int) -> tuple[str, Optional[str]]:
+        if header >> 4 != FORMAT_VERSION:
+            raise ValueError(f'Unsupported cache value format {header >> 4}')
+        return CODECS[header >> 2 & 0b11], COMPRESSIONS[header & 0b11]
+
+    def encode(self, value: Any) -> SimpleTypes:
+        try:
+            adapter = type_adapter(self._type)
+            if self.codec == CODEC_ORJSON:
+                # pydantic-core writes the same JSON as orjson.dumps(dump_python(...)) without the dict in between
+                body = adapter.dump_json(value, by_alias=True)
+            else:
+                body = msgpack.packb(adapter.dump_python(value, mode='json', by_alias=True), use_bin_type=True)
+            compression = self.compression if len(body) >= self.compress_threshold else None
+            raw = bytes((self.header(self.codec, compression),)) + _compress(compression, body)
+        except Exception:
+            logger.exception('Error packing value', extra={'type': self._type})
+            return ""
+        return base64.b64encode(raw).decode('ascii') if self.text else raw
+
+    def decode(self, value: Any) -> Any:
+        if not value:
+            return None
+        try:
+            if value[0] in LEGACY_PREFIXES:
+                return type_adapter(self._type).validate_python(json.loads(value))
+            raw = base64.b64decode(value) if isinstance(value, str) else value
+            codec, compression = self.parse_header(raw[0])
+            body = _decompress(compression, raw[1:])
+            data = orjson.loads(body) if codec == CODEC_ORJSON else msgpack.unpackb(body, raw=False)
+            return type_adapter(self._type).validate_python(data)
+        except Exception:  # broken or unknown value is a cache miss
+            logger.exception("Error parsing value from cache", extra={'type': self._type})
+            return None
+
+
+class OrjsonModelSerializer(BinaryModelSerializer):
+    def __init__(self, model: Type[BaseModel], many: bool = False, **options):
+        super().__init__(model, many=many, codec=CODEC_ORJSON, **options)
+
+
+class MsgpackModelSerializer(BinaryModelSerializer):
+    def __init__(self, model: Type[BaseModel], many: bool = False, **options):
+        super().__init__(model, many=many, codec=CODEC_MSGPACK, **options)
+
+
+@lru_cache(maxsize=None)
+def _zstd():
+    return zstandard.ZstdCompressor(), zstandard.ZstdDecompressor()
+
+
+def _compress(compression: Optional[str], body: bytes) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return _zstd()[0].compress(body)
+    if compression == COMPRESSION_LZ4:
+        return lz4_frame.compress(body)
+    return body
+
+
+def _decompress(compression: Optional[str], body: bytes) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return _zstd()[1].decompress(body)
+    if compression == COMPRESSION_LZ4:
+        return lz4_frame.decompress(body)
+    return body
+
+
+# raw key -> hashed key, hot keys are hashed once per process
+memo_hash_key = lru_cache(maxsize=settings.CACHE.get('KEY_HASH_MEMO_SIZE', 10000))(crypt.hash_key)
+
+GLOB_CHARS = frozenset('*?[')
+
+
 class HashableSerializer(DefaultSerializer):
     def __init__(self, ancestor: BaseFieldSerializer):
         self._ancestor = ancestor
 
     def encode(self, value: Any) -> SimpleTypes:
-        return value if value is None else crypt.hash_key(self._ancestor.encode(value))
+        return value if value is None else memo_hash_key(self._ancestor.encode(value))
+
+    def encode_pattern(self, pattern: str) -> str:
+        if GLOB_CHARS.isdisjoint(pattern):
+            return self.encode(pattern)
+        if pattern == '*':
+            return pattern
+        raise ValueError(f'Hashed keys can not be matched by pattern {pattern!r}, only by "*"')
+
+
+class NamespacedSerializer(DefaultSerializer):
+    """ Prepends cache namespace to the key, the namespace stays readable so one cache keys match `<namespace>:*` """
+
+    def __init__(self, ancestor: BaseFieldSerializer, namespace: str):
+        self._ancestor = ancestor
+        self.namespace = namespace
+        self._prefix = f'{namespace}:'
+
+    def encode(self, value: Any) -> SimpleTypes:
+        return value if value is None else self._prefix + self._ancestor.encode(value)
+
+    def encode_pattern(self, pattern: str) -> str:
+        return self._prefix + self._ancestor.encode_pattern(pattern)
+
+    def decode(self, value: Any) -> Any:
+        value = super().decode(value)
+        return value[len(self._prefix):] if value and value.startswith(self._prefix) else value
 
 
 class SecureHashableSerializer(DefaultSerializer):
@@ -123,14 +312,35 @@ class SecureHashableSerializer(DefaultSerializer):
 
 
 class EncryptableSerializer(BaseFieldSerializer):
-    def __init__(self, ancestor: BaseFieldSerializer):
+    """
+    AES-GCM over the ancestor's value. With `text` (redis client with decode_responses) the result is
+    a "v2:" base64 string, otherwise raw bytes. Old CBC values are still readable.
+    """
+
+    def __init__(self, ancestor: BaseFieldSerializer, text: Optional[bool] = None):
         self._ancestor = ancestor
+        self.text = settings.CACHE.get('DECODE_RESPONSES', True) if text is None else text
+
+    @staticmethod
+    def _plain(value: Any) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def _output(self, encrypted: bytes) -> SimpleTypes:
+        return crypt.to_text(encrypted) if self.text else encrypted
 
     def encode(self, value: Any) -> Optional[SimpleTypes]:
-        return value if value is None else crypt.encrypt(self._ancestor.encode(value))
+        return value if value is None else self._output(crypt.encrypt_bytes(self._plain(self._ancestor.encode(value))))
+
+    def encode_many(self, values: list[Any]) -> list[Optional[SimpleTypes]]:
+        plain = [None if value is None else self._plain(self._ancestor.encode(value)) for value in values]
+        encrypted = iter(crypt.encrypt_many([item for item in plain if item is not None]))
+        return [None if item is None else self._output(next(encrypted)) for item in plain]
 
     def decode(self, value: Any) -> Any:
-        return value if value is None else self._ancestor.decode(crypt.decrypt(value))
+        if value is None:
+            return value
+        plain = crypt.decrypt_bytes(value)
+        return self._ancestor.decode(plain.decode('utf-8') if self.text else plain)
 
 
 class RedisRecordSerializer:
@@ -144,9 +354,19 @@ class RedisRecordSerializer:
     def encode_key(self, key: str) -> str:
         return self.key_serializer.encode(key)
 
+    def encode_pattern(self, pattern: str) -> str:
+        return self.key_serializer.encode_pattern(pattern)
+
+    def decode_key(self, key: Any) -> str:
+        return self.key_serializer.decode(key)
+
     def encode(self, key: str, value: Any = None) -> tuple[str, Optional[str]]:
         return (self.encode_key(key),
                 value if value is None else self.value_serializer.encode(value))
 
+    def encode_many(self, content: dict[str, Any]) -> dict[str, Optional[SimpleTypes]]:
+        return dict(zip([self.encode_key(key) for key in content],
+                        self.value_serializer.encode_many(list(content.values()))))
+
     def decode(self, value: Optional[str]) -> Any:
         return self.value_serializer.decode(value)
@@ -0,0 +1,81 @@
+import asyncio
+import random
+from typing import Optional, Type
+
+from libs import logging
+from libs.config import settings
+from libs.utils.time import timedelta_from_duration
+
+from .breaker import CONNECTION_ERRORS
+from .client import BaseCommonCache, RedisCache
+
+logger = logging.getLogger('redis')
+
+health_settings = settings.CACHE.get('HEALTH_CHECK', {})
+
+
+class ConnectionSupervisor:
+    """
+    Background PING of a RedisCache client every `interval` seconds.
+    A failed probe opens the client's circuit breaker - cache calls become misses at once - and the client
+    is recreated with exponential backoff (from `backoff` up to `max_backoff`, with jitter) until PING passes,
+    then the breaker is closed. Works for pooled and SINGLE connection clients alike,
+    also brings up a client whose initialisation failed at startup.
+    """
+
+    def __init__(self,
+                 cache: Type[RedisCache],
+                 interval: float = timedelta_from_duration(health_settings.get('INTERVAL', '5s')).total_seconds(),
+                 backoff: float = timedelta_from_duration(health_settings.get('BACKOFF', '1s')).total_seconds(),
+                 max_backoff: float = timedelta_from_duration(
+                     health_settings.get('MAX_BACKOFF', '30s')).total_seconds()):
+        self.cache = cache
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def probe(self) -> bool:
+        if self.cache.client is None:
+            return False
+        try:
+            return bool(await asyncio.wait_for(self.cache.ping(), timeout=self.cache.ping_timeout))
+        except CONNECTION_ERRORS:
+            return False
+        except Exception:
+            # any other redis error must not end the supervisor task silently
+            logger.exception('Redis health check failed')
+            return False
+
+    async def _run(self):
+        delay = self.backoff
+        while True:
+            if await self.probe():
+                self.cache.breaker().record_success()
+                delay = self.backoff
+                await asyncio.sleep(self.interval)
+                continue
+
+            self.cache.breaker().open()
+            await asyncio.sleep(delay * random.uniform(0.5, 1))
+            delay = min(delay * 2, self.max_backoff)
+            try:
+                await self.cache.reconnect()
+            except Exception:
+                logger.debug('Redis reconnect failed', exc_info=True)
+
+
+common_cache_supervisor = ConnectionSupervisor(BaseCommonCache)
@@ -0,0 +1,76 @@
+"""
+Encode + decode of User / list[Project] payloads by cache serializers.
+`json, adapter per call` repeats decode as it was before type adapters were cached.
+
+    python -m libs.cache.tests.benchmark_serializers
+"""
+import json
+import time
+
+from pydantic import TypeAdapter
+
+from libs.database.models import Project, User
+
+from .. import serializers
+from ..serializers import BinaryModelSerializer, ModelSerializer, ModelsListSerializer
+from .test_serializers import NOW, make_tariffs
+
+ROUNDS = 2_000
+
+
+class PerCallAdapterSerializer(ModelSerializer):
+    def decode(self, value):
+        return TypeAdapter(self._model).validate_python(json.loads(value))
+
+
+class PerCallAdapterListSerializer(ModelsListSerializer):
+    def decode(self, value):
+        adapter = TypeAdapter(self._model)
+        return [adapter.validate_python(item) for item in json.loads(value)]
+
+
+def make_projects(count: int = 20) -> list[Project]:
+    return [Project(id=i, name=f'project {i}', owner_id=1, owner='owner', admin_bot_id=i,
+                    tariffs=make_tariffs(5), tariff_id=list(range(5)),
+                    payment_destination='destination', payment_system_id=1) for i in range(count)]
+
+
+def make_user() -> User:
+    profiles = [{'id': i, 'user_type': 'owner', 'inserted_at': NOW, 'updated_at': NOW,
+                 'projects': make_projects(5)} for i in range(2)]
+    return User(id=1, user_telegram_id='42', settings={'lang': 'ru'}, inserted_at=NOW, updated_at=NOW,
+                user_profile=profiles)
+
+
+def candidates(model, many: bool):
+    yield 'json, adapter per call', (PerCallAdapterListSerializer if many else PerCallAdapterSerializer)(model)
+    yield 'json', (ModelsListSerializer if many else ModelSerializer)(model)
+    for codec, module in (('orjson', serializers.orjson), ('msgpack', serializers.msgpack)):
+        if module is None:
+            continue
+        yield codec, BinaryModelSerializer(model, many=many, codec=codec)
+        for compression, lib in (('zstd', serializers.zstandard), ('lz4', serializers.lz4_frame)):
+            if lib is not None:
+                yield f'{codec}+{compression}', BinaryModelSerializer(model, many=many, codec=codec,
+                                                                      compression=compression)
+
+
+def run(serializer, value) -> tuple[float, int]:
+    encoded = serializer.encode(value)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        serializer.decode(serializer.encode(value))
+    return (time.perf_counter() - start) / ROUNDS, len(encoded)
+
+
+def main():
+    for title, model, value, many in (('User', User, make_user(), False),
+                                      ('list[Project]', Project, make_projects(), True)):
+        print(title)
+        for name, serializer in candidates(model, many):
+            elapsed, size = run(serializer, value)
+            print(f'  {name:24} {elapsed * 1e6:9.1f} us {size:8} bytes')
+
+
+if __name__ == '__main__':
+    main()
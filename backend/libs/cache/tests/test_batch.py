@@ -0,0 +1,52 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from redis.asyncio.cluster import RedisCluster
+
+from ..batch import CacheBatch, GetCoalescer
+from ..client import RedisCache
+
+
+class ClusterClient(RedisCluster):
+    def __init__(self, data: dict):
+        self.data = data
+
+    async def mget(self, *args, **kwargs):
+        raise AssertionError('plain MGET fails with CROSSSLOT in cluster')
+
+    async def mget_nonatomic(self, keys):
+        return [self.data.get(key) for key in keys]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_splits_keys_by_slot_in_cluster():
+    coalescer = GetCoalescer()
+    client = ClusterClient({'user:1': 'a', 'bot:2': 'b'})
+
+    assert await asyncio.gather(coalescer.get(client, 'user:1'), coalescer.get(client, 'bot:2'),
+                                coalescer.get(client, 'missing')) == ['a', 'b', None]
+
+
+class RecordingPipeline:
+    def __init__(self):
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append(name)
+
+
+class ExpiringCache(RedisCache):
+    encrypt_keys = encrypt_data = False
+    expire = timedelta(minutes=5)
+
+
+@pytest.mark.asyncio
+async def test_batch_hset_sets_expire():
+    batch = CacheBatch(ExpiringCache())
+    batch.hset('hash', 'key', 'value')
+    pipe = RecordingPipeline()
+    for command, _, _ in batch._calls:
+        command(pipe)
+
+    assert pipe.commands == ['hset', 'pexpire']
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+from redis.exceptions import ResponseError
+
+from ..breaker import BreakerState, CircuitBreaker
+from ..client import RedisCache
+from ..supervisor import ConnectionSupervisor
+
+
+def test_opens_after_threshold_and_recovers():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()  # single trial call
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_opens_again():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+
+
+class BreakerOnlyCache(RedisCache):
+    def __init__(self):
+        super().__init__()
+        self.client = object()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_is_released():
+    cache = BreakerOnlyCache()
+    breaker = cache.breaker()
+    breaker.reset_timeout = 0
+    breaker.open()
+
+    async def call():
+        async with cache.measure('get', 'key'):
+            await asyncio.sleep(1)
+
+    task = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    assert breaker.state == BreakerState.HALF_OPEN
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert breaker.allow()  # the next call is the trial, not short-circuited
+
+
+@pytest.mark.asyncio
+async def test_supervisor_probe_survives_redis_errors():
+    class FailingPing(BreakerOnlyCache):
+        @classmethod
+        async def ping(cls):
+            raise ResponseError('NOPERM')
+
+    FailingPing.client = object()
+    assert await ConnectionSupervisor(FailingPing).probe() is False
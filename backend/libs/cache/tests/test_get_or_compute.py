@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from ..client import RedisCache
+
+
+class LoaderOnlyCache(RedisCache):
+    """ No redis behind _get_or_compute, only single flight of get_or_compute is exercised """
+
+    def __init__(self):
+        super().__init__()
+        self.client = object()
+
+    async def _get_or_compute(self, key, loader, ttl, lock, beta):
+        return await loader()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    cache = LoaderOnlyCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    leader = asyncio.create_task(cache.get_or_compute('key', loader))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.get_or_compute('key', loader))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == 2  # follower loaded the value itself
+    assert leader.cancelled()
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from ..lru import LRUCache
+
+
+def test_least_recently_used_evicted():
+    cache = LRUCache(max_items=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get_item('a')
+    cache.put('c', 3)
+
+    assert cache.get_item('b') is None
+    assert cache.get_item('a') == 1
+    assert cache.get_item('c') == 3
+
+
+def test_evicted_by_bytes():
+    cache = LRUCache(max_items=100, max_bytes=100, sizeof=len)
+    cache.put('a', 'x' * 60)
+    cache.put('b', 'y' * 60)
+
+    assert cache.size == 1
+    assert cache.bytes == 60
+    assert cache.get_item('b') == 'y' * 60
+
+
+def test_expired(monkeypatch):
+    cache = LRUCache(expire=1000)
+    cache.put('a', 1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 2)
+
+    assert cache.get_item('a') is None
+    assert cache.size == 0
+
+
+@pytest.mark.asyncio
+async def test_interface():
+    cache = LRUCache()
+    await cache.mset({'a': 1, 'b': None})
+    assert await cache.mget(['a', 'b']) == {'a': 1}
+
+    await cache.delete('a')
+    assert await cache.get('a') is None
@@ -0,0 +1,27 @@
+from ..prometheus import CachePrometheusMixin
+from ..sampler import HotKeySampler
+
+
+def test_top_keys():
+    sampler = HotKeySampler(rate=1.0, capacity=10)
+    for key in ['identity:user:1'] * 3 + ['identity:user:2']:
+        sampler.record('identity:user', key)
+
+    top = sampler.top(1)
+    assert top == [{'namespace': 'identity:user', 'key': '************r:1', 'samples': 3, 'estimated': 3}]
+
+
+def test_capacity_is_bounded():
+    sampler = HotKeySampler(rate=1.0, capacity=2)
+    for _ in range(4):
+        sampler.record('ns', 'hot')
+    for key in ('a', 'b'):
+        sampler.record('ns', key)
+
+    assert [item['key'] for item in sampler.top()] == ['hot']  # not longer than the visible tail
+
+
+def test_key_namespace():
+    assert CachePrometheusMixin.key_namespace('identity:user:42') == 'identity:user'
+    assert CachePrometheusMixin.key_namespace('bot:42:settings') == 'bot:*'
+    assert CachePrometheusMixin.key_namespace('plain') == '-'
@@ -0,0 +1,120 @@
+from datetime import datetime
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from libs.database.models import Project, TariffModel, User
+from libs.utils import crypt
+
+from .. import serializers
+from ..serializers import (BinaryModelSerializer, EncryptableSerializer, HashableSerializer, ModelSerializer,
+                           ModelsListSerializer, NamespacedSerializer, StringSerializer)
+
+NOW = datetime(2024, 1, 1, 12, 0)
+
+
+def make_user() -> User:
+    return User(id=1, user_telegram_id='42', settings={'lang': 'ru'}, inserted_at=NOW, updated_at=NOW,
+                user_profile=[{'id': 1, 'user_type': 'owner', 'inserted_at': NOW, 'updated_at': NOW}])
+
+
+def make_tariffs(count: int = 3) -> list[TariffModel]:
+    return [TariffModel(id=i, name=f'tariff {i}', description='d' * 50, active=True, project_id=1,
+                        payment_amount=100 * i, subscribe_duration=1) for i in range(count)]
+
+
+codecs = [pytest.param(codec, marks=pytest.mark.skipif(module is None, reason=f'{codec} is not installed'))
+          for codec, module in (('orjson', serializers.orjson), ('msgpack', serializers.msgpack))]
+
+
+@pytest.mark.parametrize('codec', codecs)
+@pytest.mark.parametrize('text', [True, False])
+def test_round_trip(codec, text):
+    user = make_user()
+    serializer = BinaryModelSerializer(User, codec=codec, text=text)
+    encoded = serializer.encode(user)
+
+    assert isinstance(encoded, str if text else bytes)
+    assert serializer.decode(encoded) == user
+
+    tariffs = make_tariffs()
+    many = BinaryModelSerializer(TariffModel, many=True, codec=codec, text=text)
+    assert many.decode(many.encode(tariffs)) == tariffs
+
+
+@pytest.mark.skipif(serializers.orjson is None, reason='orjson is not installed')
+def test_reads_legacy_and_other_formats():
+    user = make_user()
+    serializer = BinaryModelSerializer(User)
+    assert serializer.decode(ModelSerializer(User).encode(user)) == user
+
+    tariffs = make_tariffs()
+    many = BinaryModelSerializer(TariffModel, many=True)
+    assert many.decode(ModelsListSerializer(TariffModel).encode(tariffs)) == tariffs
+
+    if serializers.msgpack is not None:
+        assert serializer.decode(BinaryModelSerializer(User, codec='msgpack').encode(user)) == user
+
+
+def test_header():
+    header = BinaryModelSerializer.header('msgpack', 'lz4')
+    assert header >> 4 == serializers.FORMAT_VERSION
+    assert BinaryModelSerializer.parse_header(header) == ('msgpack', 'lz4')
+
+
+@pytest.mark.skipif(serializers.orjson is None, reason='orjson is not installed')
+def test_broken_value_is_miss():
+    assert BinaryModelSerializer(Project).decode('not a value') is None
+
+
+def legacy_cbc_encrypt(value: str) -> str:
+    """ crypt.encrypt as it was before AES-GCM """
+    from base64 import b64encode
+    from os import urandom
+
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    input_vector = urandom(crypt.AES_INITIAL_VECTOR_SIZE)
+    encryptor = Cipher(algorithms.AES(crypt.SALT_HASH), modes.CBC(input_vector)).encryptor()
+    padder = crypt.PADDER.padder()
+    ciphertext = encryptor.update(padder.update(value.encode()) + padder.finalize()) + encryptor.finalize()
+    return b64encode(input_vector + ciphertext).decode()
+
+
+@pytest.mark.parametrize('text', [True, False])
+def test_encryption(text):
+    serializer = EncryptableSerializer(StringSerializer(), text=text)
+    encoded = serializer.encode('secret')
+
+    assert encoded.startswith('v2:' if text else b'\x02')
+    assert serializer.decode(encoded) == 'secret'
+    assert serializer.decode(legacy_cbc_encrypt('secret')) == 'secret'
+
+    many = serializer.encode_many(['a', None, 'b'])
+    assert many[1] is None
+    assert [serializer.decode(value) for value in many] == ['a', None, 'b']
+    first, second = serializer.encode_many(['a', 'a'])
+    assert first != second  # every value gets its own nonce
+
+
+def test_tampered_value_is_rejected():
+    encrypted = bytearray(crypt.encrypt_bytes('secret'))
+    encrypted[-1] ^= 1
+    with pytest.raises(InvalidTag):
+        crypt.decrypt_bytes(bytes(encrypted))
+
+
+def test_key_hashing_and_namespace():
+    serializer = NamespacedSerializer(HashableSerializer(StringSerializer()), 'identity')
+    encoded = serializer.encode('identity:user:42')
+
+    assert encoded == f'identity:{crypt.hash_key("identity:user:42")}'
+    assert serializer.encode_pattern('*') == 'identity:*'
+    assert serializer.encode_pattern('identity:user:42') == encoded
+    assert serializer.decode(encoded) == crypt.hash_key('identity:user:42')
+    with pytest.raises(ValueError):
+        serializer.encode_pattern('identity:user:*')
+
+    plain = NamespacedSerializer(StringSerializer(), 'tariffs')
+    assert plain.encode_pattern('project:*') == 'tariffs:project:*'
+    assert plain.decode('tariffs:project:1') == 'project:1'
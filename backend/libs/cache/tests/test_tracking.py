@@ -0,0 +1,67 @@
+"""
+Needs a Redis 6+ server: TEST_REDIS_URL (redis://localhost:6379/15 by default), skipped when it is not reachable.
+The database is flushed.
+"""
+import asyncio
+import os
+
+import pytest
+from redis import asyncio as aioredis
+
+from ..client import RedisCache
+from ..lru import LRUCache
+from ..tracking import TrackingCache
+
+REDIS_URL = os.environ.get('TEST_REDIS_URL', 'redis://localhost:6379/15')
+
+
+class TrackedCache(RedisCache):
+    metrics_prefix = 'test_tracked_cache'
+    service_name = 'test_tracked'
+    encrypt_keys = False
+    encrypt_data = False
+
+
+async def connect() -> aioredis.Redis:
+    client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        await client.ping()
+    except (aioredis.ConnectionError, OSError):
+        pytest.skip(f'redis is not available at {REDIS_URL}')
+    await client.flushdb()
+    return client
+
+
+async def settle(cache: TrackingCache, key: str, expected):
+    for _ in range(50):  # push message may come a bit later than the write reply
+        if await cache.get(key) == expected:
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def test_local_copy_is_invalidated_by_server():
+    async def run():
+        TrackedCache.client = await connect()
+        writer = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+        cache = TrackingCache(TrackedCache(), LRUCache(), namespace='test')
+        try:
+            await writer.set('tariffs:1', 'old')
+            assert await cache.get('tariffs:1') == 'old'
+            assert cache.tracking
+
+            await writer.delete('other')  # unrelated write, l1 copy stays
+            await cache._ready()
+            assert cache.local.get_item('tariffs:1') == 'old'
+
+            await writer.set('tariffs:1', 'new')  # written by another client, not through the cache
+            assert await settle(cache, 'tariffs:1', 'new')
+
+            await writer.flushdb()
+            assert await settle(cache, 'tariffs:1', None)
+        finally:
+            await cache.stop()
+            await writer.aclose()
+            await TrackedCache.client.aclose()
+
+    asyncio.run(run())
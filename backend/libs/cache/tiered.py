@@ -0,0 +1,87 @@
+from typing import Any, Iterable
+
+from libs import logging
+
+from .client import RedisCache
+from .interface import CacheInterface
+from .invalidation import InvalidationChannel, invalidation_channel
+from .lru import LRUCache
+from .prometheus import CachePrometheusMixin
+
+logger = logging.getLogger('redis')
+
+
+class TieredCache(CacheInterface, CachePrometheusMixin):
+    """
+    Process-local LRU (l1, already decoded objects) in front of a RedisCache (l2).
+
+    Writes and deletes go to both tiers and are broadcast by key over the invalidation channel,
+    so other processes drop their l1 copies. Keep l1 TTL short: messages lost on reconnect are not replayed.
+    Subscribes on creation - create one instance per namespace and reuse it.
+    """
+    metrics_prefix = 'tiered_cache'
+    service_name = 'tiered'
+
+    def __init__(self,
+                 remote: RedisCache,
+                 local: LRUCache,
+                 namespace: str,
+                 channel: InvalidationChannel = invalidation_channel):
+        self.remote = remote
+        self.local = local
+        self.namespace = namespace
+        self._channel = channel
+        channel.subscribe_keys(namespace, self._drop_local)
+        channel.subscribe(namespace, lambda _version: self.local.clear())
+
+    async def _drop_local(self, keys: list[str]):
+        await self.local.delete(self.namespace, keys)
+
+    async def get(self, key: str, obj_type: Any = None):
+        value = self.local.get_item(key)
+        if value is not None:
+            self.count_tier('l1', hits=1)
+            return value
+        self.count_tier('l1', misses=1)
+
+        value = await self.remote.get(key)
+        self.count_tier('l2', hits=int(value is not None), misses=int(value is None))
+        self.local.put(key, value)
+        return value
+
+    async def mget(self, keys: Iterable[str], obj_type: Any = None) -> dict[str, Any]:
+        keys = list(keys)
+        found = {key: value for key in keys if (value := self.local.get_item(key)) is not None}
+        missing = [key for key in keys if key not in found]
+        self.count_tier('l1', hits=len(found), misses=len(missing))
+        if not missing:
+            return found
+
+        remote = {key: value for key, value in (await self.remote.mget(missing)).items() if value is not None}
+        self.count_tier('l2', hits=len(remote), misses=len(missing) - len(remote))
+        for key, value in remote.items():
+            self.local.put(key, value)
+        return {**found, **remote}
+
+    async def set(self, key: str, data: Any) -> None:
+        await self.remote.set(key, data)
+        self.local.put(key, data)
+        await self._channel.publish_keys(self.namespace, [key])
+
+    async def mset(self, content: dict[str, Any]) -> None:
+        await self.remote.mset(content)
+        for key, value in content.items():
+            self.local.put(key, value)
+        await self._channel.publish_keys(self.namespace, list(content))
+
+    async def delete(self, name: str, keys: Iterable[str] | None = None):
+        keys = list(keys or (name,))
+        await self.remote.delete(name, keys)
+        await self.local.delete(name, keys)
+        await self._channel.publish_keys(self.namespace, keys)
+
+    async def clear(self):
+        """ Drops l1 in all processes and l2 records of the namespace; hashed l2 keys can't be matched, they expire """
+        await self._channel.publish(self.namespace)
+        if not self.remote.encrypt_keys:
+            await self.remote.delete_pattern(f'{self.namespace}:*')
@@ -0,0 +1,197 @@
+import asyncio
+from typing import Any, Iterable, Optional
+
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.connection import AbstractConnection
+from redis.asyncio.sentinel import SentinelConnectionPool
+
+from libs import logging, metrics
+
+from .breaker import log_call_error
+from .client import RedisCache
+from .invalidation import InvalidationChannel, invalidation_channel
+from .lru import LRUCache
+from .tiered import TieredCache
+
+logger = logging.getLogger('redis')
+
+
+class TrackingCache(TieredCache):
+    """
+    Server-assisted client side caching (Redis 6+ CLIENT TRACKING, RESP3 push invalidation).
+
+    l2 reads go through a dedicated RESP3 connection with tracking on, so Redis remembers the keys this
+    process holds in l1 and pushes an invalidation when anybody - including other services - changes them.
+    Pending pushes are read from the socket buffer before every l1 hit, no network round trip is made.
+    One connection can't follow a cluster or a sentinel failover: there the cache works as TieredCache
+    (invalidation broadcast over the channel by our own writes).
+    """
+    metrics_prefix = 'tracking_cache'
+    service_name = 'tracking'
+
+    def __init__(self,
+                 remote: RedisCache,
+                 local: LRUCache,
+                 namespace: str,
+                 channel: InvalidationChannel = invalidation_channel):
+        super().__init__(remote, local, namespace, channel)
+        self._connection: Optional[AbstractConnection] = None
+        self._tracked: dict[str, str] = {}  # stored (encoded) key -> key of l1
+        self._lock = asyncio.Lock()
+        self._started = False
+
+    @metrics.metric
+    def invalidations(self):
+        return metrics.Counter('Invalidations pushed by redis tracking: "key" - per key, "all" - whole l1 flushed',
+                               labelnames=('scope',))
+
+    @property
+    def tracking(self) -> bool:
+        return self._connection is not None
+
+    async def start(self) -> bool:
+        """ Opens the tracking connection, returns False when the cache stays in broadcast mode """
+        self._started = True
+        client = self.remote.client
+        pool = getattr(client, 'connection_pool', None)
+        if client is None or isinstance(client, RedisCluster) or isinstance(pool, SentinelConnectionPool):
+            logger.info('Redis client tracking is not available, l1 invalidation is broadcast',
+                        extra={'namespace': self.namespace})
+            return False
+
+        connection = pool.connection_class(**{**pool.connection_kwargs, 'protocol': 3})
+        connection.register_connect_callback(self._on_connect)
+        try:
+            await connection.connect()
+        except Exception:
+            logger.exception('Error enabling redis client tracking, l1 invalidation is broadcast')
+            return False
+        self._connection = connection
+        return True
+
+    async def stop(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.disconnect()
+        self._reset()
+
+    async def _on_connect(self, connection: AbstractConnection):
+        """ Every (re)connect starts a new server session: tracking is enabled again, lost pushes drop l1 """
+        connection._parser.set_invalidation_push_handler(self._on_invalidate)
+        await connection.send_command('CLIENT', 'TRACKING', 'ON')
+        await connection.read_response()
+        self._reset()
+
+    async def _on_invalidate(self, message: list):
+        keys_ = message[1]
+        if keys_ is None:  # FLUSHDB or tracking table overflow on the server
+            self.invalidations.labels('all').inc()
+            self._reset()
+            return
+        dropped = [key for key_ in keys_
+                   if (key := self._tracked.pop(key_.decode() if isinstance(key_, bytes) else key_, None))]
+        for key in dropped:
+            self.local.discard(key)
+        self.invalidations.labels('key').inc(len(keys_))
+
+    def _reset(self):
+        self._tracked.clear()
+        self.local.reset()
+
+    async def _ready(self) -> bool:
+        if not self._started:
+            async with self._lock:
+                if not self._started:
+                    await self.start()
+        if self._connection is None:
+            return False
+
+        async with self._lock:
+            if not self._connection.is_connected:
+                self._reset()  # pushes are lost while disconnected, reconnect happens on the next read
+                return True
+            try:
+                await self._connection.process_invalidation_messages()
+            except Exception:
+                logger.exception('Error reading redis tracking messages')
+                await self._connection.disconnect()
+                self._reset()
+        return True
+
+    async def _fetch(self, keys: list[str]) -> dict[str, Any]:
+        """ Reads l2 through the tracking connection and stores found values in l1 """
+        encode_key = self.remote._serializer.encode_key
+        keys_ = [encode_key(key) for key in keys]
+        try:
+            async with self._lock:
+                async with self.remote.measure('mget', keys=keys) as call:
+                    await self._connection.send_command('MGET', *keys_)
+                    out = await self._connection.read_response()
+                    call.lookup(out)
+                self._track(zip(keys_, keys))
+        except Exception:
+            log_call_error('Error reading through redis tracking connection')
+            self._reset()
+            # not tracked, so not kept in l1
+            return {key: value for key, value in (await self.remote.mget(keys)).items() if value is not None}
+
+        found = {key: self.remote._serializer.decode(value) for key, value in zip(keys, out) if value is not None}
+        for key, value in found.items():
+            self.local.put(key, value)
+        return found
+
+    def _track(self, items: Iterable[tuple[str, str]]):
+        self._tracked.update(items)
+        if len(self._tracked) > 2 * self.local.max_items:  # forget keys already evicted from l1
+            self._tracked = {key_: key for key_, key in self._tracked.items() if key in self.local}
+
+    async def get(self, key: str, obj_type: Any = None):
+        if not await self._ready():
+            return await super().get(key, obj_type)
+
+        value = self.local.get_item(key)
+        if value is not None:
+            self.count_tier('l1', hits=1)
+            return value
+        self.count_tier('l1', misses=1)
+
+        value = (await self._fetch([key])).get(key)
+        self.count_tier('l2', hits=int(value is not None), misses=int(value is None))
+        return value
+
+    async def mget(self, keys: Iterable[str], obj_type: Any = None) -> dict[str, Any]:
+        if not await self._ready():
+            return await super().mget(keys, obj_type)
+
+        keys = list(keys)
+        found = {key: value for key in keys if (value := self.local.get_item(key)) is not None}
+        missing = [key for key in keys if key not in found]
+        self.count_tier('l1', hits=len(found), misses=len(missing))
+        if not missing:
+            return found
+
+        remote = await self._fetch(missing)
+        self.count_tier('l2', hits=len(remote), misses=len(missing) - len(remote))
+        return {**found, **remote}
+
+    async def set(self, key: str, data: Any) -> None:
+        # l1 keeps only values read through the tracking connection, the server invalidates other processes
+        if not await self._ready():
+            return await super().set(key, data)
+        await self.remote.set(key, data)
+        self.local.discard(key)
+
+    async def mset(self, content: dict[str, Any]) -> None:
+        if not await self._ready():
+            return await super().mset(content)
+        await self.remote.mset(content)
+        for key in content:
+            self.local.discard(key)
+
+    async def delete(self, name: str, keys: Iterable[str] | None = None):
+        if not await self._ready():
+            return await super().delete(name, keys)
+        keys = list(keys or (name,))
+        await self.remote.delete(name, keys)
+        for key in keys:
+            self.local.discard(key)
@@ -36,7 +36,9 @@ def get_session_by_engine(type_engine: DbEngineType = DbEngineType.alchemy,
 def get_asyncpg_connection(settings: AsyncPgSettings = asyncpg_settings):
     return AsyncPgConnection(url=settings.URL,
                              timeout=settings.TIMEOUT,
-                             cache_result=settings.CACHE_RESULT)
+                             cache_result=settings.CACHE_RESULT,
+                             statement_cache_size=settings.STATEMENT_CACHE_SIZE,
+                             pgbouncer_transaction_pooling=settings.PGBOUNCER_TRANSACTION_POOLING)
 
 
 async def pass_asyncpg_connection():
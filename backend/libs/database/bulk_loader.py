@@ -0,0 +1,209 @@
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Optional, Sequence, Union
+
+import asyncpg
+
+from libs import logging, metrics
+
+log = logging.getLogger('bulk_loader')
+
+Record = Union[Sequence[Any], dict[str, Any]]
+Records = Union[Iterable[Record], AsyncIterable[Record]]
+
+
+@dataclass(frozen=True, slots=True)
+class MergeTarget:
+    """
+    Таблица, в которую сливаются строки из staging.
+    conflict_cols - уникальный индекс таблицы, update_cols - что обновлять у существующих строк
+    (None - все колонки кроме conflict_cols, пустой tuple - существующие строки не трогаются),
+    null_on_update - колонки, которые сбрасываются в NULL у обновленных строк,
+    defaults - значения колонок, которых нет в dict записи (default на стороне python, а не базы)
+    """
+    table: str
+    columns: tuple[str, ...]
+    conflict_cols: tuple[str, ...]
+    update_cols: Optional[tuple[str, ...]] = None
+    null_on_update: tuple[str, ...] = ()
+    defaults: dict[str, Callable[[], Any]] = field(default_factory=dict)
+
+    @property
+    def staging(self) -> str:
+        return f'_bulk_{self.table}'
+
+    @property
+    def set_columns(self) -> tuple[str, ...]:
+        if self.update_cols is not None:
+            return self.update_cols
+        return tuple(column for column in self.columns if column not in self.conflict_cols)
+
+
+# id подписок при импорте должны быть стабильными (например uuid5 от внешнего id),
+# иначе повторная загрузка того же файла задвоит строки.
+# dict запись должна содержать все columns (кроме defaults), иначе ValueError: NULL затер бы default таблицы.
+# Колонки, которых нет в источнике, убираются из columns и получают default таблицы:
+# dataclasses.replace(TARIFF, columns=('project_id', 'name'))
+PAYMENT = MergeTarget(table='payment',
+                      columns=('id', 'external_id', 'status', 'user_id', 'project_id', 'created_at', 'updated_at'),
+                      conflict_cols=('external_id',),
+                      update_cols=('status', 'user_id', 'project_id', 'updated_at'),
+                      # у payment.id нет default в базе, ключ платежа - external_id
+                      defaults={'id': uuid.uuid4})
+SUBSCRIPTION = MergeTarget(table='subscription',
+                           columns=('id', 'user_profile_id', 'project_id', 'start_at', 'update_at', 'end_at'),
+                           conflict_cols=('id',),
+                           # продленная подписка снова попадает в ix_subscription_pending_end_at (как save_from_payment)
+                           null_on_update=('expired_at',))
+TARIFF = MergeTarget(table='tariff',
+                     columns=('project_id', 'name', 'description', 'active', 'payment_amount', 'subscribe_duration'),
+                     conflict_cols=('project_id', 'name'))
+
+
+@dataclass(slots=True)
+class LoadProgress:
+    """ Состояние загрузки, offset - сколько строк источника уже слито: с него можно продолжить после сбоя """
+    job: str
+    table: str
+    offset: int = 0
+    merged: int = 0
+    chunks: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def rate(self) -> float:
+        return self.offset / max(time.monotonic() - self.started, 1e-9)
+
+
+async def _iterate(records: Records):
+    if isinstance(records, AsyncIterable):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
+
+
+class BulkLoader(metrics.BasePrometheusMixin):
+    """
+    Загрузка больших объемов строк: пачка идет через COPY во временную staging таблицу
+    и сливается в целевую одним INSERT ... SELECT ... ON CONFLICT.
+    Каждая пачка - отдельная транзакция, слияние идемпотентно, поэтому загрузку можно
+    продолжить с последнего сохраненного offset.
+
+        async with get_asyncpg_connection() as conn:
+            await BulkLoader(conn).load(PAYMENT, rows, job='lava_payments_2024')
+    """
+    metrics_prefix = 'bulk_loader'
+    service_name = 'bulk_loader'
+
+    def __init__(self, connection: asyncpg.Connection, chunk_size: int = 50_000):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self._staging: dict[str, tuple[str, ...]] = {}  # staging таблица -> ее колонки
+
+    @metrics.metric
+    def rows(self):
+        return metrics.Counter('Rows processed by bulk loader: "copied" to staging, "merged" into table',
+                               labelnames=('table', 'stage'))
+
+    @metrics.metric
+    def chunk_seconds(self):
+        return metrics.Histogram('Bulk loader chunk duration (copy and merge), in seconds', labelnames=('table',),
+                                 buckets=(.1, .25, .5, 1, 2.5, 5, 10, 30, 60, float('inf')))
+
+    @metrics.metric
+    def offset(self):
+        return metrics.Gauge('Source rows already merged by the running bulk load', labelnames=('table', 'job'))
+
+    async def _ensure_staging(self, target: MergeTarget):
+        if self._staging.get(target.staging) == target.columns:
+            return
+        # без ограничений и индексов целевой таблицы, строки удаляются при commit каждой пачки
+        await self.connection.execute(f'DROP TABLE IF EXISTS {target.staging}')
+        await self.connection.execute(
+            f'CREATE TEMP TABLE {target.staging} ON COMMIT DELETE ROWS AS '
+            f'SELECT {", ".join(target.columns)} FROM {target.table} WITH NO DATA')
+        self._staging[target.staging] = target.columns
+
+    @staticmethod
+    def _merge_sql(target: MergeTarget) -> str:
+        columns = ', '.join(target.columns)
+        conflict = ', '.join(target.conflict_cols)
+        if target.set_columns:
+            action = 'UPDATE SET ' + ', '.join([*(f'{column} = EXCLUDED.{column}' for column in target.set_columns),
+                                                *(f'{column} = NULL' for column in target.null_on_update)])
+        else:
+            action = 'NOTHING'
+        # одна строка на ключ: ON CONFLICT DO UPDATE не может изменить строку дважды, побеждает последняя в пачке
+        return (f'INSERT INTO {target.table} ({columns}) '
+                f'SELECT DISTINCT ON ({conflict}) {columns} FROM {target.staging} '
+                f'ORDER BY {conflict}, ctid DESC '
+                f'ON CONFLICT ({conflict}) DO {action}')
+
+    @staticmethod
+    def _row(target: MergeTarget, record: Record) -> Sequence[Any]:
+        if not isinstance(record, dict):
+            return record
+        if missing := [column for column in target.columns if column not in record and column not in target.defaults]:
+            raise ValueError(f'{target.table} record has no {missing}, '
+                             f'pass them or narrow MergeTarget.columns to the keys of the records')
+        return tuple(record[column] if column in record else target.defaults[column]() for column in target.columns)
+
+    async def _chunks(self, target: MergeTarget, records: Records, skip: int):
+        chunk = []
+        position = 0
+        async for record in _iterate(records):
+            position += 1
+            if position <= skip:
+                continue
+            chunk.append(self._row(target, record))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def _load_chunk(self, target: MergeTarget, chunk: list) -> int:
+        async with self.connection.transaction():
+            await self.connection.copy_records_to_table(target.staging, records=chunk, columns=target.columns)
+            status = await self.connection.execute(self._merge_sql(target))
+        return int(status.rsplit(' ', 1)[-1])  # INSERT 0 <rows>
+
+    async def load(self,
+                   target: MergeTarget,
+                   records: Records,
+                   job: str = '',
+                   offset: int = 0,
+                   checkpoint: Optional[Callable[[LoadProgress], Awaitable[None]]] = None) -> LoadProgress:
+        """
+        Загружает записи (tuple в порядке target.columns или dict) пачками по chunk_size.
+        offset - сколько записей источника пропустить (продолжение прерванной загрузки),
+        checkpoint вызывается после каждой слитой пачки - место сохранить progress.offset
+        """
+        job = job or target.table
+        progress = LoadProgress(job=job, table=target.table, offset=offset)
+        await self._ensure_staging(target)
+        log.info('Bulk load started', extra={'job': job, 'table': target.table, 'offset': offset})
+
+        async for chunk in self._chunks(target, records, skip=offset):
+            start = time.perf_counter()
+            merged = await self._load_chunk(target, chunk)
+            self.chunk_seconds.labels(target.table).observe(time.perf_counter() - start)
+            self.rows.labels(target.table, 'copied').inc(len(chunk))
+            self.rows.labels(target.table, 'merged').inc(merged)
+
+            progress.offset += len(chunk)
+            progress.merged += merged
+            progress.chunks += 1
+            self.offset.labels(target.table, job).set(progress.offset)
+            if checkpoint is not None:
+                await checkpoint(progress)
+            log.debug('Bulk load chunk merged', extra={'job': job, 'table': target.table, 'offset': progress.offset,
+                                                       'merged': merged, 'rows_per_second': round(progress.rate)})
+
+        log.info('Bulk load finished', extra={'job': job, 'table': target.table, 'offset': progress.offset,
+                                              'merged': progress.merged, 'chunks': progress.chunks,
+                                              'rows_per_second': round(progress.rate)})
+        return progress
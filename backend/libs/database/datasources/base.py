@@ -1,11 +1,13 @@
 import abc
 from collections.abc import Sequence
+from dataclasses import dataclass, field
 from typing import Any, Iterable, Optional, TypeVar
 
 import pydantic
 import sqlalchemy
 from pydantic import BaseModel
-from sqlalchemy import and_, select, insert
+from sqlalchemy import and_, bindparam, func, select, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.sql import Select, Insert
 
@@ -14,6 +16,38 @@ from libs.database.sql_alchemy import get_db_session
 T = TypeVar("T")
 MT = TypeVar("MT")
 
+# значение фильтра влияет на форму запроса: None -> IS NULL, pydantic модель -> сравнение по <key>_id
+VALUE_PLAIN, VALUE_NONE, VALUE_MODEL = 0, 1, 2
+
+# asyncpg передает в одном запросе не больше 32767 параметров
+MAX_QUERY_PARAMS = 32767
+UPSERT_CHUNK_SIZE = 1000
+
+
+@dataclass(slots=True)
+class DatasourceMeta:
+    """
+    Метаданные класса datasource, считаются один раз на класс при создании первого экземпляра.
+    statements - готовые запросы с bindparam, ключ - форма фильтра (имена ключей и вид значений)
+    """
+    table: Any
+    tables: dict[str, Any]
+    columns: dict[str, set[str]] = field(default_factory=dict)
+    available_columns: frozenset[str] = frozenset()
+    ambigious_columns: frozenset[str] = frozenset()
+    statements: dict[tuple, tuple[Select, tuple]] = field(default_factory=dict)
+
+
+_registry: dict[type, DatasourceMeta] = {}
+
+
+def value_kind(value: Any) -> int:
+    if value is None:
+        return VALUE_NONE
+    if isinstance(value, BaseModel):
+        return VALUE_MODEL
+    return VALUE_PLAIN
+
 
 class Base:
     table = T
@@ -24,8 +58,33 @@ class Base:
         if not session:
             session = get_db_session()
         self.session = session
-        self.available_columns = self._get_available_columns()
-        self.ambigious_columns = self._get_ambigious_columns()
+        self._init_meta()
+
+    def _init_meta(self):
+        meta = _registry.get(type(self))
+        if meta is None:
+            meta = _registry[type(self)] = self._build_meta()
+        self._meta = meta
+        self.table = meta.table
+        self.tables = meta.tables
+        self.columns = meta.columns
+        self.available_columns = meta.available_columns
+        self.ambigious_columns = meta.ambigious_columns
+
+    def _build_meta(self) -> DatasourceMeta:
+        # часть datasource объявляет таблицу как table_name
+        table = self.table if self.table is not T else getattr(self, 'table_name', T)
+        self.table = table
+        self.tables = self._get_table_map()
+        available_columns = self._get_available_columns()
+        return DatasourceMeta(table=table,
+                              tables=self.tables,
+                              columns=self.columns,
+                              available_columns=frozenset(available_columns),
+                              ambigious_columns=frozenset(self._get_ambigious_columns()))
+
+    def _get_table_map(self) -> dict[str, T]:
+        return {self.table.__tablename__: self.table}
 
     def _transform(self, line) -> MT:
         '''
@@ -34,22 +93,37 @@ class Base:
         return self.model.model_validate(line)
 
     def _build_conditions(self, **kwargs: dict[str, Any]):
+        """ Условие с bindparam и правила извлечения параметров: ((ключ, имя параметра, брать ли .id), ...) """
         self._check_filter_keys(kwargs.keys())
         conditions = {}
+        extractors = []
         unknown_columns = []
-        columns = self.table.__table__.columns.keys()
+        columns = self.table.__table__.columns
         for key, value in kwargs.items():
+            kind = value_kind(value)
             if key in columns:
-                conditions[key] = value
-            elif ((fkey := key + '_id') in columns
-                  and (value is None or isinstance(value, BaseModel))):
-                conditions[fkey] = value.id if value else None
+                column = key
+            elif (fkey := key + '_id') in columns and kind != VALUE_PLAIN:
+                column = fkey
             else:
                 unknown_columns.append(key)
+                continue
+            if kind == VALUE_NONE:
+                conditions[column] = columns[column].is_(None)
+            else:
+                conditions[column] = columns[column] == bindparam(column)
+                extractors.append((key, column, column != key))
 
         if unknown_columns:
             raise AttributeError(f'Unknown column(s) {unknown_columns} on getting from {self.__class__.__name__}')
-        return and_(self.table.__table__.columns[col] == value for col, value in conditions.items())
+        return and_(sqlalchemy.true(), *conditions.values()), tuple(extractors)
+
+    @staticmethod
+    def _extract_params(extractors: tuple, kwargs: dict[str, Any]) -> dict[str, Any]:
+        params = {}
+        for key, param, by_id in extractors:
+            params[param] = kwargs[key].id if by_id else kwargs[key]
+        return params
 
     def _check_filter_keys(self, keys: Iterable):
         keys_wo_prefixes = [key.split('__')[-1] for key in keys]
@@ -71,16 +145,29 @@ class Base:
         return set()
 
     async def get(self, raw: bool = False, **kwargs) -> Optional[MT]:
-        return await self._get_one_by(self._build_conditions(**kwargs), raw)
+        signature = tuple((key, value_kind(value)) for key, value in kwargs.items())
+        cached = self._meta.statements.get(signature)
+        if cached is None:
+            where, extractors = self._build_conditions(**kwargs)
+            cached = self._meta.statements[signature] = (self._one_statement(select(self.table).where(where)),
+                                                         extractors)
+        query, extractors = cached
+        return await self._fetch_one(query, raw, self._extract_params(extractors, kwargs))
 
     async def _get_one_by(self, where: Any, raw: bool = False) -> Optional[MT]:
         query = select(self.table).where(where)
         return await self._get_one(query, raw)
 
-    async def _get_one(self, query: Select, raw: bool = False) -> Optional[MT]:
+    def _one_statement(self, query: Select) -> Select:
         if self._selectinload:
-            query = self.__selectinload(query)
-        result = await self.session.execute(query.limit(1))
+            query = self._with_selectinload(query)
+        return query.limit(1)
+
+    async def _get_one(self, query: Select, raw: bool = False) -> Optional[MT]:
+        return await self._fetch_one(self._one_statement(query), raw)
+
+    async def _fetch_one(self, query: Select, raw: bool = False, params: dict | None = None) -> Optional[MT]:
+        result = await self.session.execute(query, params)
         record = result.scalar()
 
         if raw:
@@ -90,19 +177,22 @@ class Base:
 
     async def _get_first(self, query: Select) -> Any | None:
         if self._selectinload:
-            query = self.__selectinload(query)
+            query = self._with_selectinload(query)
         result = await self.session.execute(query.limit(1))
         return result.first()
 
     async def _get_list(self, query: Select, raw: bool = False) -> list[MT]:
         if self._selectinload:
-            query = self.__selectinload(query)
-        result = await self.session.execute(query)
+            query = self._with_selectinload(query)
+        return await self._fetch_list(query, raw)
+
+    async def _fetch_list(self, query: Select, raw: bool = False, params: dict | None = None) -> list[MT]:
+        result = await self.session.execute(query, params)
         if raw:
             return result.fetchall()
         return [self._transform(item) for (item,) in result.fetchall()]
 
-    def __selectinload(self, query: Select):
+    def _with_selectinload(self, query: Select):
         for item in self._selectinload:
             join: sqlalchemy.table = None
             if isinstance(item, Iterable):
@@ -126,15 +216,74 @@ class Base:
         return query
 
     async def _bulk_insert(self, query: Insert, items: Sequence[dict], raw: bool = False) -> list[MT]:
-        result = self.session.scalars(query, items)
+        result = await self.session.scalars(query, items)
 
         if raw:
             return result.all()
-        return [self._transform(item) for (item,) in result.all()]
+        return [self._transform(item) for item in result.all()]
 
     async def bulk_insert(self, items: Sequence[dict], return_inserted=True, raw: bool = False) -> list[MT]:
         return await self._bulk_insert(self._build_insert(items, return_inserted), items, raw)
 
+    def _returning(self, query) -> Select:
+        """ Строки, измененные INSERT/UPDATE, сразу ORM объектами (с selectinload) - без повторного SELECT """
+        select_ = select(self.table)
+        if self._selectinload:
+            select_ = self._with_selectinload(select_)
+        return (select_
+                .from_statement(query.returning(self.table))
+                .execution_options(populate_existing=True))
+
+    def _build_upsert(self,
+                      items: Sequence[dict],
+                      conflict_cols: Sequence[str],
+                      update_cols: Optional[Sequence[str]]):
+        query = pg_insert(self.table).values(list(items))
+        if update_cols is None:
+            update_cols = [column for column in items[0] if column not in conflict_cols]
+        set_ = {column: query.excluded[column] for column in update_cols}
+        if set_ and 'updated_at' in self.table.__table__.columns:
+            set_['updated_at'] = func.now()  # onupdate колонки не срабатывает в ON CONFLICT
+        if not set_:
+            # DO NOTHING не возвращает уже существующую строку, обновление "на себя" возвращает
+            set_ = {conflict_cols[0]: query.excluded[conflict_cols[0]]}
+        return query.on_conflict_do_update(index_elements=list(conflict_cols), set_=set_)
+
+    async def bulk_upsert(self,
+                          items: Sequence[dict],
+                          conflict_cols: Sequence[str],
+                          update_cols: Optional[Sequence[str]] = None,
+                          returning: bool = True,
+                          raw: bool = False,
+                          chunk_size: int = UPSERT_CHUNK_SIZE) -> list[MT]:
+        '''
+        INSERT ... ON CONFLICT (conflict_cols) DO UPDATE ... RETURNING - один запрос на пачку строк.
+        conflict_cols должны совпадать с уникальным индексом, у всех items одинаковый набор колонок.
+        update_cols - что менять у существующих строк, по умолчанию все переданные колонки кроме conflict_cols,
+        пустой список - строка не меняется, но возвращается.
+        Большие списки режутся на пачки, чтобы не упереться в лимит параметров asyncpg.
+        '''
+        if not items:
+            return []
+        self._check_filter_keys(items[0].keys())
+        rows = max(1, min(chunk_size, MAX_QUERY_PARAMS // len(items[0])))
+
+        result = []
+        for start in range(0, len(items), rows):
+            query = self._build_upsert(items[start:start + rows], conflict_cols, update_cols)
+            if returning:
+                result.extend(await self._fetch_list(self._returning(query), raw))
+            else:
+                await self.session.execute(query)
+        return result
+
+    async def _update(self, where: Any, values: dict[str, Any], raw: bool = False) -> list[MT]:
+        """ UPDATE ... RETURNING: изменить и получить строки одним запросом """
+        if not values:
+            return await self._get_list(select(self.table).where(where), raw)
+        self._check_filter_keys(values.keys())
+        return await self._fetch_list(self._returning(update(self.table).where(where).values(**values)), raw)
+
 
 class Joinable(Base):
     '''
@@ -150,7 +299,10 @@ class Joinable(Base):
             session = get_db_session()
         self.session = session
         self.model = self._get_model()
-        self.tables = {
+        self._init_meta()
+
+    def _get_table_map(self) -> dict[str, T]:
+        return {
             table.__tablename__: table
             for table in self._get_tables()
         }
@@ -185,36 +337,46 @@ class Joinable(Base):
     def _build_conditions(self, **kwargs: dict[str, Any]):
         self._check_filter_keys(kwargs.keys())
         conditions = {}
+        extractors = []
         for key, value in kwargs.items():
             if not value:
                 continue
             if '__' in key:
-                table_name, key = key.split('__')
+                table_name, column = key.split('__')
                 table = self.tables.get(table_name)
                 if table:
-                    conditions[table.__table__.columns[key]] = value
+                    conditions[table.__table__.columns[column]] = bindparam(key)
                 else:
                     raise ValueError(f'Unknown table {table} on getting from {self.__class__.__name__}')
             else:
                 for table in self.tables.values():
                     if key in table.__table__.columns:
-                        conditions[table.__table__.columns[key]] = value
+                        conditions[table.__table__.columns[key]] = bindparam(key)
                         break
-
-        return and_(key == value for key, value in conditions.items())
-
-    def _query(self, **kwargs: dict[str, Any]) -> Select:
-        tables = list(self.tables.values())
-        stmt = select(*tables)
-        for joined_table in tables[1:]:
-            stmt = stmt.join(joined_table)
-        stmt = stmt.filter(self._build_conditions(**kwargs))
-        return stmt
+            extractors.append((key, key, False))
+
+        return and_(sqlalchemy.true(), *(key == value for key, value in conditions.items())), tuple(extractors)
+
+    def _query(self, **kwargs: dict[str, Any]) -> tuple[Select, tuple]:
+        # пустые значения в фильтре не участвуют, поэтому они часть формы запроса
+        signature = tuple((key, not value) for key, value in kwargs.items())
+        cached = self._meta.statements.get(signature)
+        if cached is None:
+            tables = list(self.tables.values())
+            stmt = select(*tables)
+            for joined_table in tables[1:]:
+                stmt = stmt.join(joined_table)
+            where, extractors = self._build_conditions(**kwargs)
+            stmt = stmt.filter(where)
+            if self._selectinload:
+                stmt = self._with_selectinload(stmt)
+            cached = self._meta.statements[signature] = (stmt, extractors)
+        return cached
 
     async def _get_one_by(self, where: Any, raw: bool = False) -> Optional[MT]:
         query = select(self.table).where(where)
         return await self._get_one(query, raw)
 
     async def get_all(self, **kwargs: dict[str, Any]) -> list[MT]:
-        query = self._query(**kwargs)
-        return await self._get_list(query)
+        query, extractors = self._query(**kwargs)
+        return await self._fetch_list(query, params=self._extract_params(extractors, kwargs))
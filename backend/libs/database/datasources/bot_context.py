@@ -0,0 +1,143 @@
+from datetime import timedelta
+from typing import Iterable, Optional, Union
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from libs import logging
+from libs.cache.client import BaseCommonCache
+from libs.cache.serializers import OrjsonModelSerializer
+from libs.config import settings
+from libs.database.models import BotContext
+from libs.database import tables as db
+from libs.identity import identity_resolver
+from libs.utils.time import timedelta_from_duration
+
+from .base import Base
+
+log = logging.getLogger('datasources')
+
+
+class BotContextCache(BaseCommonCache):
+    """
+    Снимок бота для ручек подписчиков: проект, владелец, платежная система.
+    Тарифы живут отдельно в ProjectTariffsCache. Пересобирается при изменении проекта,
+    TTL - страховка от пропущенной пересборки
+    """
+    metrics_prefix = 'bot_context_cache'
+    service_name = 'bot_context'
+
+    value_serializer = OrjsonModelSerializer(BotContext)
+    expire: Optional[Union[int, timedelta]] = timedelta_from_duration(
+        settings.CACHE.get('BOT_CONTEXT', {}).get('TTL', '1h'))
+
+    @staticmethod
+    def bot_key(bot_tg_id: str) -> str:
+        return f'bot_context:bot:{bot_tg_id}'
+
+    @staticmethod
+    def project_key(project_id: int) -> str:
+        # тот же снимок по id проекта: при смене бота проекта по нему находим и удаляем ключ старого бота
+        return f'bot_context:project:{project_id}'
+
+
+class BotContextVersionCache(BaseCommonCache):
+    """
+    Метка последней пересборки снимка бота. Загрузка снимка сравнивает ее до и после чтения базы:
+    если пересборка прошла во время чтения, прочитанное могло быть до commit, и снимок читается заново
+    """
+    metrics_prefix = 'bot_context_version_cache'
+    service_name = 'bot_context_version'
+
+    expire: Optional[Union[int, timedelta]] = BotContextCache.expire
+
+    @staticmethod
+    def bot_key(bot_tg_id: str) -> str:
+        return f'bot_context:version:{bot_tg_id}'
+
+
+class BotContextDatasource(Base):
+    table_name = db.Project
+    model = BotContext
+
+    async def _build(self, where) -> dict[str, BotContext]:
+        """ Снимки по условию на проект/бота, у бота с несколькими проектами берется первый """
+        query = (
+            select(db.Project.id.label('project_id'),
+                   db.Project.owner_id,
+                   db.Project.payment_system_id,
+                   db.Project.payment_destination,
+                   db.UserProfile.id.label('bot_profile_id'),
+                   db.User.user_tg_id.label('bot_telegram_id'))
+            .join(db.UserProfile, db.UserProfile.id == db.Project.admin_bot_id)
+            .join(db.User, db.User.id == db.UserProfile.user_id)
+            .where(where)
+            .order_by(db.Project.id)
+        )
+        contexts = {}
+        for row in (await self.session.execute(query)).mappings().all():
+            contexts.setdefault(row['bot_telegram_id'], BotContext(**row))
+        return contexts
+
+    async def _load(self, bot_tg_id: str) -> Optional[BotContext]:
+        versions = BotContextVersionCache()
+        version = await versions.get(versions.bot_key(bot_tg_id))
+        context = (await self._build(db.User.user_tg_id == bot_tg_id)).get(bot_tg_id)
+        if await versions.get(versions.bot_key(bot_tg_id)) != version:
+            # иначе устаревший снимок лег бы поверх пересобранного на весь TTL
+            context = (await self._build(db.User.user_tg_id == bot_tg_id)).get(bot_tg_id)
+        if context and BotContextCache.client:
+            await BotContextCache().set(BotContextCache.project_key(context.project_id), context)
+        return context
+
+    async def get_context(self, bot_tg_id: str) -> Optional[BotContext]:
+        """ Один ключ в Redis, при промахе - один запрос в базу """
+        return await BotContextCache().get_or_compute(BotContextCache.bot_key(bot_tg_id),
+                                                      lambda: self._load(bot_tg_id),
+                                                      lock=True)
+
+    async def participants(self, where) -> set[str]:
+        """ Telegram id владельцев и ботов проектов по условию: их пользователи в identity кеше держат проекты """
+        profiles = select(db.Project.owner_id).where(where).union(select(db.Project.admin_bot_id).where(where))
+        query = (select(db.User.user_tg_id)
+                 .join(db.UserProfile, db.UserProfile.user_id == db.User.id)
+                 .where(db.UserProfile.id.in_(profiles)))
+        return set((await self.session.scalars(query)).all())
+
+    async def invalidate_participants(self, project_ids: Iterable[int], participants: Iterable[str] = ()):
+        """
+        Сбрасывает identity кеш владельцев и ботов проектов, вызывается после commit изменений проекта или тарифов.
+        participants - прежние владельцы и боты, если изменение могло их заменить
+        """
+        if project_ids := set(project_ids):
+            await identity_resolver.invalidate(*{*participants,
+                                                 *await self.participants(db.Project.id.in_(project_ids))})
+
+    async def rebuild(self, project_ids: Iterable[int], participants: Iterable[str] = ()):
+        """ Пересобирает снимки ботов проектов после commit изменений проекта, сбрасывает identity кеш """
+        project_ids = set(project_ids)
+        await self.invalidate_participants(project_ids, participants)
+        if not project_ids or not BotContextCache.client:
+            return
+
+        cache = BotContextCache()
+        # все проекты текущих ботов: снимок бота с несколькими проектами не должен переключиться на другой проект
+        bots = select(db.Project.admin_bot_id).where(db.Project.id.in_(project_ids))
+        contexts = await self._build(db.Project.admin_bot_id.in_(bots))
+        previous = await cache.mget([cache.project_key(project_id) for project_id in project_ids])
+
+        # ключ бота, которого сняли с проекта, удаляется - свежий снимок соберется при следующем запросе
+        built = {context.project_id for context in contexts.values()}
+        stale = [cache.bot_key(context.bot_telegram_id) for context in previous.values()
+                 if context and context.bot_telegram_id not in contexts]
+        stale += [cache.project_key(project_id) for project_id in project_ids if project_id not in built]
+        rebuilt = {*contexts, *(context.bot_telegram_id for context in previous.values() if context)}
+        if rebuilt:
+            versions = BotContextVersionCache()
+            await versions.mset({versions.bot_key(tg_id): uuid4().hex for tg_id in rebuilt})
+        if stale:
+            await cache.delete('', keys=stale)
+        if contexts:
+            await cache.mset({**{cache.bot_key(tg_id): context for tg_id, context in contexts.items()},
+                              **{cache.project_key(context.project_id): context for context in contexts.values()}})
+        log.debug('Bot contexts rebuilt', extra={'projects': sorted(project_ids), 'stale': len(stale)})
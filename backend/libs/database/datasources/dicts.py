@@ -1,18 +1,67 @@
+from datetime import timedelta
+
 from sqlalchemy import and_, select
 
+from libs import logging
+from libs.cache.client import DictCache
+from libs.cache.invalidation import invalidation_channel
+from libs.config import settings
 from libs.database.models import GigaTariff, PaymentSystem
 from libs.database import tables as db
+from libs.utils.time import timedelta_from_duration
+
+from .base import Base, T
+
+log = logging.getLogger('datasources')
 
-from .base import Base
+dicts_settings = settings.CACHE.get('DICTS', {})
 
 
 class DictDatasource(Base):
+    '''
+    Справочники почти не меняются, поэтому get_all читает их через кеш процесса (read-through, с TTL).
+    После изменения справочника нужно вызвать invalidate() - кеш сбросится во всех воркерах через Redis pub/sub
+    '''
+    ttl: timedelta = timedelta_from_duration(dicts_settings.get('TTL', '10m'))
+    _local: DictCache = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.table is T:
+            return
+        cls._local = DictCache(expire=cls.ttl)
+        invalidation_channel.subscribe(cls.namespace(), lambda _version: cls._local.clear())
+
+    @classmethod
+    def namespace(cls) -> str:
+        return f'dict:{cls.table.__tablename__}'
+
+    @classmethod
+    async def invalidate(cls):
+        await invalidation_channel.publish(cls.namespace())
+
     async def get_all(self, active_only=True):
+        key = 'active' if active_only else 'all'
+        cached = await self._local.get(key)
+        if cached is not None:
+            return cached
+
+        version = invalidation_channel.version(self.namespace())
         query = select(self.table)
         if active_only:
             query = query.where(self.table.active.is_(active_only))
+        items = await self._get_list(query)
+
+        # справочник сбросили, пока шел запрос - не кладем в кеш устаревшие данные
+        if version == invalidation_channel.version(self.namespace()):
+            await self._local.set(key, items)
+        return items
 
-        return self._get_list(query)
+    @classmethod
+    async def preload(cls, session):
+        for datasource in cls.__subclasses__():
+            await datasource(session).get_all()
+            log.info('Dictionary preloaded', extra={'namespace': datasource.namespace()})
 
 
 class GigaTariffDatasource(DictDatasource):
@@ -1,47 +1,35 @@
 from typing import Optional
 
-from sqlalchemy import update
-
 from libs.database.models import Project, ProfileTypes
 from libs.database import tables as db
 from .base import Base
+from .bot_context import BotContextDatasource
 from .user import UserDatasource, UserProfileDatasource
 
 
 class ProjectDatasource(Base):
     table_name = db.Project
     model = Project
-    _selectinload = (db.Project.channels, db.Tariff)
-
-    async def _save(self, project: db.Project) -> Project:
-        model_object = Project.model_validate(project)
-
-        if project.id:
-            query = (
-                update(db.Project)
-                .where(db.Project.id == project.id)
-                .values(owner_id=project.owner_id,
-                        name=project.name,
-                        owner=project.owner,
-                        admin_bot_id=project.admin_bot_id,
-                        admin_bot=project.admin_bot,
-                        tarrif_id=project.tariff_id,
-                        tariff=project.tariff,
-                        payment_destination=project.payment_destination,
-                        payment_system_id=project.payment_system_id,
-                        payment_system=project.payment_system)
-            )
-            await self.session.execute(query)
-
-        else:
-            self.session.add(project)
+    _selectinload = (db.Project.channels, db.Project.tariffs)
+    # без них проект не создать, только обновить существующий
+    _required_columns = frozenset(('admin_bot_id', 'tariff_id', 'payment_system_id'))
+
+    @staticmethod
+    def _values(**kwargs) -> dict:
+        # пустые значения не затирают текущие
+        return {key: value for key, value in kwargs.items() if value}
+
+    async def _update_one(self, where, values: dict) -> Project | None:
+        # прежние владелец и бот проекта тоже держат его в identity кеше
+        previous = await BotContextDatasource(self.session).participants(where) if values else set()
+        projects = await self._update(where, values)
         await self.session.commit()
-
-        return model_object
+        if values:
+            await BotContextDatasource(self.session).rebuild([project.id for project in projects], previous)
+        return projects[0] if projects else None
 
     async def change_owner(self, project_id: int,
                            new_telegram_owner_id: str) -> Project:
-        project = await self.get(id=project_id)
         new_owner = await UserDatasource(self.session).get(user_tg_id=new_telegram_owner_id)
         if not new_owner:
             new_owner = await UserDatasource(self.session).save(user_tg_id=new_telegram_owner_id,
@@ -50,10 +38,8 @@ class ProjectDatasource(Base):
         if not new_owner_profile:
             new_owner_profile = await UserProfileDatasource(self.session).save(user_id=new_owner.id,
                                                                                profile_type=ProfileTypes.OWNER)
-        project.owner = new_owner_profile
-        project.owner_id = new_owner_profile.id
 
-        return await self._save(project=project)
+        return await self._update_one(db.Project.id == project_id, {'owner_id': new_owner_profile.id})
 
     async def create_or_update_project_by_name(self,
                                                name: str,
@@ -61,29 +47,23 @@ class ProjectDatasource(Base):
                                                admin_bot_id: Optional[int] = None,
                                                tariff_id: Optional[int] = None,
                                                payment_destination: Optional[str] = None,
-                                               payment_system_id: Optional[int] = None) -> Project:
-
-        project = await self.get(name=name, owner_id=owner_id)
-
-        if project:
-            project.owner_id = owner_id or project.owner_id
-            project.name = name or project.name
-            project.admin_bot_id = admin_bot_id or project.admin_bot_id
-            project.tariff_id = tariff_id or project.tariff_id
-            project.payment_destination = payment_destination or project.payment_destination
-            project.payment_system_id = payment_system_id or project.payment_system_id
-
-        if not project:
-            project = db.Project(name=name,
-                                 owner_id=owner_id,
-                                 admin_bot_id=admin_bot_id,
-                                 tariff_id=tariff_id,
-                                 payment_destination=payment_destination,
-                                 payment_system_id=payment_system_id)
-
-        project_model = await self._save(project=project)
+                                               payment_system_id: Optional[int] = None) -> Project | None:
+        values = self._values(admin_bot_id=admin_bot_id,
+                              tariff_id=tariff_id,
+                              payment_destination=payment_destination,
+                              payment_system_id=payment_system_id)
+
+        if not self._required_columns <= values.keys():
+            return await self._update_one((db.Project.owner_id == owner_id) & (db.Project.name == name), values)
+
+        previous = await BotContextDatasource(self.session).participants(
+            (db.Project.owner_id == owner_id) & (db.Project.name == name))
+        projects = await self.bulk_upsert([{'name': name, 'owner_id': owner_id, **values}],
+                                          conflict_cols=('owner_id', 'name'))
+        await self.session.commit()
+        await BotContextDatasource(self.session).rebuild([projects[0].id], previous)
 
-        return project_model
+        return projects[0]
 
     async def update_by_id(self,
                            project_id: int,
@@ -93,18 +73,10 @@ class ProjectDatasource(Base):
                            payment_destination: Optional[str] = None,
                            payment_system_id: Optional[int] = None
                            ) -> Project | None:
+        values = self._values(name=name,
+                              admin_bot_id=admin_bot_id,
+                              tariff_id=tariff_id,
+                              payment_destination=payment_destination,
+                              payment_system_id=payment_system_id)
 
-        project = await self.get(id=project_id)
-
-        if not project:
-            return None
-
-        project.name = name or project.name
-        project.admin_bot_id = admin_bot_id or project.admin_bot_id
-        project.tariff_id = tariff_id or project.tariff_id
-        project.payment_destination = payment_destination or project.payment_destination
-        project.payment_system_id = payment_system_id or project.payment_system_id
-
-        project_model = await self._save(project=project)
-
-        return project_model
+        return await self._update_one(db.Project.id == project_id, values)
@@ -22,7 +22,8 @@ class SubscriptionDatasource(Base):
                 update(db.Subscription)
                 .where(db.Subscription.id == subscription.id)
                 .values(
-                    end_at=subscription.end_at
+                    end_at=subscription.end_at,
+                    expired_at=None
                 )
             )
             await self.session.execute(query)
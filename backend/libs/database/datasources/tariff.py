@@ -1,15 +1,23 @@
 from typing import Optional
-from sqlalchemy import update
+from sqlalchemy import select, update
 
 from libs.database.models import TariffModel
 from libs.database import tables as db
 from .base import Base
+from .bot_context import BotContextDatasource
 
 
 class TariffDatasource(Base):
     table_name = db.Tariff
     model = TariffModel
-    _selectinload = (db.Project,)
+    _selectinload = (db.Tariff.project,)
+
+    async def get_project_tariffs(self, project_id: int, active_only: bool = True) -> list[TariffModel]:
+        query = select(self.table).where(self.table.project_id == project_id).order_by(self.table.id)
+        if active_only:
+            query = query.where(self.table.active.is_(True))
+        # проект в ответе не нужен, поэтому без _selectinload
+        return await self._fetch_list(query)
 
     async def _save(self, tariff: db.Tariff) -> TariffModel:
         model_object = tariff.model_validate(tariff)
@@ -29,9 +37,18 @@ class TariffDatasource(Base):
         else:
             self.session.add(tariff)
         await self.session.commit()
+        # тарифы в графе пользователей владельца и бота, ProjectTariffsCache сбрасывает хендлер
+        await BotContextDatasource(self.session).invalidate_participants([tariff.project_id])
 
         return model_object
 
+    async def save_project_tariffs(self, project_id: int, tariffs: list[dict]) -> list[TariffModel]:
+        """ Только новые тарифы: имя, уже занятое в проекте, - IntegrityError по ix_tariff_project_id_name """
+        inserted = await self.bulk_insert([{**tariff, 'project_id': project_id} for tariff in tariffs])
+        await self.session.commit()
+        await BotContextDatasource(self.session).invalidate_participants([project_id])
+        return inserted
+
     async def update_tariff(self,
                             tariff_id: int,
                             name: Optional[str] = None,
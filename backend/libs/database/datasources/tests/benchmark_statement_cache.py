@@ -0,0 +1,41 @@
+"""
+Стоимость построения запроса в Base.get() без обращения к БД.
+Заглушка сессии считает cache key запроса, как это делает sqlalchemy при execute.
+
+    python -m libs.database.datasources.tests.benchmark_statement_cache
+"""
+import asyncio
+import time
+
+from ..base import _registry
+from .test_statement_cache import ItemDatasource, Result
+
+ROUNDS = 20_000
+
+
+class CacheKeySession:
+    async def execute(self, query, params=None):
+        query._generate_cache_key()
+        return Result()
+
+
+async def run(rounds: int, cold: bool) -> float:
+    session = CacheKeySession()
+    start = time.perf_counter()
+    for i in range(rounds):
+        if cold:  # поведение до кеша: форма запроса строится на каждый вызов
+            _registry.pop(ItemDatasource, None)
+        await ItemDatasource(session).get(name=str(i), owner_id=i)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    cold = asyncio.run(run(ROUNDS, cold=True))
+    warm = asyncio.run(run(ROUNDS, cold=False))
+    print(f'rebuild per call: {cold * 1e6:8.1f} us')
+    print(f'cached statement: {warm * 1e6:8.1f} us')
+    print(f'speedup:          {cold / warm:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import pytest
+
+from libs.cache.client import DictCache
+from libs.database.models import BotContext
+
+from ..bot_context import BotContextCache, BotContextDatasource, BotContextVersionCache
+
+
+class ScalarsSession:
+    def __init__(self, tg_ids: list[str]):
+        self.tg_ids = tg_ids
+
+    async def scalars(self, query):
+        return self
+
+    def all(self):
+        return self.tg_ids
+
+
+@pytest.mark.asyncio
+async def test_rebuild_invalidates_owners_and_admin_bots(monkeypatch):
+    invalidated = []
+
+    async def invalidate(*tg_ids):
+        invalidated.extend(tg_ids)
+
+    monkeypatch.setattr('libs.database.datasources.bot_context.identity_resolver.invalidate', invalidate)
+    monkeypatch.setattr(BotContextCache, 'client', None)
+    session = ScalarsSession(['owner', 'bot'])
+
+    await BotContextDatasource(session).rebuild([1], participants=['old_bot'])
+
+    assert sorted(invalidated) == ['bot', 'old_bot', 'owner']
+
+
+class ProjectsSession:
+    """ Отдает строки проектов так, как их вернул бы запрос _build: по возрастанию id проекта """
+
+    def __init__(self, *projects: tuple[int, str]):
+        self.projects = list(projects)
+
+    async def scalars(self, query):
+        return ScalarsSession([])  # участники для identity
+
+    async def execute(self, query):
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return [row(*project) for project in self.projects]
+
+
+def row(project_id: int, bot_tg_id: str) -> dict:
+    return {'project_id': project_id, 'owner_id': 1, 'payment_system_id': 1, 'payment_destination': 'card',
+            'bot_profile_id': 10, 'bot_telegram_id': bot_tg_id}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = DictCache()
+
+    async def invalidate(*tg_ids):
+        pass
+
+    monkeypatch.setattr('libs.database.datasources.bot_context.identity_resolver.invalidate', invalidate)
+    monkeypatch.setattr(BotContextCache, 'client', object())
+    for cache in (BotContextCache, BotContextVersionCache):
+        for method in ('get', 'mget', 'set', 'mset', 'delete'):
+            monkeypatch.setattr(cache, method,
+                                lambda self, *args, _method=method, **kwargs: getattr(store, _method)(*args, **kwargs))
+    return store
+
+
+def cached(store: DictCache, project_id: int, bot_tg_id: str):
+    context = BotContext(**row(project_id, bot_tg_id))
+    store.data.update({BotContextCache.bot_key(bot_tg_id): context, BotContextCache.project_key(project_id): context})
+
+
+@pytest.mark.asyncio
+async def test_bot_moved_off_project_loses_its_snapshot(store):
+    cached(store, 1, 'old_bot')
+
+    await BotContextDatasource(ProjectsSession((1, 'new_bot'))).rebuild([1])
+
+    assert BotContextCache.bot_key('old_bot') not in store.data
+    assert store.data[BotContextCache.bot_key('new_bot')].project_id == 1
+    assert store.data[BotContextCache.project_key(1)].bot_telegram_id == 'new_bot'
+
+
+@pytest.mark.asyncio
+async def test_bot_with_several_projects_keeps_the_first_one(store):
+    cached(store, 1, 'bot')
+
+    await BotContextDatasource(ProjectsSession((1, 'bot'), (2, 'bot'))).rebuild([2])
+
+    assert store.data[BotContextCache.bot_key('bot')].project_id == 1
+    assert BotContextCache.project_key(2) not in store.data
+
+
+@pytest.mark.asyncio
+async def test_project_without_bot_snapshot_is_cleaned_up(store):
+    cached(store, 1, 'bot')
+
+    await BotContextDatasource(ProjectsSession()).rebuild([1])
+
+    assert BotContextCache.project_key(1) not in store.data
+    assert BotContextCache.bot_key('bot') not in store.data
+    assert BotContextVersionCache.bot_key('bot') in store.data
+
+
+@pytest.mark.asyncio
+async def test_load_overtaken_by_rebuild_reads_again(store):
+    session = ProjectsSession((1, 'old_bot'))
+    datasource = BotContextDatasource(session)
+    build = datasource._build
+
+    async def build_then_rebuild(where):
+        contexts = await build(where)
+        if session.projects == [(1, 'old_bot')]:
+            # commit и пересборка проходят, пока загрузка читает старые строки
+            session.projects = [(1, 'bot')]
+            await datasource.rebuild([1])
+        return contexts
+
+    datasource._build = build_then_rebuild
+    context = await datasource._load('bot')
+
+    assert context.bot_telegram_id == 'bot'
+    assert store.data[BotContextCache.project_key(1)].bot_telegram_id == 'bot'
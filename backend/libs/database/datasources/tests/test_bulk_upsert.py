@@ -0,0 +1,64 @@
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import declarative_base
+
+from ..base import Base
+
+DeclarativeBase = declarative_base()
+
+
+class Profile(DeclarativeBase):
+    __tablename__ = 'profile'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    user_type = Column(String)
+    name = Column(String)
+    updated_at = Column(DateTime)
+
+
+class ProfileModel(BaseModel):
+    id: int
+
+
+class ProfileDatasource(Base):
+    table_name = Profile
+    model = ProfileModel
+
+
+class Result:
+    def fetchall(self):
+        return []
+
+
+class RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    async def execute(self, query, params=None):
+        self.calls.append(str(query.compile(dialect=postgresql.dialect())))
+        return Result()
+
+
+@pytest.mark.asyncio
+async def test_upsert_in_chunks():
+    session = RecordingSession()
+    items = [{'user_id': i, 'user_type': 'owner', 'name': str(i)} for i in range(5)]
+
+    await ProfileDatasource(session).bulk_upsert(items, conflict_cols=('user_id', 'user_type'), chunk_size=2)
+
+    assert len(session.calls) == 3
+    assert 'ON CONFLICT (user_id, user_type) DO UPDATE SET name = excluded.name, updated_at = now() ' \
+           'RETURNING' in session.calls[0]
+
+
+@pytest.mark.asyncio
+async def test_upsert_without_update_returns_existing_row():
+    session = RecordingSession()
+
+    await ProfileDatasource(session).bulk_upsert([{'user_id': 1, 'user_type': 'owner'}],
+                                                 conflict_cols=('user_id', 'user_type'), update_cols=())
+
+    assert 'DO UPDATE SET user_id = excluded.user_id RETURNING' in session.calls[0]
@@ -0,0 +1,89 @@
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.orm import declarative_base
+
+from ..base import Base
+
+DeclarativeBase = declarative_base()
+
+
+class Owner(DeclarativeBase):
+    __tablename__ = 'owner'
+
+    id = Column(Integer, primary_key=True)
+
+
+class Item(DeclarativeBase):
+    __tablename__ = 'item'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    owner_id = Column(ForeignKey('owner.id'))
+
+
+class ItemModel(BaseModel):
+    id: int
+
+
+class ItemDatasource(Base):
+    table_name = Item
+    model = ItemModel
+
+
+class Result:
+    def scalar(self):
+        return None
+
+
+class RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    async def execute(self, query, params=None):
+        self.calls.append((query, params))
+        return Result()
+
+
+@pytest.fixture
+def session():
+    return RecordingSession()
+
+
+@pytest.mark.asyncio
+async def test_statement_reused_between_instances(session):
+    await ItemDatasource(session).get(name='a', owner_id=1)
+    await ItemDatasource(session).get(name='b', owner_id=2)
+
+    (first, first_params), (second, second_params) = session.calls
+    assert first is second
+    assert first_params == {'name': 'a', 'owner_id': 1}
+    assert second_params == {'name': 'b', 'owner_id': 2}
+
+
+@pytest.mark.asyncio
+async def test_none_value_changes_statement_shape(session):
+    datasource = ItemDatasource(session)
+    await datasource.get(name='a', owner_id=1)
+    await datasource.get(name='a', owner_id=None)
+
+    (by_value, _), (by_null, params) = session.calls
+    assert by_value is not by_null
+    assert 'IS NULL' in str(by_null)
+    assert params == {'name': 'a'}
+
+
+@pytest.mark.asyncio
+async def test_unknown_column_is_not_cached(session):
+    datasource = ItemDatasource(session)
+    for _ in range(2):
+        with pytest.raises(AttributeError):
+            await datasource.get(unknown='a')
+    assert not session.calls
+
+
+def test_table_name_resolved_once(session):
+    datasource = ItemDatasource(session)
+    assert datasource.table is Item
+    assert datasource.available_columns == {'id', 'name', 'owner_id'}
+    assert ItemDatasource(session)._meta is datasource._meta
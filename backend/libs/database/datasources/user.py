@@ -1,4 +1,8 @@
-from sqlalchemy import update
+from typing import Iterable
+
+from sqlalchemy import String, bindparam, select, any_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import joinedload
 
 from libs.database.models import UserProfile, User, ProfileTypes
 from libs.database import tables as db
@@ -10,31 +14,33 @@ class UserDatasource(Base):
     model = User
     _selectinload = ((db.User.user_profile, db.UserProfile.projects),)  # подтягивать проекты
 
+    async def get_many(self, user_tg_ids: Iterable[str], raw: bool = False) -> list[User]:
+        '''
+        Пользователи с профилями за один SELECT ... WHERE user_tg_id = ANY(...) (профили через JOIN)
+        плюс один запрос на проекты профилей - вместо трех запросов на каждого пользователя
+        '''
+        query = (
+            select(db.User)
+            .where(db.User.user_tg_id == any_(bindparam('user_tg_ids', list(user_tg_ids), type_=ARRAY(String))))
+            .options(joinedload(db.User.user_profile).selectinload(db.UserProfile.projects))
+        )
+        result = await self.session.execute(query)
+        records = result.unique().scalars().all()
+
+        if raw:
+            return list(records)
+        return [self._transform(record) for record in records]
+
     async def save(self,
                    user_tg_id: str,
                    settings: dict
                    ) -> User:
-
-        existing_user = await self.get(user_tg_id=user_tg_id)
-
-        if existing_user:
-            query = (
-                update(self.table)
-                .where(user_tg_id=user_tg_id)
-                .values(settings=settings)
-            )
-            await self.session.execute(query)
-        else:
-            self.session.add(
-                self.table_name(
-                    user_tg_id=user_tg_id,
-                    settings=settings
-                )
-            )
-
+        """ Создает пользователя или обновляет его настройки - один upsert вместо SELECT + INSERT/UPDATE + SELECT """
+        users = await self.bulk_upsert([{'user_tg_id': user_tg_id, 'settings': settings}],
+                                       conflict_cols=('user_tg_id',))
         await self.session.commit()
 
-        return self.model.model_validate(await self.get(user_tg_id=user_tg_id))
+        return users[0]
 
 
 class UserProfileDatasource(Base):
@@ -44,16 +50,10 @@ class UserProfileDatasource(Base):
     async def save(self,
                    user_id: int,
                    profile_type: ProfileTypes) -> UserProfile:
-        existing_profile = await self.get(user_id=user_id, user_type=profile_type)
-
-        if not existing_profile:
-            self.session.add(
-                db.UserProfile(
-                    user_id=user_id,
-                    user_type=profile_type
-                )
-            )
-
+        """ Профиль пользователя нужного типа, создается если его еще нет """
+        profiles = await self.bulk_upsert([{'user_id': user_id, 'user_type': profile_type}],
+                                          conflict_cols=('user_id', 'user_type'),
+                                          update_cols=())
         await self.session.commit()
 
-        return self.model.model_validate(await self.get(user_id=user_id, user_type=profile_type))
+        return profiles[0]
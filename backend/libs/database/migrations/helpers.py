@@ -1,6 +1,6 @@
 from sqlalchemy import table, text
 
-from alembic import op
+from alembic import context, op
 
 
 def name_exists(tbl: table, value: str) -> bool:
@@ -36,3 +36,18 @@ def constraint_exist(name):
         WHERE constraint_name = :name);
     """, )  # nosec
     return op.get_bind().execute(query, {'name': name}).fetchone()[0]
+
+
+def check_no_duplicates(table_name: str, *columns: str, limit: int = 10):
+    # unique index build fails midway on duplicates, abort before any DDL with the rows to resolve
+    if context.is_offline_mode():
+        return  # --sql: nothing to query, the DBA runs the script against checked data
+    cols = ', '.join(columns)
+    not_null = ' AND '.join(f'{column} IS NOT NULL' for column in columns)
+    duplicates = op.get_bind().execute(text(
+        f'SELECT {cols}, count(*) FROM {table_name} WHERE {not_null} '  # nosec
+        f'GROUP BY {cols} HAVING count(*) > 1 LIMIT {limit}'
+    )).fetchall()
+    if duplicates:
+        raise RuntimeError(f'{table_name} has duplicate ({cols}) rows, resolve them before the unique index '
+                           f'is created. First {limit} as ({cols}, count): {[tuple(row) for row in duplicates]}')
@@ -4,6 +4,7 @@ from .payment import Payment  # noqa
 from .subscription import Subscription  # noqa
 from .user import User, UserProfile, ProfileTypes  # noqa
 from .tariff import TariffModel  # noqa
+from .bot_context import BotContext  # noqa
 
 
 def parse_id(id_: str) -> tuple:
@@ -1,5 +1,30 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Any, Callable, Hashable, Sequence
+
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 
 class DatabaseBaseModel(BaseModel):
     model_config = ConfigDict(from_attributes=True)
+
+
+class IndexedModel(DatabaseBaseModel):
+    """
+    Модель со словарями-индексами по вложенным спискам вместо линейного поиска.
+    Индекс строится при первом обращении и пересобирается, если список заменили или изменилась его длина
+    (append/remove), после изменения элементов на месте нужно вызвать reset_indexes()
+    """
+    _indexes: dict[str, tuple[Sequence, int, dict]] = PrivateAttr(default_factory=dict)
+
+    def _index(self, name: str, items: Sequence, key: Callable[[Any], Hashable]) -> dict:
+        # минуя __getattr__ pydantic: обращение к private атрибуту через него дороже самого поиска
+        indexes = self.__pydantic_private__['_indexes']
+        cached = indexes.get(name)
+        if cached is None or cached[0] is not items or cached[1] != len(items):
+            index = {}
+            for item in items:
+                index.setdefault(key(item), item)  # как при линейном поиске - побеждает первый
+            cached = indexes[name] = (items, len(items), index)
+        return cached[2]
+
+    def reset_indexes(self):
+        self.__pydantic_private__['_indexes'].clear()
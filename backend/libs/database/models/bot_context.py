@@ -0,0 +1,12 @@
+from pydantic import Field
+
+from .base import DatabaseBaseModel as BaseModel
+
+
+class BotContext(BaseModel):
+    bot_telegram_id: str = Field(title='Bot Telegram Id')
+    bot_profile_id: int = Field(title='Bot profile inner id')
+    project_id: int = Field(title='Project inner id')
+    owner_id: int = Field(title='Project owner profile id')
+    payment_system_id: int = Field(title='Project payment system id')
+    payment_destination: str = Field(title='Project payment destination')
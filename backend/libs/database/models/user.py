@@ -2,9 +2,9 @@ from datetime import datetime
 from enum import StrEnum
 from typing import Optional
 
-from pydantic import Field
+from pydantic import AliasChoices, Field
 
-from .base import DatabaseBaseModel as BaseModel
+from .base import IndexedModel
 from .project import Project
 from .subscription import Subscription
 
@@ -18,7 +18,7 @@ class ProfileTypes(StrEnum):
     OWNER = 'owner'  # администратор/владелец каналов, подботов
 
 
-class UserProfile(BaseModel):
+class UserProfile(IndexedModel):
     id: int = Field(title='User profile inner Id')
     user_type: str = Field(title='User type')
     inserted_at: datetime = Field(title="Inserted At")
@@ -26,36 +26,33 @@ class UserProfile(BaseModel):
     projects: Optional[list[Project]] = Field(default_factory=list, title='User projects')
     subscriptions: Optional[list[Subscription]] = Field(default_factory=list, title='User subscriptions')
 
-    # TODO need refactor
+    def _projects_by_id(self) -> dict[int, Project]:
+        return self._index('projects', self.projects, lambda project: project.id)
+
+    def _subscriptions_by_project_id(self) -> dict[int, Subscription]:
+        return self._index('subscriptions', self.subscriptions, lambda subscription: subscription.project.id)
+
     def user_is_project_owner(self, project: Project) -> bool:
-        for proj in self.projects:
-            if proj.id == project.id:
-                return True
-        return False
+        return project.id in self._projects_by_id()
 
     def user_project_subscription(self, project_id: int) -> Optional[Subscription]:
-        for subscription in self.subscriptions:
-            if subscription.id == project_id:
-                return subscription
+        return self._subscriptions_by_project_id().get(project_id)
 
     def user_get_project_by_id(self, project_id: int) -> Optional[Project]:
-        for proj in self.projects:
-            if proj.id == project_id:
-                return proj
+        return self._projects_by_id().get(project_id)
 
 
-class User(BaseModel):
+class User(IndexedModel):
     id: int = Field(title='User inner Id')
-    user_telegram_id: str = Field(title='User Telegram Id')
+    user_telegram_id: str = Field(title='User Telegram Id',
+                                  validation_alias=AliasChoices('user_telegram_id', 'user_tg_id'))
     settings: dict | None = Field(None, title='Settings')
     inserted_at: datetime = Field(title='Inserted at')
     updated_at: datetime = Field(title='Updated at')
     user_profile: list[UserProfile] = Field((), title='User Profile')
 
     def get_profile_by_type_name(self, profile_type_name: ProfileTypes = ProfileTypes.SUBSCRIBER):
-        for profile in self.user_profile:
-            if profile.user_type == profile_type_name:
-                return profile
+        return self._index('profiles', self.user_profile, lambda profile: profile.user_type).get(profile_type_name)
 
     def get_all_user_profiles_names(self):
         return [profile.user_type for profile in self.user_profile]
@@ -1,3 +1,5 @@
+from enum import StrEnum
+
 from pydantic import BaseModel, Field, model_validator
 
 
@@ -13,14 +15,37 @@ class BaseDbSettings(BaseModel):
 class PostgresDbSettings(BaseDbSettings):
     DB_URI: str = ''
     URL: str | None = None
+    STATEMENT_CACHE_SIZE: int = Field(100, description='prepared statements kept per connection, 0 disables cache')
+    PGBOUNCER_TRANSACTION_POOLING: bool = Field(False, description='set when connecting through PgBouncer in '
+                                                                   'transaction mode: prepared statements get unique '
+                                                                   'names and are not cached between queries')
+
+    REPLICAS: list[str] = Field(list(), description='DB_URI of read replicas, credentials are the same as primary')
+    REPLICA_URLS: list[str] = list()
+
+    def _url(self, uri: str) -> tuple[str, dict]:
+        from rfc3986 import ParseResult, urlparse
+        parts = {**urlparse(uri)._asdict(), 'userinfo': f'{self.USERNAME}:{self.PASSWORD}'}
+        return ParseResult.from_parts(**parts).geturl(), parts
 
     @model_validator(mode='after')
     def get_url(self):
-        from rfc3986 import ParseResult, urlparse
-        parts = {**urlparse(self.DB_URI)._asdict(), 'userinfo': f'{self.USERNAME}:{self.PASSWORD}'}
-        self.URL = ParseResult.from_parts(**parts).geturl()
+        self.URL, parts = self._url(self.DB_URI)
         self.HOST = self.HOST or parts['host']
         self.PORT = self.PORT or parts['port']
+        self.REPLICA_URLS = [self._url(uri)[0] for uri in self.REPLICAS]
+        return self
+
+
+class PoolMode(StrEnum):
+    QUEUE = 'queue'  # AsyncAdaptedQueuePool inside the process
+    EXTERNAL = 'external'  # connections are pooled by PgBouncer (transaction mode), no server-side prepared statements
+    NONE = 'none'  # new connection for every session
+
+
+class ReplicaSelection(StrEnum):
+    LEAST_LATENCY = 'least_latency'  # replica with the smallest probe latency
+    ROUND_ROBIN = 'round_robin'
 
 
 class SqlAlchemySettings(PostgresDbSettings):
@@ -28,13 +53,39 @@ class SqlAlchemySettings(PostgresDbSettings):
                                                     'collection')
     CONNECT_TIMEOUT: int = Field(2, description='in seconds')
     ECHO: bool = False
-    NO_POOLING: bool = True
+    NO_POOLING: bool = Field(False, description='deprecated, same as POOL_MODE = "none"')
+    POOL_MODE: PoolMode = PoolMode.QUEUE
     POOL_LOG: bool = Field(False, description='set "debug" for full output')
     POOL_MAX_OVERFLOW: int = Field(0, description='if you see warnings about low pool size, try to increase this value '
                                                   'instead of POOL_SIZE. Use "-1" to set unlimited overflow')
     POOL_SIZE: int = Field(20, description="don't use big values, 5 - 30 more usefull")
+    POOL_TIMEOUT: float = Field(5, description='in seconds, how long to wait for a free connection')
+    POOL_RECYCLE: int = Field(1800, description='in seconds, "-1" to keep connections forever')
+    POOL_WARM_UP: bool = Field(True, description='open POOL_SIZE connections on startup')
+    POOL_PRE_PING_IDLE: float = Field(5, description='in seconds, check only connections idle longer than this '
+                                                     'on checkout, 0 - check every checkout')
+    RELEASE_AFTER_STATEMENT: bool = Field(True, description='autocommit sessions return connection to the pool '
+                                                            'after every statement')
+    REPLICA_SELECTION: ReplicaSelection = ReplicaSelection.LEAST_LATENCY
+    REPLICA_MAX_LAG: float = Field(5, description='in seconds, lagging replicas get no reads, 0 disables the check')
+    REPLICA_CHECK_INTERVAL: float = Field(5, description='in seconds, how often replica lag and latency are probed')
+    QUERY_BUDGET_STRICT: bool = Field(False, description='raise when a route makes more queries than its '
+                                                         '`query_budget`, for tests')
+    SLOW_QUERY_THRESHOLD: float = Field(0.5, description='in seconds, slower statements are logged with redacted '
+                                                         'parameters, 0 disables the log')
+    MAX_QUERY_FINGERPRINTS: int = Field(200, description='distinct statements tracked in metrics and /sql/top, '
+                                                         'the rest is labeled "other"')
+    N_PLUS_ONE_THRESHOLD: int = Field(5, description='warn when one statement is repeated this many times '
+                                                     'in a request')
+
+    @model_validator(mode='after')
+    def legacy_no_pooling(self):
+        if self.NO_POOLING:
+            self.POOL_MODE = PoolMode.NONE
+        return self
 
 
 class AsyncPgSettings(PostgresDbSettings):
     TIMEOUT: int = 1
-    CACHE_RESULT: bool = False
+    CACHE_RESULT: bool = Field(True, description='keep prepared statements of the connection, '
+                                                 'see STATEMENT_CACHE_SIZE')
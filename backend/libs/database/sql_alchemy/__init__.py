@@ -2,4 +2,4 @@ from sqlalchemy.orm import Session  # noqa
 
 from .connector import SQLAlchemyConnector  # noqa
 from .session import (db_bound, get_db_session, pass_db_session,  # noqa
-                      pass_transactional_session)
+                      pass_readonly_session, pass_transactional_session)
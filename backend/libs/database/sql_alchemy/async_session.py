@@ -1,4 +1,8 @@
+import time
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
 
 from libs import metrics
 
@@ -16,10 +20,21 @@ class AsyncSessionWithMetrics(AsyncSession):
 
     async def execute(self, *args, **kwargs):
         try:
-            return await super().execute(*args, **kwargs)
+            result = await super().execute(*args, **kwargs)
         except Exception as err:
             self.errors_count.labels(str(err.__class__.__name__)).inc()
             raise
+        if self.info.get('release_after_statement'):
+            await self.release()
+        return result
+
+    async def release(self):
+        """
+        Returns connection to the pool if nothing is left to flush. Rows of the result are already buffered,
+        so autocommit sessions keep a connection only while a statement runs, not while the response is built.
+        """
+        if self.in_transaction() and not (self.new or self.dirty or self.deleted):
+            await self.commit()
 
     def begin(self, **kw):
         self.isolation_level = kw.pop('isolation_level', DEFAULT_ISOLATION_LEVEL)
@@ -29,8 +44,36 @@ class AsyncSessionWithMetrics(AsyncSession):
         return self.begin(isolation_level='AUTOCOMMIT')
 
     async def __aenter__(self):
-        await self.connection(execution_options={'isolation_level': self.isolation_level})
+        # connection is checked out by the first statement, not on entering the session
+        self.bind = self.bind.execution_options(isolation_level=self.isolation_level)
+        self.sync_session.bind = self.bind.sync_engine
         return await super().__aenter__()
 
     def _regenerate_proxy_for_target(self, target):
         raise NotImplementedError()
+
+
+class ConnectionHoldMetrics(metrics.BasePrometheusMixin):
+    metrics_prefix = 'sql_session'
+    service_name = 'sql_session'
+
+    @metrics.metric
+    def connection_hold_seconds(self):
+        return metrics.Histogram('Time a session holds a pool connection, in seconds', labelnames=('route',),
+                                 buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, float('inf')))
+
+
+connection_hold_metrics = ConnectionHoldMetrics()
+
+
+@event.listens_for(Session, 'after_begin')
+def _connection_acquired(session: Session, transaction: SessionTransaction, _connection):
+    if transaction.parent is None:
+        session.info.setdefault('connection_acquired_at', time.perf_counter())
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _connection_released(session: Session, transaction: SessionTransaction):
+    if transaction.parent is None and 'connection_acquired_at' in session.info:
+        hold = time.perf_counter() - session.info.pop('connection_acquired_at')
+        connection_hold_metrics.connection_hold_seconds.labels(session.info.get('route') or '-').observe(hold)
@@ -1,15 +1,85 @@
+import asyncio
 import json
 import time
+from uuid import uuid4
 
 from sqlalchemy import event
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
 from sqlalchemy.future import Engine
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 
-from libs import metrics
+from libs import logging, metrics
 from libs.database.config import sqlalchemy_settings
+from libs.database.setting_models import PoolMode
+
+from .fingerprint import fingerprint, statement_type
+from .query_stats import record_query
+from .telemetry import query_telemetry
 
 METRIC_PREFIX = 'sql_queries'
+POOL_METRIC_PREFIX = 'sql_pool'
+
+log = logging.getLogger('sql_alchemy')
+
+
+class MeteredAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool which reports its state to prometheus.
+    Pool is labeled by `pool_logging_name` engine argument, it survives `recreate()` on engine dispose.
+    """
+    metrics_prefix = POOL_METRIC_PREFIX
+
+    @property
+    def pool_name(self) -> str:
+        return self._orig_logging_name or 'primary'
+
+    @metrics.metric
+    def configured_size(self):
+        return metrics.Gauge('Configured number of persistent connections', labelnames=('pool',))
+
+    @metrics.metric
+    def checked_out(self):
+        return metrics.Gauge('Number of connections checked out from the pool', labelnames=('pool',))
+
+    @metrics.metric
+    def overflow_connections(self):
+        return metrics.Gauge('Number of connections opened above pool size', labelnames=('pool',))
+
+    @metrics.metric
+    def wait_seconds(self):
+        return metrics.Histogram('Time spent waiting for a connection from the pool, in seconds',
+                                 labelnames=('pool',),
+                                 buckets=(.0005, .001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, float('inf')))
+
+    @metrics.metric
+    def timeouts(self):
+        return metrics.Counter('Number of pool checkout timeouts', labelnames=('pool',))
+
+    def _report(self):
+        if not sqlalchemy_settings.COLLECT_METRICS:
+            return
+        self.configured_size.labels(self.pool_name).set(self.size())
+        self.checked_out.labels(self.pool_name).set(self.checkedout())
+        self.overflow_connections.labels(self.pool_name).set(max(self.overflow(), 0))
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if sqlalchemy_settings.COLLECT_METRICS:
+                self.timeouts.labels(self.pool_name).inc()
+            raise
+        finally:
+            if sqlalchemy_settings.COLLECT_METRICS:
+                self.wait_seconds.labels(self.pool_name).observe(time.perf_counter() - start)
+            self._report()
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._report()
 
 
 class SQLAlchemyConnector:
@@ -22,6 +92,23 @@ class SQLAlchemyConnector:
     def engine(self):
         return self._engine
 
+    async def warm_up(self, size: int | None = None):
+        """
+        Opens `size` (POOL_SIZE by default) connections at once and returns them to the pool,
+        so first requests do not pay for connect and auth handshakes.
+        """
+        if not isinstance(self._engine.pool, QueuePool):
+            return
+        size = size or self._engine.pool.size()
+        connections = await asyncio.gather(*[self._engine.connect() for _ in range(size)], return_exceptions=True)
+        errors = [conn for conn in connections if isinstance(conn, BaseException)]
+        await asyncio.gather(*[conn.close() for conn in connections if isinstance(conn, AsyncConnection)])
+        if errors:
+            log.warning('Connection pool warm up failed', extra={'failed': len(errors), 'size': size,
+                                                                 'error': repr(errors[0])})
+        else:
+            log.info('Connection pool warmed up', extra={'size': size})
+
     @metrics.metric
     def total(self):
         return metrics.Counter('Number of complete SQL queries', labelnames=('type',))
@@ -32,17 +119,52 @@ class SQLAlchemyConnector:
 
     @metrics.metric
     def duration_seconds(self):
-        return metrics.Histogram('SQL query duration, in seconds')
+        return metrics.Histogram('SQL query duration, in seconds', labelnames=('type', 'fingerprint'))
+
+    @metrics.metric
+    def errors(self):
+        return metrics.Counter('Number of failed SQL queries', labelnames=('type',))
 
-    def _before_cursor_execute_hook(self, conn, *_):
-        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+    @metrics.metric
+    def prepared_statements(self):
+        return metrics.Counter('Number of prepared statement cache lookups', labelnames=('result',))
+
+    def _before_cursor_execute_hook(self, conn, _cursor, statement, _parameters, context, executemany):
+        # start time is kept by the execution context, so concurrent or failed statements can't shift it
+        if context is None:
+            return
+        context.query_start_time = time.perf_counter()
         if sqlalchemy_settings.COLLECT_METRICS:
             self.in_progress.inc()
+            if not executemany:
+                self._count_prepared_statement(conn, statement)
 
-    def _after_cursor_execute_hook(self, conn, *_):
+    def _count_prepared_statement(self, conn, statement):
+        # asyncpg adapter of sqlalchemy keeps prepared statements in LRU keyed by sql text
+        cache = getattr(conn.connection.dbapi_connection, '_prepared_statement_cache', None)
+        if cache is not None:
+            self.prepared_statements.labels('hit' if statement in cache else 'miss').inc()
+
+    def _after_cursor_execute_hook(self, conn, _cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'query_start_time', None)
+        if start is None:
+            return
+        context.query_start_time = None
+        duration = time.perf_counter() - start
+        record_query(statement, duration)
+        label = query_telemetry.record(fingerprint(statement), statement, duration, parameters, executemany)
+        if sqlalchemy_settings.COLLECT_METRICS:
+            self.in_progress.dec()
+            self.duration_seconds.labels(statement_type(statement), label).observe(duration)
+
+    def _handle_error_hook(self, exception_context):
+        context = exception_context.execution_context
+        if getattr(context, 'query_start_time', None) is None:
+            return  # failed before the cursor execute
+        context.query_start_time = None
         if sqlalchemy_settings.COLLECT_METRICS:
             self.in_progress.dec()
-            self.duration_seconds.observe(time.perf_counter() - conn.info['query_start_time'].pop(-1))
+            self.errors.labels(statement_type(exception_context.statement or '')).inc()
 
     def _after_execute_hook(self, _conn, statement, *_):
         if sqlalchemy_settings.COLLECT_METRICS:
@@ -63,7 +185,7 @@ class SQLAlchemyConnector:
         To make format compatible, we recreade asyncpg-compatible DSN from existing parsed SqlAlchemy connection
         parameters.
         """
-        host = cparams['host']
+        host = cparams.get('host')
         if not isinstance(host, (tuple, list)):
             return
 
@@ -78,22 +200,56 @@ class SQLAlchemyConnector:
         )
         return dialect.connect(*cargs, **custom_params)
 
+    @staticmethod
+    def _checkin_hook(_dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = time.monotonic()
+
+    @staticmethod
+    def _checkout_hook(dbapi_connection, connection_record, _connection_proxy):
+        """
+        Pre-ping for connections which stayed in the pool longer than POOL_PRE_PING_IDLE: with sessions
+        returning connection after every statement a ping on each checkout would double the round trips.
+        """
+        checked_in_at = connection_record.info.get('checked_in_at')
+        if checked_in_at is None or time.monotonic() - checked_in_at < sqlalchemy_settings.POOL_PRE_PING_IDLE:
+            return
+        try:
+            dbapi_connection.ping()
+        except Exception as exc:
+            # pool invalidates the connection and checks out another one
+            raise DisconnectionError() from exc
+
     @classmethod
-    def create(cls, isolation_level: str = 'AUTOCOMMIT'):
-        engine_kwargs = dict(pool_pre_ping=True,
+    def create(cls, isolation_level: str = 'AUTOCOMMIT', name: str = 'primary', url: str | None = None):
+        idle_ping = sqlalchemy_settings.POOL_MODE == PoolMode.QUEUE and sqlalchemy_settings.POOL_PRE_PING_IDLE > 0
+        engine_kwargs = dict(pool_pre_ping=not idle_ping,
                              echo=sqlalchemy_settings.ECHO,
                              isolation_level=isolation_level,
                              pool_reset_on_return=True,
                              echo_pool=sqlalchemy_settings.POOL_LOG,
-                             connect_args={'timeout': sqlalchemy_settings.CONNECT_TIMEOUT},
+                             pool_logging_name=name,
+                             connect_args={'timeout': sqlalchemy_settings.CONNECT_TIMEOUT,
+                                           'prepared_statement_cache_size': sqlalchemy_settings.STATEMENT_CACHE_SIZE},
                              json_serializer=lambda obj: json.dumps(obj, default=str))
-        if sqlalchemy_settings.NO_POOLING:
-            engine_kwargs['poolclass'] = NullPool
-        else:
+        if sqlalchemy_settings.POOL_MODE == PoolMode.QUEUE:
             engine_kwargs.update(dict(
+                poolclass=MeteredAsyncAdaptedQueuePool,
                 pool_size=sqlalchemy_settings.POOL_SIZE,
-                max_overflow=sqlalchemy_settings.POOL_MAX_OVERFLOW))
-        engine = create_async_engine(sqlalchemy_settings.URL, **engine_kwargs)
+                max_overflow=sqlalchemy_settings.POOL_MAX_OVERFLOW,
+                pool_timeout=sqlalchemy_settings.POOL_TIMEOUT,
+                pool_recycle=sqlalchemy_settings.POOL_RECYCLE))
+        else:
+            engine_kwargs['poolclass'] = NullPool
+        if sqlalchemy_settings.POOL_MODE == PoolMode.EXTERNAL or sqlalchemy_settings.PGBOUNCER_TRANSACTION_POOLING:
+            # PgBouncer in transaction mode can route next statement to other server connection,
+            # so prepared statements must not outlive a single query and their names must not clash
+            engine_kwargs['connect_args'].update(statement_cache_size=0,
+                                                 prepared_statement_cache_size=0,
+                                                 prepared_statement_name_func=unique_statement_name)
+        engine = create_async_engine(url or sqlalchemy_settings.URL, **engine_kwargs)
+        if idle_ping:
+            event.listen(engine.sync_engine, 'checkin', cls._checkin_hook)
+            event.listen(engine.sync_engine, 'checkout', cls._checkout_hook)
 
         connector = cls(engine)
         if not getattr(cls, '_hooks_bound', False):  # prevent repetitive listener registration
@@ -101,10 +257,15 @@ class SQLAlchemyConnector:
             event.listen(Engine, 'before_cursor_execute', connector._before_cursor_execute_hook)
             event.listen(Engine, 'after_cursor_execute', connector._after_cursor_execute_hook)
             event.listen(Engine, 'after_execute', connector._after_execute_hook)
+            event.listen(Engine, 'handle_error', connector._handle_error_hook)
             cls._hooks_bound = True
         return connector
 
 
+def unique_statement_name() -> str:
+    return f'__asyncpg_{uuid4()}__'
+
+
 def get_statement_type(statement) -> str:
     if statement.is_delete:
         return 'delete'
@@ -0,0 +1,39 @@
+import re
+from functools import lru_cache
+from hashlib import blake2b
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?\b')
+_PARAMS = re.compile(r'\$\d+(?:::[\w\[\]]+)?|%\([^)]+\)s|(?<![:\w]):\w+')
+_LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_VALUES = re.compile(r'(VALUES\s*\(\?\))(?:\s*,\s*\(\?\))+', re.I)
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def normalize(statement: str) -> str:
+    """
+    SQL text without literals and bind parameters: queries which differ only in values
+    (and in the length of IN (...) / VALUES lists) become the same string
+    """
+    sql = _COMMENTS.sub(' ', statement)
+    sql = _STRINGS.sub('?', sql)
+    sql = _PARAMS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _SPACES.sub(' ', sql).strip()
+    sql = _LISTS.sub('(?)', sql)
+    sql = _VALUES.sub(r'\1', sql)
+    return sql
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """ Short stable id of a normalized statement, fits metric labels and log fields """
+    return blake2b(normalize(statement).encode(), digest_size=8).hexdigest()
+
+
+def statement_type(statement: str) -> str:
+    """ select/insert/update/delete by the first keyword of SQL text, "other" for DDL and the rest """
+    verb = normalize(statement).split(' ', 1)[0].lower()
+    return verb if verb in ('select', 'insert', 'update', 'delete') else 'other'
@@ -0,0 +1,142 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+from libs import logging, metrics
+from libs.database.config import sqlalchemy_settings
+
+from .fingerprint import fingerprint, normalize
+
+log = logging.getLogger('sql_alchemy')
+
+_query_stats: ContextVar[Optional['QueryStats']] = ContextVar('sql_query_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """ Route made more SQL queries than declared with `query_budget` (raised in strict mode only) """
+
+    def __init__(self, route: str, budget: int, stats: 'QueryStats'):
+        self.route = route
+        self.budget = budget
+        self.stats = stats
+        super().__init__(f'{route} made {stats.count} SQL queries, budget is {budget}; '
+                         f'repeated: {stats.repeated(2)}')
+
+
+@dataclass
+class QueryStats:
+    """ SQL statements made while handling one request """
+    request_id: str = ''
+    count: int = 0
+    duration: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+    statements: dict[str, str] = field(default_factory=dict)  # fingerprint -> first statement text
+
+    def add(self, statement: str, duration: float):
+        key = fingerprint(statement)
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[key] += 1
+        self.statements.setdefault(key, statement)
+
+    @property
+    def duplicates(self) -> int:
+        """ Statements repeated with the same fingerprint, N+1 loads show up here """
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(key, count) for key, count in self.fingerprints.most_common() if count >= threshold]
+
+
+class RouteQueriesMetrics(metrics.BasePrometheusMixin):
+    metrics_prefix = 'sql_route'
+    service_name = 'sql_route'
+
+    @metrics.metric
+    def queries(self):
+        return metrics.Histogram('SQL queries made by one request', labelnames=('route',),
+                                 buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, float('inf')))
+
+    @metrics.metric
+    def duration_seconds(self):
+        return metrics.Histogram('Total SQL time of one request, in seconds', labelnames=('route',),
+                                 buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, float('inf')))
+
+    @metrics.metric
+    def duplicates(self):
+        return metrics.Histogram('Repeated SQL statements (same fingerprint) of one request', labelnames=('route',),
+                                 buckets=(0, 1, 2, 5, 10, 25, 50, float('inf')))
+
+    def observe(self, route: str, stats: QueryStats):
+        self.queries.labels(route).observe(stats.count)
+        self.duration_seconds.labels(route).observe(stats.duration)
+        self.duplicates.labels(route).observe(stats.duplicates)
+
+
+route_queries_metrics = RouteQueriesMetrics()
+
+
+def route_template(scope: dict) -> str:
+    """ Path template of the matched route (with mount prefix), "unhandled" before routing or for 404 """
+    route = scope.get('route')
+    return scope.get('root_path', '') + route.path if route else 'unhandled'
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+def record_query(statement: str, duration: float):
+    """ Called by the connector after every cursor execute """
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.add(statement, duration)
+
+
+@contextmanager
+def collect_query_stats(request_id: str = '') -> Iterator[QueryStats]:
+    """
+    Counts SQL statements made inside the block, also in tasks started there.
+    Used by ApiLoggingMiddleware for every request, in tests:
+
+        with collect_query_stats() as stats:
+            await UserDatasource(session).get(...)
+        assert stats.count == 2
+    """
+    stats = QueryStats(request_id=request_id)
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def query_budget(max_queries: int) -> Callable:
+    """ Declares how many SQL queries the endpoint may make, checked by `check_query_budget` """
+
+    def decorator(func):
+        func.query_budget = max_queries
+        return func
+
+    return decorator
+
+
+def check_query_budget(route: str, endpoint: Optional[Callable], stats: QueryStats, strict: bool | None = None):
+    """ Warns about repeated statements and exceeded budget, raises QueryBudgetExceeded in strict mode """
+    strict = sqlalchemy_settings.QUERY_BUDGET_STRICT if strict is None else strict
+    repeated = stats.repeated(sqlalchemy_settings.N_PLUS_ONE_THRESHOLD)
+    if repeated:
+        key, count = repeated[0]
+        log.warning('Repeated SQL statement, possible N+1',
+                    extra={'route': route, 'request_id': stats.request_id, 'fingerprint': key,
+                           'repeats': count, 'statement': normalize(stats.statements[key])[:500]})
+
+    budget = getattr(endpoint, 'query_budget', None)
+    if budget is None or stats.count <= budget:
+        return
+    if strict:
+        raise QueryBudgetExceeded(route, budget, stats)
+    log.warning('SQL query budget exceeded',
+                extra={'route': route, 'request_id': stats.request_id, 'queries': stats.count, 'budget': budget})
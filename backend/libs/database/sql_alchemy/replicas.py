@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from libs import logging, metrics
+from libs.database.config import sqlalchemy_settings
+from libs.database.setting_models import ReplicaSelection
+
+from .connector import SQLAlchemyConnector
+
+log = logging.getLogger('sql_alchemy')
+
+# 0 when the replica has replayed everything it received: no writes on primary is not a lag
+LAG_QUERY = text("""
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END
+""")
+
+LATENCY_SMOOTHING = 0.3
+
+
+@dataclass
+class Replica:
+    name: str
+    connector: SQLAlchemyConnector
+    latency: Optional[float] = None  # smoothed probe round trip, seconds
+    lag: Optional[float] = None  # replay lag, seconds
+    healthy: bool = False  # unknown until the first probe, reads go to primary meanwhile
+
+    @property
+    def engine(self):
+        return self.connector.engine
+
+    def available(self, max_lag: float) -> bool:
+        return self.healthy and (not max_lag or (self.lag or 0) <= max_lag)
+
+
+class ReplicaRouter(metrics.BasePrometheusMixin):
+    """
+    Chooses a read replica for a read-only session. Replicas are probed in background every
+    `check_interval` seconds (latency and replay lag), unreachable or lagging more than `max_lag`
+    ones are skipped; with no replica available reads stay on primary.
+    """
+    metrics_prefix = 'sql_replica'
+    service_name = 'sql_replica'
+
+    def __init__(self,
+                 replicas: list[Replica],
+                 selection: ReplicaSelection = sqlalchemy_settings.REPLICA_SELECTION,
+                 max_lag: float = sqlalchemy_settings.REPLICA_MAX_LAG,
+                 check_interval: float = sqlalchemy_settings.REPLICA_CHECK_INTERVAL):
+        self.replicas = replicas
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._counter = itertools.count()
+        self._checked_at = float('-inf')
+        self._task: Optional[asyncio.Task] = None
+
+    @metrics.metric
+    def lag_seconds(self):
+        return metrics.Gauge('Replica replay lag, in seconds', labelnames=('replica',))
+
+    @metrics.metric
+    def latency_seconds(self):
+        return metrics.Gauge('Smoothed replica probe latency, in seconds', labelnames=('replica',))
+
+    @metrics.metric
+    def available_replica(self):
+        return metrics.Gauge('Replica gets reads: 1 - yes, 0 - unreachable or lagging', labelnames=('replica',))
+
+    @metrics.metric
+    def sessions(self):
+        return metrics.Counter('Read-only sessions by target: replica name or "primary"', labelnames=('target',))
+
+    @classmethod
+    def from_settings(cls) -> Optional['ReplicaRouter']:
+        if not sqlalchemy_settings.REPLICA_URLS:
+            return None
+        # engine name labels pool metrics of the replica
+        return cls([Replica(f'replica_{i}', SQLAlchemyConnector.create(isolation_level='AUTOCOMMIT',
+                                                                       name=f'replica_{i}', url=url))
+                    for i, url in enumerate(sqlalchemy_settings.REPLICA_URLS)])
+
+    def choose(self) -> Optional[Replica]:
+        self._schedule_check()
+        candidates = [replica for replica in self.replicas if replica.available(self.max_lag)]
+        if not candidates:
+            self.sessions.labels('primary').inc()
+            return None
+        if self.selection == ReplicaSelection.ROUND_ROBIN:
+            replica = candidates[next(self._counter) % len(candidates)]
+        else:
+            replica = min(candidates, key=lambda item: item.latency)
+        self.sessions.labels(replica.name).inc()
+        return replica
+
+    def _schedule_check(self):
+        if self._task is not None and not self._task.done():
+            return
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        self._checked_at = time.monotonic()
+        # empty context: probes are not a part of the request which happened to start them
+        self._task = asyncio.get_running_loop().create_task(self.check(), context=contextvars.Context())
+
+    async def check(self):
+        await asyncio.gather(*[self._probe(replica) for replica in self.replicas])
+
+    async def _probe(self, replica: Replica):
+        start = time.perf_counter()
+        try:
+            async with replica.engine.connect() as conn:
+                lag = (await conn.execute(LAG_QUERY)).scalar()
+        except Exception as exc:
+            if replica.healthy:
+                log.warning('Read replica is unreachable, reads go to other replicas or primary',
+                            extra={'replica': replica.name, 'error': repr(exc)})
+            replica.healthy = False
+            self.available_replica.labels(replica.name).set(0)
+            return
+
+        latency = time.perf_counter() - start
+        replica.latency = latency if replica.latency is None else \
+            LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * replica.latency
+        replica.lag = float(lag or 0)
+        replica.healthy = True
+        self.lag_seconds.labels(replica.name).set(replica.lag)
+        self.latency_seconds.labels(replica.name).set(replica.latency)
+        self.available_replica.labels(replica.name).set(int(replica.available(self.max_lag)))
+
+    async def warm_up(self, pools: bool = True):
+        """ First probe before serving requests, so reads use replicas from the start """
+        if pools:
+            await asyncio.gather(*[replica.connector.warm_up() for replica in self.replicas])
+        await self.check()
+        self._checked_at = time.monotonic()
+
+    async def dispose(self):
+        if self._task is not None:
+            self._task.cancel()
+        await asyncio.gather(*[replica.engine.dispose() for replica in self.replicas])
+
+
+def is_read(clause) -> bool:
+    """ SELECT which does not wrap INSERT/UPDATE ... RETURNING (select().from_statement(dml)) """
+    if not getattr(clause, 'is_select', False):
+        return False
+    return not getattr(getattr(clause, 'element', None), 'is_dml', False)
+
+
+class RoutingSession(Session):
+    """
+    Session of DBReadonlySession: SELECT statements go to the replica chosen when the session was opened,
+    writes and every statement after the first write go to primary (read your own writes).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get('replica')
+        if replica is not None and not self.info.get('wrote'):
+            if not self._flushing and is_read(clause):
+                return replica.engine.sync_engine
+            if clause is not None or self._flushing:
+                self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
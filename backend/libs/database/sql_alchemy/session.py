@@ -4,12 +4,16 @@ from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
+from starlette.requests import Request
 
 from libs import logging
+from libs.database.config import sqlalchemy_settings
 
 from .async_session import AsyncSessionWithMetrics
 from .connector import SQLAlchemyConnector
 from .exceptions import MissingSessionError, SessionNotInitialisedError
+from .query_stats import route_template
+from .replicas import ReplicaRouter, RoutingSession
 
 log = logging.getLogger('sql_alchemy')
 
@@ -23,10 +27,14 @@ class DBSessionBase:
     _connector = None
     _sessionmaker: sessionmaker = None
     _session_ctx: SessContextVar = None
+    sync_session_class: type[Session] = Session
+    release_after_statement = False
+    expire_on_commit = True
 
-    def __init__(self):
+    def __init__(self, info: Optional[dict] = None):
         self._session = None
         self._session_token = None
+        self._info = {'release_after_statement': self.release_after_statement, **(info or {})}
 
     @property
     def engine(self):
@@ -43,7 +51,7 @@ class DBSessionBase:
     def _new_session(self) -> Session:
         if not isinstance(self._sessionmaker, sessionmaker):
             raise SessionNotInitialisedError
-        return self._sessionmaker()
+        return self._sessionmaker(info=self._info)
 
     async def __aenter__(self):
         self._session = self._new_session()
@@ -59,18 +67,28 @@ class DBSessionMeta(type):
     _connector: SQLAlchemyConnector = None
     _sessionmaker: sessionmaker = None
 
-    def __call__(cls, *args, **kwargs):
+    @property
+    def connector(cls) -> SQLAlchemyConnector:
         cls._connector = cls._connector or SQLAlchemyConnector.create(isolation_level=cls.isolation_level)
+        return cls._connector
+
+    def __call__(cls, *args, **kwargs):
         cls._sessionmaker = cls._sessionmaker or sessionmaker(autoflush=False,
+                                                              expire_on_commit=cls.expire_on_commit,
                                                               future=True,
-                                                              bind=cls._connector.engine,
-                                                              class_=AsyncSessionWithMetrics)
+                                                              bind=cls.connector.engine,
+                                                              class_=AsyncSessionWithMetrics,
+                                                              sync_session_class=cls.sync_session_class)
         return super().__call__(*args, **kwargs)
 
 
 class DBAutocommitSession(DBSessionBase, metaclass=DBSessionMeta):
     isolation_level = 'AUTOCOMMIT'
     _session_ctx = _ac_session_ctx
+    # вне транзакции держать соединение между запросами незачем
+    release_after_statement = sqlalchemy_settings.RELEASE_AFTER_STATEMENT
+    # release() делает commit после каждого запроса: объекты не должны протухать и ходить в базу заново
+    expire_on_commit = False
 
 
 class DBTransactionalSession(DBSessionBase, metaclass=DBSessionMeta):
@@ -78,13 +96,59 @@ class DBTransactionalSession(DBSessionBase, metaclass=DBSessionMeta):
     _session_ctx = _trans_session_ctx
 
 
-async def pass_db_session() -> AsyncSession:
-    async with DBAutocommitSession() as sess:
+class DBReadonlySessionMeta(DBSessionMeta):
+    _router: Optional[ReplicaRouter] = None
+    _router_ready = False
+
+    @property
+    def connector(cls) -> SQLAlchemyConnector:
+        # без реплик и при их недоступности работаем через пул primary
+        return DBAutocommitSession.connector
+
+    @property
+    def router(cls) -> Optional[ReplicaRouter]:
+        if not cls._router_ready:
+            cls._router = ReplicaRouter.from_settings()
+            cls._router_ready = True
+        return cls._router
+
+
+class DBReadonlySession(DBAutocommitSession, metaclass=DBReadonlySessionMeta):
+    """
+    Сессия для чтения: SELECT уходят на реплику (выбор - DATABASE.REPLICA_SELECTION),
+    запись и все запросы после нее - на primary
+    """
+    _sessionmaker: sessionmaker = None  # own one, with RoutingSession
+    sync_session_class = RoutingSession
+
+    def _new_session(self) -> Session:
+        if not isinstance(self._sessionmaker, sessionmaker):
+            raise SessionNotInitialisedError
+        router = type(self).router
+        replica = router.choose() if router else None
+        return self._sessionmaker(info={**self._info, 'replica': replica})
+
+
+def _request_info(request: Optional[Request]) -> dict:
+    return {'route': route_template(request.scope)} if request is not None else {}
+
+
+async def pass_db_session(request: Request = None) -> AsyncSession:
+    async with DBAutocommitSession(info=_request_info(request)) as sess:
+        yield sess
+
+
+async def pass_readonly_session(request: Request = None) -> AsyncSession:
+    """
+    Чтение с реплик только по явному выбору ручки. Не для ручек, чьи чтения заполняют общие кеши
+    (identity, тарифы, снимок бота): отстающая реплика вернет данные до записи, и кеш будет отдавать их до TTL
+    """
+    async with DBReadonlySession(info=_request_info(request)) as sess:
         yield sess
 
 
-async def pass_transactional_session() -> AsyncSession:
-    async with DBTransactionalSession() as sess:
+async def pass_transactional_session(request: Request = None) -> AsyncSession:
+    async with DBTransactionalSession(info=_request_info(request)) as sess:
         yield sess
 
 
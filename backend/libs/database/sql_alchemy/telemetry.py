@@ -0,0 +1,101 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from libs import logging
+from libs.database.config import sqlalchemy_settings
+
+from .fingerprint import normalize, statement_type
+
+log = logging.getLogger('sql_alchemy')
+
+OTHER = 'other'
+
+
+@dataclass
+class FingerprintStats:
+    fingerprint: str
+    type: str
+    statement: str  # normalized, no literals
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {'fingerprint': self.fingerprint,
+                'type': self.type,
+                'statement': self.statement,
+                'count': self.count,
+                'total_ms': round(self.total * 1000, 2),
+                'mean_ms': round(self.total / self.count * 1000, 2),
+                'max_ms': round(self.max * 1000, 2)}
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> Any:
+    """ Bind parameters without values: only names and types get into logs """
+    if executemany and isinstance(parameters, (list, tuple)):
+        return {'rows': len(parameters), 'first': redact_parameters(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class QueryTelemetry:
+    """
+    Aggregates statement timings by fingerprint since startup.
+    Only `max_fingerprints` distinct fingerprints are kept, the rest is counted as "other",
+    so metric label cardinality and memory stay bounded.
+    """
+
+    def __init__(self,
+                 max_fingerprints: int = sqlalchemy_settings.MAX_QUERY_FINGERPRINTS,
+                 slow_threshold: float = sqlalchemy_settings.SLOW_QUERY_THRESHOLD):
+        self.max_fingerprints = max_fingerprints
+        self.slow_threshold = slow_threshold
+        self._stats: dict[str, FingerprintStats] = {}
+        self._lock = threading.Lock()  # sync engine events may come from worker threads
+
+    def label(self, fingerprint: str) -> str:
+        return fingerprint if fingerprint in self._stats else OTHER
+
+    def record(self, fingerprint: str, statement: str, duration: float,
+               parameters: Any = None, executemany: bool = False) -> str:
+        """ Adds a statement timing, returns fingerprint label for metrics """
+        stats = self._stats.get(fingerprint)
+        if stats is None:
+            with self._lock:
+                if fingerprint not in self._stats and len(self._stats) < self.max_fingerprints:
+                    self._stats[fingerprint] = FingerprintStats(fingerprint, statement_type(statement),
+                                                                normalize(statement))
+                stats = self._stats.get(fingerprint)
+        if stats is not None:
+            stats.count += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+
+        if self.slow_threshold and duration >= self.slow_threshold:
+            log.warning('Slow SQL query',
+                        extra={'fingerprint': fingerprint,
+                               'duration_ms': round(duration * 1000, 2),
+                               'statement': normalize(statement)[:2000],
+                               'parameters': redact_parameters(parameters, executemany)})
+        return fingerprint if stats is not None else OTHER
+
+    def top(self, limit: int = 20, order_by: str = 'total') -> list[dict]:
+        key = {'total': lambda item: item.total,
+               'max': lambda item: item.max,
+               'mean': lambda item: item.total / item.count,
+               'count': lambda item: item.count}[order_by]
+        items = sorted((item for item in list(self._stats.values()) if item.count), key=key, reverse=True)
+        return [item.as_dict() for item in items[:limit]]
+
+    def reset(self, slow_threshold: Optional[float] = None):
+        with self._lock:
+            self._stats.clear()
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+
+
+query_telemetry = QueryTelemetry()
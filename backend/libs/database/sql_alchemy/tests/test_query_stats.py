@@ -0,0 +1,39 @@
+import pytest
+
+from ..fingerprint import fingerprint, normalize
+from ..query_stats import (QueryBudgetExceeded, check_query_budget,
+                           collect_query_stats, get_query_stats, query_budget,
+                           record_query)
+
+
+def test_normalize():
+    assert normalize("SELECT * FROM users  WHERE tg_id = '42' AND id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)") \
+        == 'SELECT * FROM users WHERE tg_id = ? AND id IN (?)'
+    assert normalize('INSERT INTO a (x) VALUES ($1), ($2)') == 'INSERT INTO a (x) VALUES (?)'
+    assert fingerprint('SELECT 1 FROM t WHERE id = 5') == fingerprint('SELECT 1 FROM t WHERE id = 7')
+
+
+def test_collect_query_stats():
+    with collect_query_stats() as stats:
+        for project_id in range(3):
+            record_query(f'SELECT * FROM tariffs WHERE project_id = {project_id}', 0.002)
+        record_query('SELECT * FROM projects', 0.001)
+    record_query('SELECT 1', 0.001)  # outside of the block
+
+    assert get_query_stats() is None
+    assert (stats.count, stats.duplicates) == (4, 2)
+    assert stats.duration == pytest.approx(0.007)
+
+
+def test_query_budget():
+    @query_budget(2)
+    async def endpoint():
+        pass
+
+    with collect_query_stats() as stats:
+        for _ in range(3):
+            record_query('SELECT 1', 0.001)
+
+    check_query_budget('/route', endpoint, stats, strict=False)
+    with pytest.raises(QueryBudgetExceeded):
+        check_query_budget('/route', endpoint, stats, strict=True)
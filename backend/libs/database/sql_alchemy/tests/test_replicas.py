@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, Integer, create_engine, insert, select
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from libs.database.setting_models import ReplicaSelection
+
+from ..replicas import Replica, ReplicaRouter, RoutingSession
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = 'item'
+
+    id = Column(Integer, primary_key=True)
+
+
+def replica(name, latency, lag=0.0, healthy=True):
+    return Replica(name, connector=None, latency=latency, lag=lag, healthy=healthy)
+
+
+@pytest.fixture
+def router():
+    router = ReplicaRouter([replica('slow', 0.02), replica('fast', 0.01), replica('lagging', 0.001, lag=30)],
+                           selection=ReplicaSelection.LEAST_LATENCY, max_lag=5, check_interval=5)
+    router._schedule_check = lambda: None
+    return router
+
+
+def test_least_latency(router):
+    assert router.choose().name == 'fast'
+
+
+def test_round_robin_skips_lagging(router):
+    router.selection = ReplicaSelection.ROUND_ROBIN
+    assert [router.choose().name for _ in range(3)] == ['slow', 'fast', 'slow']
+
+
+def test_primary_without_available_replicas(router):
+    for item in router.replicas:
+        item.healthy = False
+    assert router.choose() is None
+
+
+def test_reads_after_write_go_to_primary():
+    primary, replica_engine = create_engine('sqlite://'), create_engine('sqlite://')
+    for engine in (primary, replica_engine):
+        Base.metadata.create_all(engine)
+    session = sessionmaker(bind=primary, class_=RoutingSession)(
+        info={'replica': SimpleNamespace(engine=SimpleNamespace(sync_engine=replica_engine))})
+
+    assert session.get_bind(clause=select(Item)) is replica_engine
+    session.execute(insert(Item).values(id=1))
+    assert session.get_bind(clause=select(Item)) is primary
+    assert session.execute(select(Item.id)).scalar() == 1
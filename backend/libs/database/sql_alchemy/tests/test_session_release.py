@@ -0,0 +1,137 @@
+import time
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import Column, Integer, text
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.orm import declarative_base
+
+from .. import async_session
+from ..connector import SQLAlchemyConnector
+from ..session import DBAutocommitSession, DBTransactionalSession
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'session_release_row'
+
+    id = Column(Integer, primary_key=True)
+
+
+class _Histogram:
+    def __init__(self):
+        self.observed = []
+        self._route = None
+
+    @property
+    def connection_hold_seconds(self):
+        return self
+
+    def labels(self, route):
+        self._route = route
+        return self
+
+    def observe(self, value):
+        self.observed.append((self._route, value))
+
+
+class _Transaction:
+    def __init__(self, parent=None):
+        self.parent = parent
+
+
+class _Session:
+    def __init__(self, route: str):
+        self.info = {'route': route}
+
+
+def test_connection_hold_is_observed_per_route(monkeypatch):
+    # handlers are called directly: engines of the test process carry global connector listeners
+    histogram = _Histogram()
+    monkeypatch.setattr(async_session, 'connection_hold_metrics', histogram)
+    session, root = _Session('/v1/owner/projects'), _Transaction()
+
+    for _ in range(2):
+        async_session._connection_acquired(session, root, None)
+        async_session._connection_acquired(session, _Transaction(parent=root), None)  # savepoint
+        assert 'connection_acquired_at' in session.info
+        async_session._connection_released(session, _Transaction(parent=root))
+        assert 'connection_acquired_at' in session.info
+        async_session._connection_released(session, root)
+
+    assert [route for route, _ in histogram.observed] == ['/v1/owner/projects'] * 2
+    assert 'connection_acquired_at' not in session.info
+
+
+class _Connection:
+    def __init__(self, alive: bool = True):
+        self.alive = alive
+        self.pings = 0
+
+    def ping(self):
+        self.pings += 1
+        if not self.alive:
+            raise ConnectionError
+
+
+class _Record:
+    def __init__(self, checked_in_at=None):
+        self.info = {} if checked_in_at is None else {'checked_in_at': checked_in_at}
+
+
+def test_only_idle_connections_are_pinged():
+    fresh, recent, idle = _Connection(), _Connection(), _Connection()
+    SQLAlchemyConnector._checkout_hook(fresh, _Record(), None)
+    SQLAlchemyConnector._checkout_hook(recent, _Record(time.monotonic()), None)
+    SQLAlchemyConnector._checkout_hook(idle, _Record(time.monotonic() - 3600), None)
+    assert (fresh.pings, recent.pings, idle.pings) == (0, 0, 1)
+
+    with pytest.raises(DisconnectionError):
+        SQLAlchemyConnector._checkout_hook(_Connection(alive=False), _Record(time.monotonic() - 3600), None)
+
+
+@pytest_asyncio.fixture
+async def postgres():
+    try:
+        async with DBAutocommitSession().engine.connect():
+            pass
+    except OSError:
+        pytest.skip('PostgreSQL is not available')
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('postgres')
+async def test_autocommit_session_holds_connection_only_while_statement_runs():
+    pool = DBAutocommitSession().engine.pool
+    idle = pool.checkedout()
+    async with DBAutocommitSession(info={'release_after_statement': True}) as session:
+        assert pool.checkedout() == idle  # entering the session checks nothing out
+        assert (await session.execute(text('SELECT 1'))).scalar() == 1
+        assert pool.checkedout() == idle
+
+        session.add(Row(id=1))  # pending object would be lost by the commit of release()
+        await session.execute(text('SELECT 1'))
+        assert pool.checkedout() == idle + 1
+        session.expunge_all()
+        await session.release()
+        assert pool.checkedout() == idle
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('postgres')
+async def test_transactional_session_keeps_connection_until_commit():
+    pool = DBTransactionalSession().engine.pool
+    idle = pool.checkedout()
+    async with DBTransactionalSession() as session:
+        assert pool.checkedout() == idle
+        await session.execute(text('SELECT 1'))
+        await session.execute(text('SELECT 1'))
+        assert pool.checkedout() == idle + 1
+        await session.commit()
+        assert pool.checkedout() == idle
+
+
+def test_only_autocommit_sessions_keep_objects_after_commit():
+    assert DBAutocommitSession.expire_on_commit is False
+    assert DBTransactionalSession.expire_on_commit is True
@@ -0,0 +1,26 @@
+from ..fingerprint import fingerprint, statement_type
+from ..telemetry import OTHER, QueryTelemetry, redact_parameters
+
+
+def test_fingerprints_are_bounded():
+    telemetry = QueryTelemetry(max_fingerprints=1, slow_threshold=0)
+    first, second = 'SELECT * FROM users WHERE id = $1', 'SELECT * FROM projects WHERE id = $1'
+
+    assert telemetry.record(fingerprint(first), first, 0.01) == fingerprint(first)
+    assert telemetry.record(fingerprint(second), second, 0.5) == OTHER
+    telemetry.record(fingerprint(first), first, 0.03)
+
+    assert telemetry.top() == [{'fingerprint': fingerprint(first), 'type': 'select',
+                                'statement': 'SELECT * FROM users WHERE id = ?',
+                                'count': 2, 'total_ms': 40.0, 'mean_ms': 20.0, 'max_ms': 30.0}]
+
+
+def test_redact_parameters():
+    assert redact_parameters(('secret', 42)) == ['str', 'int']
+    assert redact_parameters({'token': 'secret'}) == {'token': 'str'}
+    assert redact_parameters([('a', 1), ('b', 2)], executemany=True) == {'rows': 2, 'first': ['str', 'int']}
+
+
+def test_statement_type():
+    assert statement_type('  update users set name = $1') == 'update'
+    assert statement_type('CREATE TABLE a (id int)') == 'other'
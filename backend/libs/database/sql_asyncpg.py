@@ -1,31 +1,71 @@
 import asyncpg
 from sqlalchemy import Visitable
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
 
-from libs import logging
+from libs import logging, metrics
 
 log = logging.getLogger('sql_asyncpg')
 
+_dialect = asyncpg_dialect()
+
 
 class AdapterConnection(asyncpg.Connection):
     """ Предназначен для преобразования запросов Alchemy в RAW sql запросы
 
+    Запросы компилируются с параметрами ($1, $2, ...), а не с подставленными значениями,
+    поэтому одинаковые по форме запросы переиспользуют подготовленный на сервере statement.
+
     TODO на данный момент частично сработало, т.к. в datasources идет дальнейшая обработка результата как alchemy
     TODO т.е. требуется во всех datasource поправить обработку результата полученного из connection
     """
+    metrics_prefix = 'asyncpg_statements'
+
+    @metrics.metric
+    def cache_total(self):
+        return metrics.Counter('Number of prepared statement cache lookups', labelnames=('result',))
+
+    @staticmethod
+    def _compile(query, args: tuple) -> tuple[str, tuple]:
+        if not isinstance(query, Visitable):
+            return query, args
+        state = query.compile(dialect=_dialect).construct_expanded_state()
+        params = tuple(state.processors[name](value) if name in state.processors else value
+                       for name, value in zip(state.positiontup or (), state.positional_parameters))
+        return state.statement, params + args
 
     async def execute(self, query, *args, **kwargs):
-        if isinstance(type(query), Visitable):
-            query_ = query.compile(compile_kwargs={"literal_binds": True}).__str__()
-            return await super().execute(query_, *args, **kwargs)
+        query, args = self._compile(query, args)
         return await super().execute(query, *args, **kwargs)
 
+    async def fetch(self, query, *args, **kwargs):
+        query, args = self._compile(query, args)
+        return await super().fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        query, args = self._compile(query, args)
+        return await super().fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        query, args = self._compile(query, args)
+        return await super().fetchval(query, *args, **kwargs)
+
+    async def _get_statement(self, query, timeout, *, use_cache=True, **kwargs):
+        if use_cache and self._stmt_cache_enabled:
+            key = (query, kwargs.get('record_class') or self._protocol.get_record_class(),
+                   kwargs.get('ignore_custom_codec', False))
+            self.cache_total.labels('miss' if self._stmt_cache.get(key, promote=False) is None else 'hit').inc()
+        return await super()._get_statement(query, timeout, use_cache=use_cache, **kwargs)
+
 
 class AsyncPgConnection:
 
-    def __init__(self, url: str, timeout: int = 1, cache_result: bool = False):
-        self.dsn = url
+    def __init__(self, url: str, timeout: int = 1, cache_result: bool = False, statement_cache_size: int = 100,
+                 pgbouncer_transaction_pooling: bool = False):
+        # asyncpg не понимает схему sqlalchemy вида postgresql+asyncpg://
+        self.dsn = url.replace('+asyncpg://', '://', 1)
         self.timeout = timeout
-        self.cache_result = cache_result
+        self.cache_result = cache_result and not pgbouncer_transaction_pooling
+        self.statement_cache_size = statement_cache_size
         self.connection = None
         self.connection_class = AdapterConnection
 
@@ -35,14 +75,11 @@ class AsyncPgConnection:
     async def _create_connection(self):
         db_settings = {
             'dsn': self.dsn,
-            'timeout': self.timeout
+            'timeout': self.timeout,
+            'statement_cache_size': self.statement_cache_size if self.cache_result else 0,
         }
-        if self.cache_result:
-            self.connection = await asyncpg.connect(**db_settings,
-                                                    connection_class=self.connection_class)
         self.connection = await asyncpg.connect(**db_settings,
-                                                connection_class=self.connection_class,
-                                                statement_cache_size=0)
+                                                connection_class=self.connection_class)
         return self.connection
 
     async def _close_connection(self):
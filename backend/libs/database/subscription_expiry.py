@@ -0,0 +1,186 @@
+import asyncio
+import contextvars
+import json
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import func, select, tuple_, update
+
+from libs import logging, metrics
+from libs.cache.client import BaseCommonCache
+from libs.cache.exceptions import RedisStorageConnectionError
+from libs.config import settings
+from libs.database import tables as db
+from libs.database.sql_alchemy.session import DBTransactionalSession
+from libs.utils.time import timedelta_from_duration
+
+log = logging.getLogger('subscription_expiry')
+
+expiry_settings = settings.get('SUBSCRIPTION_EXPIRY', {})
+
+# core таблица: sweeper не зависит от настройки ORM мапперов
+subscription = db.Subscription.__table__
+
+
+@dataclass(frozen=True, slots=True)
+class SubscriptionExpired:
+    subscription_id: UUID
+    user_profile_id: int
+    project_id: int
+    end_at: datetime
+
+    def as_dict(self) -> dict:
+        return {key: str(value) for key, value in asdict(self).items()}
+
+
+ExpiryHandler = Callable[[list[SubscriptionExpired]], Awaitable[None]]
+
+
+class RedisStreamPublisher:
+    """
+    Пишет события истечения в Redis stream, читатель (бот) удаляет пользователей из каналов.
+    Без Redis падает: пачка откатывается и не помечается истекшей, следующий проход повторит ее
+    """
+
+    def __init__(self, stream: str = expiry_settings.get('STREAM', 'subscription:expired'),
+                 maxlen: int = expiry_settings.get('STREAM_MAXLEN', 100_000)):
+        self.stream = stream
+        self.maxlen = maxlen
+
+    async def __call__(self, events: list[SubscriptionExpired]):
+        client = BaseCommonCache.client
+        if not client:
+            raise RedisStorageConnectionError('Redis is not initialised, expiry events are not published')
+        async with client.pipeline(transaction=False) as pipe:
+            for event in events:
+                pipe.xadd(self.stream, {'event': json.dumps(event.as_dict())}, maxlen=self.maxlen, approximate=True)
+            await pipe.execute()
+
+
+def batch_query(since: datetime, until: datetime, after: Optional[tuple[datetime, UUID]], limit: int):
+    """
+    Следующая пачка по частичному индексу ix_subscription_pending_end_at (end_at, id) WHERE expired_at IS NULL.
+    Keyset (end_at, id) > after продолжает с места прошлой пачки, а не с начала индекса,
+    где до vacuum лежат записи уже обработанных подписок
+    """
+    query = (
+        select(subscription.c.id, subscription.c.user_profile_id, subscription.c.project_id, subscription.c.end_at)
+        .where(subscription.c.expired_at.is_(None), subscription.c.end_at > since, subscription.c.end_at <= until)
+        .order_by(subscription.c.end_at, subscription.c.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    if after is not None:
+        query = query.where(tuple_(subscription.c.end_at, subscription.c.id) > tuple_(*after))
+    return query
+
+
+class SubscriptionExpirySweeper(metrics.BasePrometheusMixin):
+    """
+    Помечает истекшие подписки (expired_at) и рассылает события истечения.
+    Пачка - отдельная транзакция: строки блокируются FOR UPDATE SKIP LOCKED, поэтому воркеры
+    в нескольких процессах делят работу без пересечений. Если обработчик событий упал,
+    пачка откатывается и будет обработана заново (at-least-once)
+    """
+    metrics_prefix = 'subscription_expiry'
+    service_name = 'subscription_expiry'
+
+    def __init__(self,
+                 handlers: Sequence[ExpiryHandler] = (),
+                 batch_size: int = expiry_settings.get('BATCH_SIZE', 500),
+                 interval: timedelta = timedelta_from_duration(expiry_settings.get('INTERVAL', '30s')),
+                 window: timedelta = timedelta_from_duration(expiry_settings.get('WINDOW', '7d')),
+                 session_class=DBTransactionalSession):
+        self.handlers = list(handlers) or [RedisStreamPublisher()]
+        self.batch_size = batch_size
+        self.interval = interval
+        # истекшие раньше окна не трогаем: первый запуск не разошлет события по всей истории
+        self.window = window
+        self.session_class = session_class
+        self._task: Optional[asyncio.Task] = None
+
+    @metrics.metric
+    def expired(self):
+        return metrics.Counter('Number of subscriptions marked expired')
+
+    @metrics.metric
+    def batch_seconds(self):
+        return metrics.Histogram('Expiry batch duration (select, handlers, update), in seconds',
+                                 buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, float('inf')))
+
+    @metrics.metric
+    def lag_seconds(self):
+        return metrics.Gauge('How late the oldest subscription of the last batch was expired, in seconds')
+
+    @metrics.metric
+    def errors(self):
+        return metrics.Counter('Number of failed expiry batches')
+
+    async def _expire_batch(self, since: datetime, until: datetime,
+                            after: Optional[tuple[datetime, UUID]]) -> list[SubscriptionExpired]:
+        async with self.session_class() as session:
+            rows = (await session.execute(batch_query(since, until, after, self.batch_size))).all()
+            events = [SubscriptionExpired(*row) for row in rows]
+            if not events:
+                return events
+            try:
+                for handler in self.handlers:
+                    await handler(events)
+                await session.execute(update(subscription)
+                                      .where(subscription.c.id.in_([event.subscription_id for event in events]))
+                                      .values(expired_at=func.now()))
+                await session.commit()
+            except BaseException:
+                # блокировки строк снимаются сразу, пачку подберет следующий проход
+                await session.rollback()
+                raise
+        return events
+
+    async def sweep(self, until: Optional[datetime] = None) -> int:
+        """ Один проход по подпискам с end_at в (until - window, until], возвращает число истекших """
+        until = until or datetime.now(timezone.utc)
+        since = until - self.window
+        after, total = None, 0
+        while True:
+            start = time.perf_counter()
+            try:
+                events = await self._expire_batch(since, until, after)
+            except Exception:
+                self.errors.inc()
+                log.exception('Subscription expiry batch failed', extra={'after': str(after)})
+                # пачку подберет следующий проход
+                break
+            if not events:
+                break
+            self.batch_seconds.observe(time.perf_counter() - start)
+            self.expired.inc(len(events))
+            self.lag_seconds.set((datetime.now(timezone.utc) - events[0].end_at).total_seconds())
+            total += len(events)
+            after = (events[-1].end_at, events[-1].subscription_id)
+            if len(events) < self.batch_size:
+                break
+        if total:
+            log.info('Subscriptions expired', extra={'count': total})
+        return total
+
+    async def run(self):
+        while True:
+            await self.sweep()
+            await asyncio.sleep(self.interval.total_seconds())
+
+    def start(self):
+        """ Фоновая задача внутри веб процесса, отдельный процесс - subscription_expiry.py рядом с main.py """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(), context=contextvars.Context())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+subscription_expiry_sweeper = SubscriptionExpirySweeper()
@@ -13,7 +13,7 @@ class Payment(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, unique=True, default=uuid.uuid4)
 
-    external_id = Column(String, index=True, nullable=False)
+    external_id = Column(String, index=True, unique=True, nullable=False)
     status = Column(String, nullable=False, server_default='')
 
     user_id = Column(Integer, ForeignKey('user_profile.id'), nullable=False)
@@ -6,7 +6,6 @@ from libs.database.tables.base import Base
 
 
 # TODO добавить токен управления ботом. Продумать смену токена бота
-# TODO сделать имена проектов уникальными в пределах одного пользователя
 class Project(Base):
     __tablename__ = 'project'
 
@@ -37,7 +36,7 @@ class Project(Base):
     channels = relationship('Channel', back_populates='project')
 
     __table_args__ = (
-        Index('ix_project_owner_id_name', owner_id, name),
+        Index('ix_project_owner_id_name', owner_id, name, unique=True),
 
         Index('ix_project_name_tariff_id', name, tariff_id),
     )
@@ -22,9 +22,14 @@ class Subscription(Base):
     start_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     update_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
     end_at = Column(DateTime(timezone=True), nullable=True)
+    # проставляет SubscriptionExpirySweeper, продление подписки сбрасывает
+    expired_at = Column(DateTime(timezone=True), nullable=True)
 
     __table_args__ = (
         Index('ix_subscribe_update_at_end_at', update_at, end_at),
 
         Index('ix_subscribe_project_id_user_profile_id', project_id, user_profile_id),
+
+        # только еще не истекшие подписки: индекс не растет вместе с историей
+        Index('ix_subscription_pending_end_at', end_at, id, postgresql_where=expired_at.is_(None)),
     )
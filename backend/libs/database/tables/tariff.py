@@ -11,6 +11,7 @@ class Tariff(Base):
     __tablename__ = 'tariff'
     __table_args__ = (
         Index('ix_project_id_tariff_active', 'project_id', 'active'),
+        Index('ix_tariff_project_id_name', 'project_id', 'name', unique=True),
     )
 
     id = Column(Integer, primary_key=True, index=True)
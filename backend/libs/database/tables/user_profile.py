@@ -27,7 +27,7 @@ class UserProfile(Base):
     __table_args__ = (
         Index('ix_user_profile_user_id_user_type',
               'user_id', 'user_type',
-              unique=False),
+              unique=True),
     )
 
     id = Column(Integer, primary_key=True, index=True)
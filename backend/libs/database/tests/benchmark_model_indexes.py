@@ -0,0 +1,65 @@
+"""
+Lookups on User / UserProfile of a large owner: linear scan (as it was before indexes) against dict indexes.
+`indexed, cold` builds the index on every lookup, as the first permission check of a request does.
+
+    python -m libs.database.tests.benchmark_model_indexes
+"""
+import time
+from typing import Callable
+
+from libs.database.models import ProfileTypes, Subscription, User
+
+from .test_model_indexes import NOW, make_profile, make_project
+
+ROUNDS = 20_000
+
+
+def make_owner(projects: int) -> User:
+    items = [make_project(i) for i in range(projects)]
+    subscriptions = [Subscription(id=str(project.id), project=project, start_at=NOW, update_at=NOW, end_at=NOW)
+                     for project in items]
+    profiles = [make_profile(1, ProfileTypes.SUBSCRIBER, subscriptions=subscriptions),
+                make_profile(2, ProfileTypes.BOT),
+                make_profile(3, ProfileTypes.OWNER, projects=items)]
+    return User(id=1, user_telegram_id='42', inserted_at=NOW, updated_at=NOW, user_profile=profiles)
+
+
+def linear(user: User, project_id: int) -> tuple:
+    owner = next(profile for profile in user.user_profile if profile.user_type == ProfileTypes.OWNER)
+    subscriber = next(profile for profile in user.user_profile if profile.user_type == ProfileTypes.SUBSCRIBER)
+    project = next((project for project in owner.projects if project.id == project_id), None)
+    subscription = next((item for item in subscriber.subscriptions if item.project.id == project_id), None)
+    return project, subscription
+
+
+def indexed(user: User, project_id: int) -> tuple:
+    owner = user.get_profile_by_type_name(ProfileTypes.OWNER)
+    subscriber = user.get_profile_by_type_name(ProfileTypes.SUBSCRIBER)
+    return owner.user_get_project_by_id(project_id), subscriber.user_project_subscription(project_id)
+
+
+def indexed_cold(user: User, project_id: int) -> tuple:
+    user.reset_indexes()
+    for profile in user.user_profile:
+        profile.reset_indexes()
+    return indexed(user, project_id)
+
+
+def run(lookup: Callable, user: User, project_id: int) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        lookup(user, project_id)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    for projects in (10, 100, 1000):
+        user = make_owner(projects)
+        project_id = projects - 1  # худший случай для линейного поиска
+        print(f'owner with {projects} projects and subscriptions')
+        for name, lookup in (('linear', linear), ('indexed', indexed), ('indexed, cold', indexed_cold)):
+            print(f'  {name:16} {run(lookup, user, project_id) * 1e6:9.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import dataclasses
+from uuid import UUID
+
+import pytest
+import pytest_asyncio
+
+from libs.database import get_asyncpg_connection
+
+from ..bulk_loader import PAYMENT, SUBSCRIPTION, TARIFF, BulkLoader, MergeTarget
+
+
+class Transaction:
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, *_):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+        self.copied = []
+
+    async def execute(self, sql):
+        self.statements.append(sql)
+        return f'INSERT 0 {len(self.copied[-1])}' if sql.startswith('INSERT') else 'OK'
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.append(records)
+
+    def transaction(self):
+        return Transaction()
+
+
+@pytest.mark.asyncio
+async def test_resume_from_offset():
+    connection = RecordingConnection()
+    target = dataclasses.replace(TARIFF, columns=('project_id', 'name'))
+    offsets = []
+
+    async def checkpoint(progress):
+        offsets.append(progress.offset)
+
+    progress = await BulkLoader(connection, chunk_size=3).load(
+        target, [{'project_id': 1, 'name': str(i)} for i in range(8)], offset=2, checkpoint=checkpoint)
+
+    assert offsets == [5, 8]
+    assert (progress.merged, progress.chunks) == (6, 2)
+    assert connection.copied[0] == [(1, '2'), (1, '3'), (1, '4')]
+
+
+def test_merge_sql():
+    sql = BulkLoader._merge_sql(PAYMENT)
+
+    assert 'SELECT DISTINCT ON (external_id)' in sql
+    assert sql.endswith('ON CONFLICT (external_id) DO UPDATE SET status = EXCLUDED.status, '
+                        'user_id = EXCLUDED.user_id, project_id = EXCLUDED.project_id, '
+                        'updated_at = EXCLUDED.updated_at')
+
+
+def test_renewed_subscription_is_pending_again():
+    sql = BulkLoader._merge_sql(SUBSCRIPTION)
+
+    assert 'end_at = EXCLUDED.end_at' in sql
+    assert sql.endswith(', expired_at = NULL')
+
+
+def test_dict_record_must_have_all_columns():
+    payment = {'external_id': 'lava-1', 'status': 'paid', 'user_id': 1, 'project_id': 2}
+
+    with pytest.raises(ValueError, match='created_at'):
+        BulkLoader._row(PAYMENT, payment)
+
+    row = BulkLoader._row(dataclasses.replace(PAYMENT, columns=('id', *payment)), payment)
+    assert isinstance(row[0], UUID) and row[1:] == tuple(payment.values())
+
+    with pytest.raises(ValueError, match='id'):
+        BulkLoader._row(SUBSCRIPTION, {column: None for column in SUBSCRIPTION.columns if column != 'id'})
+
+
+@pytest_asyncio.fixture
+async def pg_connection():
+    try:
+        connection = await get_asyncpg_connection()()
+    except OSError:
+        pytest.skip('PostgreSQL is not available')
+    yield connection
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_last_record_of_a_key_wins(pg_connection):
+    await pg_connection.execute('CREATE TEMP TABLE bulk_target (external_id text PRIMARY KEY, status text)')
+    target = MergeTarget(table='bulk_target', columns=('external_id', 'status'), conflict_cols=('external_id',))
+    loader = BulkLoader(pg_connection, chunk_size=10)
+
+    await loader.load(target, [('a', 'created'), ('b', 'created'), ('a', 'paid')])
+    await loader.load(target, [('b', 'paid'), ('b', 'refunded')])
+
+    rows = await pg_connection.fetch('SELECT external_id, status FROM bulk_target')
+    assert dict(rows) == {'a': 'paid', 'b': 'refunded'}
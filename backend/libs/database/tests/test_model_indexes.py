@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from libs.database.models import Project, ProfileTypes, Subscription, User, UserProfile
+
+NOW = datetime(2024, 1, 1, 12, 0)
+
+
+def make_project(project_id: int) -> Project:
+    return Project(id=project_id, name=f'project {project_id}', owner_id=1, owner='owner', admin_bot_id=project_id,
+                   tariff_id=[1], payment_destination='destination', payment_system_id=1)
+
+
+def make_profile(profile_id: int, user_type: str, **kwargs) -> UserProfile:
+    return UserProfile(id=profile_id, user_type=user_type, inserted_at=NOW, updated_at=NOW, **kwargs)
+
+
+def test_profile_index_follows_append():
+    user = User(id=1, user_telegram_id='42', inserted_at=NOW, updated_at=NOW,
+                user_profile=[make_profile(1, ProfileTypes.OWNER)])
+    assert user.get_profile_by_type_name(ProfileTypes.SUBSCRIBER) is None
+
+    user.user_profile.append(make_profile(2, ProfileTypes.SUBSCRIBER))
+    assert user.get_profile_by_type_name(ProfileTypes.SUBSCRIBER).id == 2
+    assert user.get_profile_by_type_name(ProfileTypes.OWNER).id == 1
+
+
+def test_project_and_subscription_lookup():
+    projects = [make_project(i) for i in range(1, 4)]
+    subscription = Subscription(id='sub', project=projects[2], start_at=NOW, update_at=NOW, end_at=NOW)
+    profile = make_profile(1, ProfileTypes.OWNER, projects=projects, subscriptions=[subscription])
+
+    assert profile.user_get_project_by_id(2) is projects[1]
+    assert profile.user_is_project_owner(projects[0])
+    assert not profile.user_is_project_owner(make_project(10))
+    # подписка ищется по проекту, а не по своему id
+    assert profile.user_project_subscription(project_id=3) is subscription
+    assert profile.user_project_subscription(project_id=1) is None
+
+    profile.projects = [make_project(10)]
+    assert profile.user_get_project_by_id(2) is None
+    assert profile.user_get_project_by_id(10).id == 10
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from libs.cache.client import BaseCommonCache
+from libs.cache.exceptions import RedisStorageConnectionError
+
+from ..subscription_expiry import SubscriptionExpired, SubscriptionExpirySweeper, batch_query
+
+NOW = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_batch_query_is_keyset_and_skips_locked():
+    sql = str(batch_query(NOW - timedelta(days=7), NOW, (NOW, uuid4()), 100).compile(dialect=postgresql.dialect()))
+
+    assert 'subscription.expired_at IS NULL' in sql
+    assert '(subscription.end_at, subscription.id) > (' in sql
+    assert 'ORDER BY subscription.end_at, subscription.id' in sql
+    assert sql.endswith('FOR UPDATE SKIP LOCKED')
+
+
+class BatchSweeper(SubscriptionExpirySweeper):
+    """ Пачки из памяти вместо базы: проверяется только продвижение keyset и счетчики """
+
+    def __init__(self, pending: list[SubscriptionExpired], fail_after: int = None, **kwargs):
+        super().__init__(handlers=[self.handle], **kwargs)
+        self.pending = pending
+        self.fail_after = fail_after
+        self.handled = []
+        self.cursors = []
+
+    async def handle(self, events):
+        self.handled.extend(events)
+
+    async def _expire_batch(self, since, until, after):
+        self.cursors.append(after)
+        if self.fail_after is not None and len(self.cursors) > self.fail_after:
+            raise ConnectionError
+        batch = [event for event in self.pending
+                 if after is None or (event.end_at, event.subscription_id) > after][:self.batch_size]
+        await self.handle(batch)
+        return batch
+
+
+def make_events(count: int) -> list[SubscriptionExpired]:
+    return sorted((SubscriptionExpired(uuid4(), i, 1, NOW + timedelta(minutes=i)) for i in range(count)),
+                  key=lambda event: (event.end_at, event.subscription_id))
+
+
+@pytest.mark.asyncio
+async def test_sweep_walks_batches():
+    events = make_events(5)
+    sweeper = BatchSweeper(events, batch_size=2)
+
+    assert await sweeper.sweep(until=NOW + timedelta(hours=1)) == 5
+    assert sweeper.handled == events
+    assert sweeper.cursors == [None, (events[1].end_at, events[1].subscription_id),
+                               (events[3].end_at, events[3].subscription_id)]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_stops_the_pass():
+    sweeper = BatchSweeper(make_events(5), batch_size=2, fail_after=1)
+
+    assert await sweeper.sweep(until=NOW + timedelta(hours=1)) == 2
+
+
+class StubSession:
+    """ Сессия без базы: отдает строки на первый execute и запоминает запросы, commit и rollback """
+
+    def __init__(self, rows: list[tuple]):
+        self.rows = rows
+        self.statements = []
+        self.committed = self.rolled_back = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return self
+
+    def all(self):
+        return self.rows
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+def make_rows(count: int) -> list[tuple]:
+    return [(event.subscription_id, event.user_profile_id, event.project_id, event.end_at)
+            for event in make_events(count)]
+
+
+@pytest.mark.asyncio
+async def test_expire_batch_marks_handled_rows():
+    session, handled = StubSession(make_rows(2)), []
+
+    async def handle(events):
+        handled.extend(events)
+
+    sweeper = SubscriptionExpirySweeper(handlers=[handle], session_class=lambda: session)
+    events = await sweeper._expire_batch(NOW - timedelta(days=7), NOW, None)
+
+    assert handled == events and [event.subscription_id for event in events] == [row[0] for row in session.rows]
+    assert session.statements[0].endswith('FOR UPDATE SKIP LOCKED')
+    assert session.statements[1].startswith('UPDATE subscription SET') and 'expired_at=now()' in session.statements[1]
+    assert session.committed and not session.rolled_back
+
+
+@pytest.mark.asyncio
+async def test_failed_handler_rolls_back_the_batch(monkeypatch):
+    monkeypatch.setattr(BaseCommonCache, 'client', None)
+    session = StubSession(make_rows(2))
+    # без Redis публикация падает, а не теряет события
+    sweeper = SubscriptionExpirySweeper(session_class=lambda: session)
+
+    with pytest.raises(RedisStorageConnectionError):
+        await sweeper._expire_batch(NOW - timedelta(days=7), NOW, None)
+
+    assert len(session.statements) == 1
+    assert session.rolled_back and not session.committed
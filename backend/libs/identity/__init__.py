@@ -0,0 +1,2 @@
+from .cache import IdentityCache, IdentityTieredCache, IdentityTrackingCache  # noqa
+from .resolver import IdentityResolver, identity_resolver  # noqa
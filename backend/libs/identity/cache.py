@@ -0,0 +1,54 @@
+from datetime import timedelta
+from typing import Optional, Union
+
+from libs.cache.client import BaseCommonCache
+from libs.cache.lru import LRUCache
+from libs.cache.serializers import OrjsonModelSerializer
+from libs.cache.tiered import TieredCache
+from libs.cache.tracking import TrackingCache
+from libs.config import settings
+from libs.database.models import User
+from libs.utils.time import timedelta_from_duration
+
+IDENTITY_KEY_PREFIX = 'identity:user'
+
+identity_settings = settings.CACHE.get('IDENTITY', {})
+
+
+class IdentityCache(BaseCommonCache):
+    """ Shared (cross-request, cross-worker) cache of resolved users keyed by telegram id """
+    metrics_prefix = 'identity_cache'
+    service_name = 'identity'
+
+    value_serializer = OrjsonModelSerializer(User)
+    expire: Optional[Union[int, timedelta]] = timedelta_from_duration(identity_settings.get('TTL', '5m'))
+
+    @staticmethod
+    def user_key(user_tg_id: str) -> str:
+        return f'{IDENTITY_KEY_PREFIX}:{user_tg_id}'
+
+
+class IdentityTieredCache(TieredCache):
+    """ Hot users (bots first of all) from process memory, IdentityCache behind it """
+    metrics_prefix = 'identity_cache'
+    service_name = 'identity'
+
+    local_expire = timedelta_from_duration(identity_settings.get('LOCAL_TTL', '30s'))
+    local_max_items: int = identity_settings.get('LOCAL_MAX_ITEMS', 10000)
+
+    def __init__(self):
+        super().__init__(remote=IdentityCache(),
+                         local=LRUCache(max_items=self.local_max_items, expire=self.local_expire),
+                         namespace=IDENTITY_KEY_PREFIX)
+
+
+class IdentityTrackingCache(TrackingCache):
+    """ Same as IdentityTieredCache, process copies are invalidated by Redis itself (CACHE.IDENTITY.CLIENT_TRACKING) """
+    metrics_prefix = 'identity_cache'
+    service_name = 'identity'
+
+    def __init__(self):
+        super().__init__(remote=IdentityCache(),
+                         local=LRUCache(max_items=IdentityTieredCache.local_max_items,
+                                        expire=IdentityTieredCache.local_expire),
+                         namespace=IDENTITY_KEY_PREFIX)
@@ -0,0 +1,92 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from libs import logging
+from libs.cache.interface import CacheInterface
+from libs.cache.lru import LRUCache
+from libs.database.datasources.user import UserDatasource
+from libs.database.models import User
+from libs.web_service.middleware.headers_parser import get_request_id
+
+from .cache import IdentityCache, IdentityTieredCache, IdentityTrackingCache, identity_settings
+
+log = logging.getLogger('identity')
+
+# (request id, {telegram id: user}) - memo is dropped as soon as the request id changes
+_memo_ctx: ContextVar[Optional[tuple[str, dict[str, Optional[User]]]]] = ContextVar('_identity_memo', default=None)
+
+
+class IdentityResolver:
+    """
+    Resolves telegram ids to users in three steps:
+    per-request memo -> process LRU + shared Redis cache (only LRU when Redis is not initialised) -> database.
+
+    Not found users are memoized only within the request, so a user created later is picked up immediately.
+    Call `invalidate` after any change of the user graph (user, profiles, projects, tariffs);
+    project and tariff datasources invalidate project owners and admin bots themselves.
+    """
+
+    def __init__(self, cache: CacheInterface | None = None):
+        self._cache = cache
+
+    @property
+    def cache(self) -> CacheInterface:
+        if self._cache is None:
+            if IdentityCache.client and identity_settings.get('CLIENT_TRACKING', False):
+                self._cache = IdentityTrackingCache()
+            elif IdentityCache.client:
+                self._cache = IdentityTieredCache()
+            else:
+                self._cache = LRUCache(max_items=IdentityTieredCache.local_max_items, expire=IdentityCache.expire)
+        return self._cache
+
+    @staticmethod
+    def _memo() -> dict[str, Optional[User]]:
+        rq_id = get_request_id()
+        memo = _memo_ctx.get()
+        if memo is None or memo[0] != rq_id:
+            memo = (rq_id, {})
+            _memo_ctx.set(memo)
+        return memo[1]
+
+    async def resolve(self, session: Session, user_tg_id: str) -> Optional[User]:
+        return (await self.resolve_many(session, [user_tg_id]))[user_tg_id]
+
+    async def resolve_many(self, session: Session, user_tg_ids: Iterable[str]) -> dict[str, Optional[User]]:
+        user_tg_ids = list(dict.fromkeys(user_tg_ids))
+        memo = self._memo()
+
+        missing = [tg_id for tg_id in user_tg_ids if tg_id not in memo]
+        if missing:
+            cached = await self.cache.mget([IdentityCache.user_key(tg_id) for tg_id in missing])
+            for tg_id in missing:
+                if user := cached.get(IdentityCache.user_key(tg_id)):
+                    memo[tg_id] = user
+
+        missing = [tg_id for tg_id in user_tg_ids if tg_id not in memo]
+        if missing:
+            loaded = await self._load(session, missing)
+            memo.update(loaded)
+            await asyncio.gather(*[self.cache.set(IdentityCache.user_key(tg_id), user)
+                                   for tg_id, user in loaded.items() if user])
+
+        return {tg_id: memo[tg_id] for tg_id in user_tg_ids}
+
+    @staticmethod
+    async def _load(session: Session, user_tg_ids: list[str]) -> dict[str, Optional[User]]:
+        users = await UserDatasource(session).get_many(user_tg_ids=user_tg_ids)
+        found = {user.user_telegram_id: user for user in users}
+        return {tg_id: found.get(tg_id) for tg_id in user_tg_ids}
+
+    async def invalidate(self, *user_tg_ids: str):
+        memo = self._memo()
+        for tg_id in user_tg_ids:
+            memo.pop(tg_id, None)
+        await asyncio.gather(*[self.cache.delete(IdentityCache.user_key(tg_id)) for tg_id in user_tg_ids])
+        log.debug('Identity cache invalidated', extra={'count': len(user_tg_ids)})
+
+
+identity_resolver = IdentityResolver()
@@ -1,9 +1,11 @@
 import os
 from base64 import b64decode, b64encode
 from hashlib import blake2b, pbkdf2_hmac
+from typing import Optional, Union
 
 from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from libs.config import settings
 
@@ -12,25 +14,64 @@ SALT_HASH = blake2b(SALT, digest_size=32).digest()
 AES_INITIAL_VECTOR_SIZE = 16
 PADDER = padding.PKCS7(128)
 
+# v2: AES-GCM, raw value is VERSION_V2 + nonce + ciphertext with tag, text value is TEXT_PREFIX_V2 + base64.
+# Old CBC values are plain base64, which contains neither the 0x02 byte nor ':'
+VERSION_V2 = b'\x02'
+TEXT_PREFIX_V2 = 'v2:'
+GCM_NONCE_SIZE = 12
+AEAD = AESGCM(SALT_HASH)  # key schedule is done once per process, the object is stateless and reusable
+
+Data = Union[str, bytes]
+
+
+def _to_bytes(data: Data) -> bytes:
+    return data if isinstance(data, bytes) else data.encode()
+
+
+def encrypt_bytes(data: Data, nonce: Optional[bytes] = None) -> bytes:
+    nonce = nonce or os.urandom(GCM_NONCE_SIZE)
+    return VERSION_V2 + nonce + AEAD.encrypt(nonce, _to_bytes(data), None)
+
+
+def encrypt_many(items: list[Data]) -> list[bytes]:
+    """ Same as encrypt_bytes for every item, nonces for the whole batch come from a single urandom call """
+    nonces = os.urandom(GCM_NONCE_SIZE * len(items))
+    return [encrypt_bytes(item, nonces[i * GCM_NONCE_SIZE:(i + 1) * GCM_NONCE_SIZE]) for i, item in enumerate(items)]
+
+
+def to_text(encrypted: bytes) -> str:
+    return TEXT_PREFIX_V2 + b64encode(encrypted[len(VERSION_V2):]).decode('ascii')
+
+
+def decrypt_bytes(value: Data) -> bytes:
+    """ Reads v2 values in raw or text form and old CBC values """
+    if isinstance(value, str):
+        if value.startswith(TEXT_PREFIX_V2):
+            value = VERSION_V2 + b64decode(value[len(TEXT_PREFIX_V2):])
+        else:
+            return _decrypt_cbc(value)
+    if not value.startswith(VERSION_V2):
+        return _decrypt_cbc(value)
+    nonce = value[len(VERSION_V2):len(VERSION_V2) + GCM_NONCE_SIZE]
+    return AEAD.decrypt(nonce, value[len(VERSION_V2) + GCM_NONCE_SIZE:], None)
+
 
 def encrypt(str_: str) -> str:
-    input_vector = os.urandom(AES_INITIAL_VECTOR_SIZE)
-    cipher = Cipher(algorithms.AES(SALT_HASH), modes.CBC(input_vector))
-    encryptor = cipher.encryptor()
-    padder = PADDER.padder()
-    ciphertext = encryptor.update(padder.update(str_.encode()) + padder.finalize()) + encryptor.finalize()
-    return b64encode(input_vector + ciphertext).decode('utf-8')
+    return to_text(encrypt_bytes(str_))
+
+
+def decrypt(str_: Data) -> str:
+    return decrypt_bytes(str_).decode('utf-8')
 
 
-def decrypt(str_: str) -> str:
+def _decrypt_cbc(str_: Data) -> bytes:
     decoded_str = b64decode(str_)
     input_vector = decoded_str[:AES_INITIAL_VECTOR_SIZE]
     ciphertext = decoded_str[AES_INITIAL_VECTOR_SIZE:]
     cipher = Cipher(algorithms.AES(SALT_HASH), modes.CBC(input_vector))
     decryptor = cipher.decryptor()
     unpadder = PADDER.unpadder()
-    result = unpadder.update(decryptor.update(ciphertext) + decryptor.finalize()) + unpadder.finalize()
-    return result.decode('utf-8')
+    return unpadder.update(decryptor.update(ciphertext) + decryptor.finalize()) + unpadder.finalize()
 
 
 def hash_key(input_value: str) -> str:
@@ -0,0 +1,21 @@
+from fastapi import Query
+
+from libs.cache.sampler import HotKeySampler, hot_keys
+
+from ..dependencies import basic_auth_security
+
+
+def hot_keys_handler_factory(sampler: HotKeySampler):
+    def handler(limit: int = Query(20, ge=1, le=500), secure=basic_auth_security):
+        return {'sample_rate': sampler.rate, 'keys': sampler.top(limit)}
+
+    return handler
+
+
+def add_hot_keys_handler(router, path='/cache/hot-keys', sampler: HotKeySampler = hot_keys):
+    router.add_api_route(
+        path=path,
+        methods=["GET"],
+        description="Most requested cache keys, sampled",
+        endpoint=hot_keys_handler_factory(sampler),
+    )
@@ -0,0 +1,25 @@
+from typing import Literal
+
+from fastapi import Query
+
+from libs.database.sql_alchemy.telemetry import QueryTelemetry, query_telemetry
+
+from ..dependencies import basic_auth_security
+
+
+def sql_top_handler_factory(telemetry: QueryTelemetry):
+    def handler(limit: int = Query(20, ge=1, le=500),
+                order_by: Literal['total', 'max', 'mean', 'count'] = 'total',
+                secure=basic_auth_security):
+        return {'slow_threshold': telemetry.slow_threshold, 'queries': telemetry.top(limit, order_by)}
+
+    return handler
+
+
+def add_sql_top_handler(router, path='/sql/top', telemetry: QueryTelemetry = query_telemetry):
+    router.add_api_route(
+        path=path,
+        methods=["GET"],
+        description="Slowest SQL statements by fingerprint since startup",
+        endpoint=sql_top_handler_factory(telemetry),
+    )
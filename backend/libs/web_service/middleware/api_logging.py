@@ -5,6 +5,11 @@ from starlette.requests import Request
 from starlette.responses import Response
 
 from libs import logging
+from libs.database.sql_alchemy.query_stats import (QueryStats,
+                                                   check_query_budget,
+                                                   collect_query_stats,
+                                                   route_queries_metrics,
+                                                   route_template)
 from libs.utils.time import elapsed_time
 
 from .base import BaseHTTPMiddleware, Send
@@ -64,15 +69,18 @@ class ApiLoggingMiddleware(BaseHTTPMiddleware):
                      extra={"method": request.method,
                             "url": {'full': url},
                             "headers": dict(**request.headers)})
-        response = await call_next(request)
+        with collect_query_stats() as stats:
+            response = await call_next(request)
         response_time = next(elapsed)
+        db = self._query_stats(request, response, stats)
 
         if 200 <= response.status_code < 300:
             logger.info("Service response",
                         extra={"method": request.method,
                                "url": {'full': url},
                                "status_code": response.status_code,
-                               "response_time": response_time})
+                               "response_time": response_time,
+                               "db": db})
             logger.debug("Service response details",
                          extra={"url": {'full': url},
                                 "status_code": response.status_code,
@@ -85,12 +93,29 @@ class ApiLoggingMiddleware(BaseHTTPMiddleware):
                                 "url": {'full': url},
                                 "headers": self._clean_headers(request.headers),
                                 "status_code": response.status_code,
-                                "response_time": response_time})
+                                "response_time": response_time,
+                                "db": db})
             logger.debug("Service response details",
                          extra={"url": {'full': url},
                                 "body": self._response_body(response)})
         return response
 
+    @staticmethod
+    def _query_stats(request: Request, response: Response, stats: QueryStats) -> dict:
+        """
+        SQL accounting of the request: response headers, per route histograms, budget check
+        """
+        headers = getattr(request.state, 'headers', None)  # parsed by inner RequestHeadersMiddleware
+        stats.request_id = getattr(headers, 'request_id', None) or ''
+        route_path = route_template(request.scope)
+        route_queries_metrics.observe(route_path, stats)
+
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers['X-DB-Time'] = f'{stats.duration * 1000:.1f}'
+        response.headers['X-DB-Duplicates'] = str(stats.duplicates)
+        check_query_budget(route_path, request.scope.get('endpoint'), stats)
+        return {'queries': stats.count, 'time_ms': round(stats.duration * 1000, 1), 'duplicates': stats.duplicates}
+
     def _clean_header(self, item: tuple[str, str]) -> tuple[str, str]:
         key, value = item
         if key in self.restricted_headers:
@@ -0,0 +1,26 @@
+import asyncio
+
+from libs import logging
+from libs.cache.client import BaseCommonCache
+from libs.database.sql_alchemy.session import DBTransactionalSession
+from libs.database.subscription_expiry import subscription_expiry_sweeper
+
+logger = logging.getLogger(__name__)
+
+
+# метрики процесса отдает /metrics веб приложения при общем PROMETHEUS_MULTIPROC_DIR
+async def main():
+    try:
+        await BaseCommonCache.async_init()
+    except Exception:
+        logger.exception('Redis cache initialisation failed, expiry events will only be logged')
+    try:
+        await subscription_expiry_sweeper.run()
+    finally:
+        await DBTransactionalSession.connector.engine.dispose()
+        if BaseCommonCache.client:
+            await BaseCommonCache.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())